@@ -17,18 +17,32 @@ Test Categories:
 5. Cooking Method Queries
 6. Dietary Restriction Queries
 7. Regional Cuisine Queries
+
+Usage:
+    python3 comprehensive_query_test.py              # one query at a time
+    python3 comprehensive_query_test.py --parallel   # adaptive concurrency
+
+With --parallel the queries of each implementation run concurrently, as
+many at a time as the shared adaptive controller for its upstream API
+allows (see src/adaptive_concurrency.py); the report shows how the limit
+settled and why it changed.
 """
 
 import time
 import json
 import sys
 import os
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 import statistics
 
 # Add src directory to path for imports
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from adaptive_concurrency import get_controller
 
 # Import RAG implementations
 implementations = {}
@@ -61,6 +75,14 @@ try:
 except ImportError as e:
     print(f"⚠️  Groq Streaming implementation not available: {e}")
 
+# Upstream API that bounds each implementation's concurrency
+CONTROLLERS = {
+    'ChromaDB + Ollama': 'ollama',
+    'Upstash Vector': 'upstash',
+    'Groq API': 'groq',
+    'Groq Streaming': 'groq',
+}
+
 # Comprehensive Test Query Suite
 TEST_QUERIES = [
     # 1. Semantic Similarity Tests
@@ -214,7 +236,8 @@ TEST_QUERIES = [
 class QueryTester:
     """Comprehensive query testing and analysis system"""
     
-    def __init__(self):
+    def __init__(self, parallel: bool = False):
+        self.parallel = parallel
         self.results = []
         self.performance_metrics = {}
         self.quality_scores = {}
@@ -250,72 +273,106 @@ class QueryTester:
         total_score = keyword_score + region_score + quality_score
         return min(total_score, 1.0)  # Cap at 1.0
     
+    def run_query(self, name: str, query_func, query_data: Dict, controller=None) -> Dict:
+        """Run one query and score it (inside a concurrency slot when given)"""
+        query = query_data['query']
+        category = query_data['category']
+        
+        try:
+            if controller is None:
+                start_time = time.time()
+                response = query_func(query)
+                end_time = time.time()
+            else:
+                with controller.slot() as slot:
+                    start_time = time.time()
+                    response = query_func(query)
+                    end_time = time.time()
+                    if isinstance(response, str) and response.startswith("❌"):
+                        slot.fail(response)
+            
+            response_time = end_time - start_time
+            
+            # Handle streaming responses
+            if hasattr(response, '__iter__') and not isinstance(response, str):
+                full_response = ""
+                for chunk in response:
+                    full_response += str(chunk)
+                response = full_response
+            
+            # Calculate relevance score
+            relevance_score = self.calculate_relevance_score(query_data, str(response))
+            
+            return {
+                "implementation": name,
+                "query": query,
+                "category": category,
+                "difficulty": query_data.get('difficulty', 'Medium'),
+                "response": str(response),
+                "response_time": response_time,
+                "relevance_score": relevance_score,
+                "success": True,
+                "timestamp": datetime.now().isoformat()
+            }
+            
+        except Exception as e:
+            return {
+                "implementation": name,
+                "query": query,
+                "category": category,
+                "difficulty": query_data.get('difficulty', 'Medium'),
+                "error": str(e),
+                "response_time": 0,
+                "relevance_score": 0,
+                "success": False,
+                "timestamp": datetime.now().isoformat()
+            }
+    
+    def print_result(self, result: Dict):
+        """Print the outcome of one query"""
+        if not result['success']:
+            print(f"     ❌ Error: {result['error']}")
+            return
+        
+        # Truncate response for logging
+        response = result['response']
+        response_preview = response[:200] + "..." if len(response) > 200 else response
+        
+        print(f"     ⏱️  Response time: {result['response_time']:.2f}s")
+        print(f"     📊 Relevance score: {result['relevance_score']:.2f}")
+        print(f"     💬 Response: {response_preview}")
+    
     def test_implementation(self, name: str, query_func, queries: List[Dict]) -> List[Dict]:
         """Test a specific RAG implementation with all queries"""
         print(f"\n🧪 Testing {name}")
         print("=" * 60)
         
-        implementation_results = []
-        response_times = []
-        
-        for i, query_data in enumerate(queries, 1):
-            query = query_data['query']
-            category = query_data['category']
-            
-            try:
-                print(f"\n[{i:2d}] {category}: {query}")
-                
-                start_time = time.time()
-                response = query_func(query)
-                end_time = time.time()
-                
-                response_time = end_time - start_time
-                response_times.append(response_time)
-                
-                # Handle streaming responses
-                if hasattr(response, '__iter__') and not isinstance(response, str):
-                    full_response = ""
-                    for chunk in response:
-                        full_response += str(chunk)
-                    response = full_response
-                
-                # Calculate relevance score
-                relevance_score = self.calculate_relevance_score(query_data, str(response))
-                
-                # Truncate response for logging
-                response_preview = str(response)[:200] + "..." if len(str(response)) > 200 else str(response)
-                
-                print(f"     ⏱️  Response time: {response_time:.2f}s")
-                print(f"     📊 Relevance score: {relevance_score:.2f}")
-                print(f"     💬 Response: {response_preview}")
-                
-                result = {
-                    "implementation": name,
-                    "query": query,
-                    "category": category,
-                    "difficulty": query_data.get('difficulty', 'Medium'),
-                    "response": str(response),
-                    "response_time": response_time,
-                    "relevance_score": relevance_score,
-                    "success": True,
-                    "timestamp": datetime.now().isoformat()
-                }
-                
-            except Exception as e:
-                print(f"     ❌ Error: {e}")
-                result = {
-                    "implementation": name,
-                    "query": query,
-                    "category": category,
-                    "difficulty": query_data.get('difficulty', 'Medium'),
-                    "error": str(e),
-                    "response_time": 0,
-                    "relevance_score": 0,
-                    "success": False,
-                    "timestamp": datetime.now().isoformat()
+        controller = get_controller(CONTROLLERS.get(name, name)) if self.parallel else None
+        
+        if controller is None:
+            implementation_results = []
+            for i, query_data in enumerate(queries, 1):
+                print(f"\n[{i:2d}] {query_data['category']}: {query_data['query']}")
+                result = self.run_query(name, query_func, query_data)
+                self.print_result(result)
+                implementation_results.append(result)
+        else:
+            print_lock = threading.Lock()
+            implementation_results = [None] * len(queries)
+            # The controller decides how many of these workers query at once
+            with ThreadPoolExecutor(max_workers=controller.maximum) as pool:
+                futures = {
+                    pool.submit(self.run_query, name, query_func, query_data, controller): i
+                    for i, query_data in enumerate(queries)
                 }
-                
-            implementation_results.append(result)
+                for future in as_completed(futures):
+                    i = futures[future]
+                    result = implementation_results[i] = future.result()
+                    with print_lock:
+                        print(f"\n[{i + 1:2d}] {result['category']}: {result['query']}")
+                        self.print_result(result)
+        
+        response_times = [r['response_time'] for r in implementation_results if r['success']]
         
         # Calculate performance metrics
         if response_times:
@@ -328,6 +385,13 @@ class QueryTester:
                 "successful_queries": sum(1 for r in implementation_results if r['success']),
                 "avg_relevance_score": statistics.mean([r['relevance_score'] for r in implementation_results])
             }
+            if controller is not None:
+                concurrency = controller.stats()
+                self.performance_metrics[name]["concurrency"] = concurrency
+                print(f"\n🎚️  Concurrency settled at {concurrency['limit']} "
+                      f"({concurrency['increases']} increases, {concurrency['decreases']} decreases)")
+                for adjustment in concurrency['adjustments'][-5:]:
+                    print(f"     {adjustment['from']} → {adjustment['to']}: {adjustment['reason']}")
         
         return implementation_results
     
@@ -530,13 +594,17 @@ class QueryTester:
 
 def main():
     """Main execution function"""
+    parser = argparse.ArgumentParser(description='Comprehensive RAG query test suite')
+    parser.add_argument('--parallel', action='store_true',
+                        help='Run queries concurrently under adaptive concurrency control')
+    args = parser.parse_args()
     
     if len(implementations) == 0:
         print("❌ No RAG implementations available. Please check your setup.")
         return
     
     # Initialize tester
-    tester = QueryTester()
+    tester = QueryTester(parallel=args.parallel)
     
     # Run comprehensive tests
     test_data = tester.run_comprehensive_test()
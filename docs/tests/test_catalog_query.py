@@ -0,0 +1,43 @@
+"""
+Test exact list/count answers over data/foods.json
+"""
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from catalog_query import run_catalog_query
+from metadata_index import value_keys
+
+
+def count(question):
+    result = run_catalog_query(question)
+    assert result is not None, f"not routed to the catalog: {question!r}"
+    return result["total"]
+
+
+def test_multi_word_values_index_their_known_words():
+    known = {"india", "vietnam", "soup"}
+    assert "india" in value_keys("North India", "region", known)
+    assert "vietnam" in value_keys("Southern Vietnam", "region", known)
+    assert "soup" in value_keys("Healthy Soup", "type", known)
+    # Words that are not values on their own are not indexed
+    assert value_keys("New Zealand", "region", known) == {"new zealand"}
+
+
+def test_region_counts_include_multi_word_regions():
+    # India (3) + North India (3) + South India (1)
+    assert count("how many Indian dishes do you have?") == 7
+    assert count("how many South Indian dishes are there?") == 1
+    # Vietnam (4) + Southern Vietnam (2) + Hanoi, Vietnam (1)
+    assert count("how many Vietnamese dishes") == 7
+    assert count("how many dishes from New Zealand") == 2
+
+
+def test_type_counts_include_multi_word_types():
+    # Soup (9) + Healthy Soup (1) + Soup / Main Dish (1)
+    assert count("how many soups do you have") == 11
+    # Snack (9) + Healthy Snack (1)
+    assert count("how many snacks do you have") == 10
+    # Generic words of "Street Food" do not become types of their own
+    assert count("list all dishes") == 110
@@ -0,0 +1,41 @@
+"""
+Test which failures the shared retry policy retries
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from resilience import ResiliencePolicy, classify
+
+
+class ServerError(Exception):
+    status_code = 503
+
+
+def failing(error, failures=1):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise error
+        return "ok"
+    return fn, calls
+
+
+def test_unclassified_errors_are_not_retried():
+    assert classify(ValueError("bad input")) == "unknown"
+    fn, calls = failing(ValueError("bad input"))
+    with pytest.raises(ValueError):
+        ResiliencePolicy("test", base_delay=0, max_delay=0).call(fn, attempts=3)
+    assert len(calls) == 1
+
+
+def test_transient_errors_are_retried():
+    for error in (ServerError("unavailable"), TimeoutError("timed out"), ConnectionResetError()):
+        fn, calls = failing(error)
+        assert ResiliencePolicy("test", base_delay=0, max_delay=0).call(fn, attempts=3) == "ok"
+        assert len(calls) == 2
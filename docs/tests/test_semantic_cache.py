@@ -0,0 +1,54 @@
+"""
+Test semantic cache hits for paraphrases and misses for different questions
+"""
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from semantic_cache import SemanticCache, key_terms, terms_compatible
+
+
+def cached_for(stored, asked):
+    cache = SemanticCache(version_fn=None)
+    cache.store(stored, {"answer": stored})
+    return cache.lookup(asked)
+
+
+def test_paraphrases_hit():
+    paraphrases = [
+        ("What is Biryani?", "tell me about biryani"),
+        ("Which fruits are purple?", "Which fruits have a purple colour?"),
+        ("Which dishes are vegan?", "Which vegan dishes do you have?"),
+        ("How spicy is Tom Yum soup?", "How spicy is the Tom Yum soup really?"),
+        ("What is Vivian's experience with Python?",
+         "What experience does Vivian have with Python programming?"),
+    ]
+    for stored, asked in paraphrases:
+        hit = cached_for(stored, asked)
+        assert hit is not None, f"{asked!r} missed {stored!r}"
+        assert hit["question"] == stored
+
+
+def test_different_questions_miss():
+    different = [
+        ("What is Biryani?", "What is Rendang?"),
+        ("What is Biryani?", "What is Biryani and Rendang?"),
+        ("Tell me about the spice level and origin of biryani",
+         "Tell me about the spice level and origin of rendang"),
+        ("What are the health benefits of green tea?", "What are the health benefits of black tea?"),
+        ("Which dishes are spicy?", "Which dishes are not spicy?"),
+        ("dishes without meat", "dishes with meat"),
+        ("Which fruits are purple?", "Which fruits are red?"),
+    ]
+    for stored, asked in different:
+        assert cached_for(stored, asked) is None, f"{asked!r} was served {stored!r}"
+
+
+def test_key_term_guard():
+    assert terms_compatible(key_terms("Which fruits have a purple colour?"), key_terms("Which fruits are purple?"))
+    # Spelling variants are the same word
+    assert terms_compatible(key_terms("biriyani recipe"), key_terms("biryani recipe"))
+    # Substitutions and negations are not
+    assert not terms_compatible(key_terms("green tea benefits"), key_terms("black tea benefits"))
+    assert not terms_compatible(key_terms("is it spicy"), key_terms("isn't it spicy"))
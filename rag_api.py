@@ -2,77 +2,157 @@
 """
 RAG API Wrapper for Next.js Integration
 Provides a simple CLI interface for the RAG system
+
+Usage:
+    python3 rag_api.py "What is Biryani?"              # One-shot JSON answer
+    python3 rag_api.py --stream "What is Biryani?"     # NDJSON events as they arrive
+    python3 rag_api.py --serve                         # NDJSON daemon on stdin/stdout
+    python3 rag_api.py --serve --socket /tmp/rag.sock  # NDJSON daemon on a Unix socket
+
+List/count questions ("list all the Japanese dishes") are answered exactly
+from the catalog, with the full result under "catalog".
+
+When RAG_API_SOCKET (or --socket) points at a running daemon, the one-shot
+CLI forwards the question to it instead of loading the pipeline itself.
+Set RATE_LIMIT_STATE to a file path so parallel invocations share one Groq
+rate budget (see src/rate_limiter.py).
+
+--stream prints one JSON object per line as soon as it is available:
+    {"event": "sources", "question": ..., "sources": [...]}   after retrieval
+    {"event": "delta", "text": "..."}                          per token batch
+    {"event": "done", "answer": ..., "usage": {...}, "retrieval_ms": ...,
+     "first_token_ms": ..., "total_ms": ...}
+or {"event": "error", "error": "..."}. Stored, catalog and cached answers are
+replayed as a single delta.
 """
 
 import sys
 import json
 import os
-from io import StringIO
-from contextlib import redirect_stdout
+import time
+import argparse
 from dotenv import load_dotenv
-from upstash_vector import Index
-from groq import Groq
+
+# Add src directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from client_pool import lease_index, lease_groq
+from lexical_index import hybrid_results
+from answer_cache import get_answer_cache
+from rate_limiter import get_limiter, estimate_tokens
+from resilience import get_policy
+from single_flight import flight_key, get_flight
+from rag_daemon import request_daemon, serve_stdio, serve_unix
 
 # Load environment variables
 load_dotenv()
 
-def query_food_silent(question: str) -> str:
+# Retrieval and generation settings shared with rag_server.py
+# BM25 catches exact name/ingredient lookups, so dense search no longer
+# has to over-fetch: both legs are fused down to CONTEXT_K items
+TOP_K = 3
+CONTEXT_K = 3
+LLM_MODEL = "llama-3.1-8b-instant"
+TEMPERATURE = 0.7
+MAX_TOKENS = 500
+CACHE_SCOPE = "food"
+STREAM_FLUSH_MS = 50  # Deltas arriving within this window share one line
+SYSTEM_PROMPT = "You are a helpful food expert assistant. Use the provided food information to answer questions accurately and enthusiastically. If the information doesn't fully answer the question, say so honestly."
+# Anything that changes the answer for the same question and data
+CACHE_PARAMS = {
+    "model": LLM_MODEL,
+    "temperature": TEMPERATURE,
+    "max_tokens": MAX_TOKENS,
+    "system_prompt": SYSTEM_PROMPT,
+    "top_k": TOP_K,
+    "context_k": CONTEXT_K,
+}
+
+def build_context(results) -> str:
+    """Join the retrieved food texts into one context block"""
+    context_docs = []
+    for result in results:
+        text = result.metadata.get('original_text', result.metadata.get('enhanced_text', 'N/A'))
+        context_docs.append(text)
+    return "\n".join(context_docs)
+
+def build_messages(question: str, context: str) -> list:
+    """Build the Groq chat messages for a food question"""
+    return [
+        {
+            "role": "system",
+            "content": SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": f"""Use this food information to answer the question:
+
+Food Information:
+{context}
+
+Question: {question}
+
+Please provide a helpful, accurate answer based on the information above."""
+        }
+    ]
+
+def search_index(question: str):
+    """Dense search of the food index, retried by the shared Upstash policy"""
+    def attempt():
+        with lease_index() as index:
+            return index.query(
+                data=question,
+                top_k=TOP_K,
+                include_metadata=True
+            )
+    return get_policy("upstash").call(attempt)
+
+def query_food_silent(question: str, retrieved_ids: list = None) -> str:
     """
     Query the food database and get AI-powered answer (silent mode for API)
     
     Args:
         question: Your food-related question
+        retrieved_ids: Optional list that receives the IDs used as context
         
     Returns:
         AI-generated answer based on your food database
     """
     try:
-        # Initialize Upstash Vector
-        index = Index.from_env()
-        
         # Search for relevant food items
-        results = index.query(
-            data=question,
-            top_k=3,
-            include_metadata=True
-        )
+        results = search_index(question)
+        results = hybrid_results("foods", question, results, limit=CONTEXT_K)
         
         if not results:
             return "No relevant food information found."
+        if retrieved_ids is not None:
+            retrieved_ids.extend(result.id for result in results)
         
-        # Build context
-        context_docs = []
-        for result in results:
-            text = result.metadata.get('original_text', result.metadata.get('enhanced_text', 'N/A'))
-            context_docs.append(text)
+        context = build_context(results)
         
-        context = "\n".join(context_docs)
+        # Generate answer with Groq, within the budget shared via RATE_LIMIT_STATE
+        messages = build_messages(question, context)
+        limiter = get_limiter("groq")
+        estimate = estimate_tokens(messages, MAX_TOKENS)
         
-        # Generate answer with Groq
-        groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+        def attempt():
+            # Leased first, so a client that cannot be built holds no reservation
+            with lease_groq() as groq_client:
+                limiter.acquire(estimate)
+                try:
+                    completion = groq_client.chat.completions.create(
+                        messages=messages,
+                        model=LLM_MODEL,
+                        temperature=TEMPERATURE,
+                        max_tokens=MAX_TOKENS
+                    )
+                except Exception:
+                    limiter.settle(estimate, 0)  # Refund a failed attempt
+                    raise
+            limiter.settle(estimate, getattr(completion.usage, "total_tokens", None))
+            return completion
         
-        chat_completion = groq_client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a helpful food expert assistant. Use the provided food information to answer questions accurately and enthusiastically. If the information doesn't fully answer the question, say so honestly."
-                },
-                {
-                    "role": "user",
-                    "content": f"""Use this food information to answer the question:
-
-Food Information:
-{context}
-
-Question: {question}
-
-Please provide a helpful, accurate answer based on the information above."""
-                }
-            ],
-            model="llama-3.1-8b-instant",
-            temperature=0.7,
-            max_tokens=500
-        )
+        chat_completion = get_policy("groq").call(attempt)
         
         answer = chat_completion.choices[0].message.content
         return answer
@@ -80,35 +160,220 @@ Please provide a helpful, accurate answer based on the information above."""
     except Exception as e:
         raise Exception(f"RAG query failed: {str(e)}")
 
+def answer_catalog_query(question: str, request: dict):
+    """
+    Exact answer for list/count questions, or None for ordinary questions
+    
+    Optional request fields: "page", "page_size" and "summarize" (ask the
+    LLM for a summary of the exact result).
+    """
+    # NumPy-backed; imported on first use so cached one-shot answers skip it
+    from catalog_query import run_catalog_query, format_answer, summarize
+
+    result = run_catalog_query(
+        question,
+        page=request.get("page", 1),
+        page_size=request.get("page_size", 20)
+    )
+    if result is None:
+        return None
+    wants_summary = str(request.get("summarize", "")).lower() in ("1", "true", "yes")
+    answer = summarize(question, result) if wants_summary else format_answer(result)
+    return {"success": True, "question": question, "answer": answer, "catalog": result}
+
+def cached_response(question: str):
+    """Answer stored by any earlier process (CLI or daemon), or None"""
+    answers = get_answer_cache()
+    stored = answers.get(CACHE_SCOPE, question, CACHE_PARAMS) if answers else None
+    if stored:
+        return {"success": True, "question": question, "answer": stored["answer"], "cached": True}
+    return None
+
+def answer_question(question: str) -> dict:
+    """Answer an open question through the semantic cache or the RAG pipeline"""
+    # Paraphrases of a recent question reuse its answer
+    from semantic_cache import get_cache
+    cache = get_cache(CACHE_SCOPE)
+    hit = cache.lookup(question) if cache else None
+    if hit:
+        return {"success": True, "question": question, "answer": hit["answer"], "cached": True}
+
+    retrieved_ids = []
+    answer = query_food_silent(question, retrieved_ids)
+    if retrieved_ids:
+        if cache:
+            cache.store(question, answer, ids=retrieved_ids)
+        answers = get_answer_cache()
+        if answers:
+            answers.put(CACHE_SCOPE, question, CACHE_PARAMS, {"answer": answer})
+    return {"success": True, "question": question, "answer": answer}
+
+def handle_request(request: dict) -> dict:
+    """Answer one daemon request of the form {"question": "..."}"""
+    question = request.get("question")
+    if not question:
+        return {"success": False, "error": "No question provided"}
+
+    stored = cached_response(question)
+    if stored:
+        return stored
+
+    try:
+        catalog_answer = answer_catalog_query(question, request)
+        if catalog_answer is not None:
+            return catalog_answer
+
+        # Identical questions already being answered share that answer
+        key = flight_key(CACHE_SCOPE, question, CACHE_PARAMS)
+        response, shared = get_flight(CACHE_SCOPE).do(key, lambda: answer_question(question))
+        if shared:
+            return {**response, "question": question, "coalesced": True}
+        return dict(response)  # Waiters copy it; the daemon adds an "id"
+    except Exception as e:
+        return {"success": False, "error": str(e), "question": question}
+
+def stream_events(question: str, request: dict = None):
+    """
+    Answer a question as (event, data) pairs: sources, delta..., done (or error)
+    
+    Stored, catalog and semantically cached answers are replayed as one
+    delta; fresh answers stream from Groq and are cached when done.
+    """
+    # Imported on first use so non-streaming one-shot answers skip it
+    from rag_stream import groq_deltas, rag_events
+    from semantic_cache import get_cache
+    
+    started = time.perf_counter()
+    try:
+        cache = get_cache(CACHE_SCOPE)
+        replay = cached_response(question) or answer_catalog_query(question, request or {})
+        if replay is None:
+            hit = cache.lookup(question) if cache else None
+            if hit:
+                replay = {"answer": hit["answer"], "cached": True}
+    except Exception as e:
+        yield "error", {"error": str(e)}
+        return
+    
+    if replay is not None:
+        extra = {key: replay[key] for key in ("cached", "catalog") if key in replay}
+        yield "sources", {"question": question, "sources": [], **extra}
+        yield "delta", {"text": replay["answer"]}
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        yield "done", {"answer": replay["answer"], "usage": {}, "retrieval_ms": elapsed_ms,
+                       "first_token_ms": elapsed_ms, "total_ms": elapsed_ms}
+        return
+    
+    def retrieve():
+        results = search_index(question)
+        results = hybrid_results("foods", question, results, limit=CONTEXT_K)
+        if not results:
+            return None
+        sources = [{"id": r.id, "relevance": f"{r.score:.3f}"} for r in results]
+        return sources, build_messages(question, build_context(results))
+    
+    def generate(messages):
+        limiter = get_limiter("groq")
+        estimate = estimate_tokens(messages, MAX_TOKENS)
+        
+        def attempt():
+            with lease_groq() as groq_client:
+                limiter.acquire(estimate)
+                return (yield from limiter.metered(groq_deltas(
+                    groq_client,
+                    messages,
+                    model=LLM_MODEL,
+                    temperature=TEMPERATURE,
+                    max_tokens=MAX_TOKENS
+                ), estimate))
+        # Retried (before the first token) by the shared Groq policy
+        return get_policy("groq").call_stream(attempt)
+    
+    retrieved_ids = []
+    for event, data in rag_events(question, retrieve, generate):
+        if event == "sources":
+            retrieved_ids = [source["id"] for source in data["sources"]]
+        elif event == "done":
+            if cache:
+                cache.store(question, data["answer"], ids=retrieved_ids)
+            answers = get_answer_cache()
+            if answers:
+                answers.put(CACHE_SCOPE, question, CACHE_PARAMS, {"answer": data["answer"]})
+        yield event, data
+
+def print_stream(events, out=None) -> bool:
+    """Write events as NDJSON, batching deltas; returns True if the answer completed"""
+    out = out or sys.stdout
+    pending, last_flush, first = [], 0.0, True
+    
+    def emit(payload):
+        out.write(json.dumps(payload) + "\n")
+        out.flush()
+    
+    def flush_deltas():
+        nonlocal pending, last_flush
+        if pending:
+            emit({"event": "delta", "text": "".join(pending)})
+            pending = []
+        last_flush = time.perf_counter()
+    
+    for event, data in events:
+        if event == "delta":
+            pending.append(data["text"])
+            # The first token goes out at once; later ones in small batches
+            if first or (time.perf_counter() - last_flush) * 1000 >= STREAM_FLUSH_MS:
+                flush_deltas()
+                first = False
+            continue
+        flush_deltas()
+        emit({"event": event, **data})
+        if event in ("done", "error"):
+            return event == "done"
+    flush_deltas()
+    return False
+
 def main():
-    if len(sys.argv) < 2:
+    parser = argparse.ArgumentParser(description='RAG API for Next.js integration')
+    parser.add_argument('question', nargs='*', help='Question to answer')
+    parser.add_argument('--serve', action='store_true',
+                        help='Run as a long-lived NDJSON daemon')
+    parser.add_argument('--stream', action='store_true',
+                        help='Print NDJSON events (sources, deltas, done) as they arrive')
+    parser.add_argument('--socket', default=os.getenv('RAG_API_SOCKET'),
+                        help='Unix socket to serve on (with --serve) or forward to')
+    args = parser.parse_args()
+
+    if args.serve:
+        if args.socket:
+            serve_unix(args.socket, handle_request)
+        else:
+            serve_stdio(handle_request)
+        return
+
+    if not args.question:
         print(json.dumps({
             "error": "No question provided",
             "usage": "python3 rag_api.py 'Your question here'"
         }))
         sys.exit(1)
     
-    question = sys.argv[1]
-    
-    try:
-        # Query the RAG system (silent mode, no print statements)
-        result = query_food_silent(question)
-        
-        # Return JSON response
-        response = {
-            "success": True,
-            "question": question,
-            "answer": result
-        }
-        print(json.dumps(response))
-        
-    except Exception as e:
-        error_response = {
-            "success": False,
-            "error": str(e),
-            "question": question
-        }
-        print(json.dumps(error_response))
+    question = " ".join(args.question)
+
+    if args.stream:
+        if not print_stream(stream_events(question)):
+            sys.exit(1)
+        return
+
+    # A stored answer beats even a warm daemon; then try the daemon, then
+    # answer in this process
+    response = cached_response(question)
+    if response is None:
+        response = request_daemon(args.socket, {"question": question})
+    if response is None:
+        response = handle_request({"question": question})
+
+    print(json.dumps(response))
+    if not response.get("success"):
         sys.exit(1)
 
 if __name__ == "__main__":
@@ -6,10 +6,15 @@ Ask questions about food and get AI-powered answers!
 
 # Essential imports for RAG System
 import os
+import sys
 import json
 from dotenv import load_dotenv
-from upstash_vector import Index
-from groq import Groq
+
+# Add src directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from client_pool import lease_index, lease_groq
+from resilience import get_policy
 
 # Load environment variables
 load_dotenv()
@@ -25,16 +30,17 @@ def query_food(question: str) -> str:
         AI-generated answer based on your food database
     """
     try:
-        # Initialize Upstash Vector
         print(f"🔍 Searching for: '{question}'")
-        index = Index.from_env()
         
         # Step 1: Search for relevant food items (auto-embedding + search)
-        results = index.query(
-            data=question,
-            top_k=3,
-            include_metadata=True
-        )
+        def search():
+            with lease_index() as index:
+                return index.query(
+                    data=question,
+                    top_k=3,
+                    include_metadata=True
+                )
+        results = get_policy("upstash").call(search, verbose=True)
         
         if not results:
             return "❌ No relevant food information found."
@@ -56,17 +62,17 @@ def query_food(question: str) -> str:
         # Step 4: Generate answer with Groq
         print(f"\n🤖 Generating answer with Groq AI...")
         
-        groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-        
-        chat_completion = groq_client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a helpful food expert assistant. Use the provided food information to answer questions accurately and enthusiastically. If the information doesn't fully answer the question, say so honestly."
-                },
-                {
-                    "role": "user",
-                    "content": f"""Use this food information to answer the question:
+        def generate():
+            with lease_groq() as groq_client:
+                return groq_client.chat.completions.create(
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": "You are a helpful food expert assistant. Use the provided food information to answer questions accurately and enthusiastically. If the information doesn't fully answer the question, say so honestly."
+                        },
+                        {
+                            "role": "user",
+                            "content": f"""Use this food information to answer the question:
 
 Food Information:
 {context}
@@ -74,12 +80,14 @@ Food Information:
 Question: {question}
 
 Please provide a helpful, accurate answer based on the information above."""
-                }
-            ],
-            model="llama-3.1-8b-instant",
-            temperature=0.7,
-            max_tokens=500
-        )
+                        }
+                    ],
+                    model="llama-3.1-8b-instant",
+                    temperature=0.7,
+                    max_tokens=500
+                )
+        
+        chat_completion = get_policy("groq").call(generate, verbose=True)
         
         answer = chat_completion.choices[0].message.content
         
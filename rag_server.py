@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+"""
+RAG HTTP Server
+Asyncio HTTP front end for the food and profile RAG pipelines, so the
+Next.js apps and other internal services can call one warm process.
+
+Endpoints:
+    GET  /health                         Liveness check with pool, cache, coalescing, rate limit
+                                         and concurrency stats
+    POST /query   {"question": "...", "dataset": "food"|"profile"}
+    POST /batch   {"questions": ["...", ...], "dataset": "food"|"profile"}
+    POST /stream  {"question": "...", "dataset": "food"|"profile"}   (SSE)
+    GET  /stream?question=...&dataset=food                             (SSE)
+
+Food list/count questions ("how many vegan dishes") are answered exactly
+from the catalog; /query also accepts "page", "page_size" and "summarize"
+for those.
+
+All requests share one event loop and one set of async Upstash/Groq
+clients; there is no thread per request. Identical questions that arrive
+while one is being answered wait for that answer instead of repeating the
+upstream calls. Groq calls draw on the shared request/token budget in
+src/rate_limiter.py; /batch questions use the "batch" class, which leaves
+headroom for /query and /stream. The number of /batch Groq calls in flight at
+once is tuned by the shared "groq" adaptive controller (see
+src/adaptive_concurrency.py).
+
+Usage:
+    python3 rag_server.py --port 8000
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from urllib.parse import urlsplit, parse_qs
+from dotenv import load_dotenv
+
+# Add src directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+import rag_api
+import vivian_profile_query
+from client_pool import lease_async_index, lease_async_groq, pool_stats
+from lexical_index import hybrid_results
+from semantic_cache import get_cache, cache_stats
+from single_flight import flight_key, get_async_flight, flight_stats
+from rate_limiter import get_limiter, estimate_tokens, limiter_stats_async
+from adaptive_concurrency import get_controller, concurrency_stats
+from resilience import get_policy
+from rag_stream import usage_dict
+
+# Load environment variables
+load_dotenv()
+
+DATASETS = ("food", "profile")
+MAX_BODY_BYTES = 1024 * 1024
+MAX_BATCH_SIZE = 50
+# Starting point for the adaptive controller that paces /batch
+BATCH_CONCURRENCY = int(os.getenv("RAG_SERVER_BATCH_CONCURRENCY", "8"))
+
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class HttpError(Exception):
+    """Error that maps directly onto an HTTP status code"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class RagPipeline:
+    """Async retrieve-then-generate flow shared by every endpoint"""
+
+    async def retrieve(self, dataset, question):
+        """
+        Search the vector index and build the prompt for a question
+
+        Returns:
+            Tuple of (messages, sources, extra response fields), or None when
+            nothing relevant was found
+        """
+        if dataset == "profile":
+            results = await self._query(
+                data=question,
+                top_k=vivian_profile_query.TOP_K,
+                include_metadata=True,
+                include_data=True,
+                namespace=vivian_profile_query.PROFILE_NAMESPACE
+            )
+            results = hybrid_results("profile", question, results)
+            if not results:
+                return None
+            profile_results, context_docs = vivian_profile_query.select_profile_context(
+                results, limit=vivian_profile_query.CONTEXT_K
+            )
+            if not context_docs:
+                return None
+            context = "\n\n".join(context_docs)
+            sources = vivian_profile_query.build_sources(profile_results)
+            messages = vivian_profile_query.build_messages(question, context)
+            return messages, sources, {"profile_vectors_found": len(profile_results)}
+
+        results = await self._query(
+            data=question,
+            top_k=rag_api.TOP_K,
+            include_metadata=True
+        )
+        results = hybrid_results("foods", question, results, limit=rag_api.CONTEXT_K)
+        if not results:
+            return None
+        context = rag_api.build_context(results)
+        sources = [{"id": r.id, "relevance": f"{r.score:.3f}"} for r in results]
+        return rag_api.build_messages(question, context), sources, {}
+
+    async def _query(self, **params):
+        """One vector index query, retried by the shared Upstash policy"""
+        async def attempt():
+            async with lease_async_index() as index:
+                return await index.query(**params)
+        return await get_policy("upstash").acall(attempt)
+
+    def _settings(self, dataset):
+        module = vivian_profile_query if dataset == "profile" else rag_api
+        return {
+            "model": module.LLM_MODEL,
+            "temperature": module.TEMPERATURE,
+            "max_tokens": module.MAX_TOKENS,
+        }
+
+    def _flight(self, dataset, question):
+        """Coalescing group and key for identical in-flight questions"""
+        module = vivian_profile_query if dataset == "profile" else rag_api
+        scope = f"http:{dataset}"
+        return get_async_flight(scope), flight_key(scope, question, module.CACHE_PARAMS)
+
+    async def answer(self, dataset, question, options=None, priority="interactive", controller=None):
+        """
+        Answer a question and return the same shape as the CLI tools
+
+        With an adaptive controller, the Groq call (and only that call) holds
+        one of its slots, so the controller sees provider latency rather
+        than time spent in caches or waiting on the rate limiter.
+        """
+        try:
+            if dataset != "profile":
+                # List/count questions are answered exactly from the catalog
+                catalog_answer = await asyncio.to_thread(
+                    rag_api.answer_catalog_query, question, options or {}
+                )
+                if catalog_answer is not None:
+                    return catalog_answer
+
+            flight, key = self._flight(dataset, question)
+            response, shared = await flight.do(key, lambda: self._answer_fresh(dataset, question, priority, controller))
+            if shared:
+                return {**response, "question": question, "coalesced": True}
+            return response
+
+        except Exception as e:
+            return {"success": False, "question": question, "error": str(e)}
+
+    async def _answer_fresh(self, dataset, question, priority="interactive", controller=None):
+        """Semantic cache, then retrieval and generation"""
+        cache = get_cache(f"http:{dataset}")
+        hit = cache.lookup(question) if cache else None
+        if hit:
+            return {**hit["answer"], "question": question, "cached": True}
+
+        retrieved = await self.retrieve(dataset, question)
+        if retrieved is None:
+            return {
+                "success": False,
+                "question": question,
+                "error": "No relevant information found."
+            }
+        messages, sources, extra = retrieved
+
+        settings = self._settings(dataset)
+        limiter = get_limiter("groq")
+        estimate = estimate_tokens(messages, settings["max_tokens"])
+
+        async def attempt():
+            await limiter.acquire_async(estimate, priority)
+            try:
+                completion = await self._complete(messages, settings, controller)
+            except Exception:
+                await limiter.settle_async(estimate, 0)  # Refund a failed attempt
+                raise
+            await limiter.settle_async(estimate, getattr(completion.usage, "total_tokens", None))
+            return completion
+
+        completion = await get_policy("groq").acall(attempt)
+        response = {
+            "success": True,
+            "question": question,
+            "answer": completion.choices[0].message.content,
+            "sources": sources,
+        }
+        response.update(extra)
+        if cache:
+            cache.store(question, response, ids=[source["id"] for source in sources])
+        return response
+
+    async def _complete(self, messages, settings, controller=None):
+        """One Groq chat completion, timed by the controller when given"""
+        async with lease_async_groq() as client:
+            if controller is None:
+                return await client.chat.completions.create(messages=messages, **settings)
+            async with controller.async_slot():
+                return await client.chat.completions.create(messages=messages, **settings)
+
+    async def stream(self, dataset, question):
+        """Yield (event, data) pairs: sources, delta..., done (or error)"""
+        # A client asking while the same answer is streaming replays the
+        # events so far, then follows the live stream
+        flight, key = self._flight(dataset, question)
+        async for shared, (event, data) in flight.stream(key, lambda: self._stream_fresh(dataset, question)):
+            if shared and event == "sources":
+                data = {**data, "question": question, "coalesced": True}
+            yield event, data
+
+    async def _stream_fresh(self, dataset, question):
+        """Semantic cache replay, or retrieval and streamed generation"""
+        started = time.perf_counter()
+        try:
+            cache = get_cache(f"http:{dataset}")
+            hit = cache.lookup(question) if cache else None
+            if hit:
+                # Replay a cached answer as one delta
+                cached = hit["answer"]
+                extra = {key: value for key, value in cached.items()
+                         if key not in ("success", "question", "answer", "sources")}
+                yield "sources", {"question": question, "sources": cached["sources"], "cached": True, **extra}
+                yield "delta", {"text": cached["answer"]}
+                elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+                yield "done", {"answer": cached["answer"], "usage": {}, "retrieval_ms": elapsed_ms,
+                               "first_token_ms": elapsed_ms, "total_ms": elapsed_ms}
+                return
+
+            retrieved = await self.retrieve(dataset, question)
+            if retrieved is None:
+                yield "error", {"error": "No relevant information found."}
+                return
+            messages, sources, extra = retrieved
+            retrieved_at = time.perf_counter()
+            yield "sources", {"question": question, "sources": sources, **extra}
+
+            first_token_at = None
+            settings = self._settings(dataset)
+            limiter = get_limiter("groq")
+            estimate = estimate_tokens(messages, settings["max_tokens"])
+
+            async def attempt(client):
+                await limiter.acquire_async(estimate)
+                try:
+                    return await client.chat.completions.create(
+                        messages=messages,
+                        stream=True,
+                        **settings
+                    )
+                except Exception:
+                    await limiter.settle_async(estimate, 0)  # Refund a failed attempt
+                    raise
+
+            async with lease_async_groq() as client:
+                # Retried until the stream opens; later failures end it
+                completion = await get_policy("groq").acall(lambda: attempt(client))
+                parts = []
+                usage = None
+                try:
+                    async for chunk in completion:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            if first_token_at is None:
+                                first_token_at = time.perf_counter()
+                            parts.append(chunk.choices[0].delta.content)
+                            yield "delta", {"text": chunk.choices[0].delta.content}
+                        # Groq reports usage on the final chunk under x_groq
+                        chunk_usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+                        if chunk_usage is not None:
+                            usage = usage_dict(chunk_usage)
+                except Exception:
+                    if first_token_at is None:
+                        await limiter.settle_async(estimate, 0)  # Refund a stream that produced nothing
+                    raise
+            await limiter.settle_async(estimate, (usage or {}).get("total_tokens"))
+
+            answer = "".join(parts).strip()
+            if cache:
+                response = {"success": True, "question": question, "answer": answer,
+                            "sources": sources, **extra}
+                cache.store(question, response, ids=[source["id"] for source in sources])
+            finished = time.perf_counter()
+            yield "done", {
+                "answer": answer,
+                "usage": usage or {},
+                "retrieval_ms": round((retrieved_at - started) * 1000, 1),
+                "first_token_ms": round(((first_token_at or finished) - started) * 1000, 1),
+                "total_ms": round((finished - started) * 1000, 1),
+            }
+
+        except Exception as e:
+            yield "error", {"error": str(e)}
+
+
+async def read_request(reader):
+    """Parse one HTTP/1.1 request; returns None when the client hung up"""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+
+    try:
+        method, target, version = request_line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(400, "Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", "0") or 0)
+    except ValueError:
+        raise HttpError(400, "Malformed Content-Length header")
+    if length < 0:
+        raise HttpError(400, "Malformed Content-Length header")
+    if length > MAX_BODY_BYTES:
+        raise HttpError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+
+    return method.upper(), target, version, headers, body
+
+
+def write_json(writer, status, payload, keep_alive=True):
+    body = json.dumps(payload).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {STATUS_TEXT.get(status, 'OK')}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        "\r\n"
+    )
+    writer.write(head.encode("latin-1") + body)
+
+
+def parse_params(method, target, body):
+    """Merge query-string parameters and a JSON body into one dict"""
+    params = {key: values[-1] for key, values in parse_qs(urlsplit(target).query).items()}
+    if method == "POST" and body:
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            raise HttpError(400, "Body must be valid JSON")
+        if not isinstance(payload, dict):
+            raise HttpError(400, "Body must be a JSON object")
+        params.update(payload)
+
+    dataset = params.get("dataset", "food")
+    if dataset not in DATASETS:
+        raise HttpError(400, f"dataset must be one of {', '.join(DATASETS)}")
+    params["dataset"] = dataset
+    return params
+
+
+def require_question(params):
+    question = params.get("question")
+    if not isinstance(question, str) or not question.strip():
+        raise HttpError(400, "No question provided")
+    return question.strip()
+
+
+class RagHttpServer:
+    """Route HTTP requests onto a shared RagPipeline"""
+
+    def __init__(self, pipeline=None):
+        self.pipeline = pipeline or RagPipeline()
+        self.batch_controller = get_controller("groq", initial=BATCH_CONCURRENCY)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except HttpError as e:
+                    write_json(writer, e.status, {"success": False, "error": str(e)}, keep_alive=False)
+                    break
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if request is None:
+                    break
+
+                method, target, version, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+
+                try:
+                    streamed = await self.route(writer, method, target, body, keep_alive)
+                except HttpError as e:
+                    write_json(writer, e.status, {"success": False, "error": str(e)}, keep_alive)
+                    streamed = False
+                except Exception as e:
+                    write_json(writer, 500, {"success": False, "error": str(e)}, keep_alive=False)
+                    break
+
+                await writer.drain()
+                if streamed or not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, writer, method, target, body, keep_alive):
+        """Dispatch one request; returns True when the response was streamed"""
+        path = urlsplit(target).path.rstrip("/") or "/"
+
+        if path == "/health":
+            write_json(writer, 200, {"success": True, "status": "ok", "pools": pool_stats(),
+                                  "caches": cache_stats(), "flights": flight_stats(),
+                                  "rate_limits": await limiter_stats_async(), "concurrency": concurrency_stats()},
+                       keep_alive)
+            return False
+
+        if path not in ("/query", "/batch", "/stream"):
+            raise HttpError(404, f"No route for {path}")
+        if method not in ("GET", "POST") or (path != "/stream" and method != "POST"):
+            raise HttpError(405, f"{method} not allowed on {path}")
+
+        params = parse_params(method, target, body)
+
+        if path == "/query":
+            response = await self.pipeline.answer(params["dataset"], require_question(params), params)
+            write_json(writer, 200, response, keep_alive)
+            return False
+
+        if path == "/batch":
+            questions = params.get("questions")
+            if not isinstance(questions, list) or not questions:
+                raise HttpError(400, "questions must be a non-empty list")
+            if len(questions) > MAX_BATCH_SIZE:
+                raise HttpError(400, f"At most {MAX_BATCH_SIZE} questions per batch")
+
+            # Cache hits and catalog answers return at once; only the Groq
+            # calls queue for the controller's slots
+            results = await asyncio.gather(*(
+                self.pipeline.answer(params["dataset"], str(question), priority="batch",
+                                     controller=self.batch_controller)
+                for question in questions
+            ))
+            write_json(writer, 200, {"success": True, "results": list(results)}, keep_alive)
+            return False
+
+        question = require_question(params)
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Connection: close\r\n"
+            b"\r\n"
+        )
+        async for event, data in self.pipeline.stream(params["dataset"], question):
+            writer.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+            await writer.drain()
+        return True
+
+
+async def serve(host, port):
+    app = RagHttpServer()
+    server = await asyncio.start_server(app.handle_connection, host, port)
+    print(f"🚀 RAG server listening on http://{host}:{port}", file=sys.stderr, flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='RAG HTTP server')
+    parser.add_argument('--host', default=os.getenv('RAG_SERVER_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('RAG_SERVER_PORT', '8000')))
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\n👋 Server stopped", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,9 @@
 """
 RAG-Food Project - Main Entry Point
 Supports multiple RAG implementations with different backends
+
+Every backend streams its answer: sources first, then tokens as they are
+generated, then timings (see src/rag_stream.py).
 """
 import sys
 import os
@@ -10,10 +13,12 @@ import argparse
 # Add src directory to path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
+from rag_stream import print_events
+
 def main():
     parser = argparse.ArgumentParser(description='RAG-Food Query System')
     parser.add_argument('--implementation', '-i', 
-                       choices=['chromadb', 'upstash', 'groq', 'groq-streaming'],
+                       choices=['chromadb', 'upstash', 'groq', 'groq-streaming', 'local', 'local-quantized'],
                        default='groq-streaming',
                        help='Choose RAG implementation (default: groq-streaming)')
     parser.add_argument('--query', '-q', type=str, help='Query to search for')
@@ -27,37 +32,62 @@ def main():
         os.system('python3 tests/query_test.py')
         return
     
+    # Backends with a long-lived session expose a hook to open it up front
+    open_session = None
+    
     # Import the selected implementation
     if args.implementation == 'chromadb':
         try:
-            from rag_run import query_rag
+            from rag_run import query_rag_stream
             print("🔵 Using ChromaDB + Ollama implementation")
         except ImportError as e:
             print(f"❌ ChromaDB implementation not available: {e}")
             return
     elif args.implementation == 'upstash':
         try:
-            from rag_run_upstash import query_rag
+            from rag_run_upstash import query_rag_stream
             print("🟡 Using Upstash Vector implementation")
         except ImportError as e:
             print(f"❌ Upstash implementation not available: {e}")
             return
     elif args.implementation == 'groq':
         try:
-            from rag_run_groq import query_rag
+            from rag_run_groq import query_rag_stream
             print("🟢 Using Groq API implementation")
         except ImportError as e:
             print(f"❌ Groq implementation not available: {e}")
             return
     elif args.implementation == 'groq-streaming':
         try:
-            from rag_run_groq_streaming import query_rag
+            from rag_run_groq_streaming import query_rag_stream, get_session as open_session
             print("🚀 Using Groq Streaming implementation")
         except ImportError as e:
             print(f"❌ Groq Streaming implementation not available: {e}")
             return
+    elif args.implementation == 'local':
+        try:
+            from rag_run_local import query_rag_stream, get_index as open_session
+            print("⚪ Using local NumPy index implementation")
+        except ImportError as e:
+            print(f"❌ Local implementation not available: {e}")
+            return
+    elif args.implementation == 'local-quantized':
+        try:
+            from quantized_index import query_rag_stream, get_index as open_session
+            print("⚫ Using quantised local index implementation")
+        except ImportError as e:
+            print(f"❌ Quantised local implementation not available: {e}")
+            return
     
     if args.interactive:
+        # Load data once; every question below reuses the same session
+        if open_session:
+            try:
+                open_session()
+            except RuntimeError as e:
+                print(f"❌ {e}")
+                return
+        
         print("\n🍽️  RAG-Food Interactive Query System")
         print("Type 'quit', 'exit', or 'q' to stop")
         print("-" * 50)
@@ -74,15 +104,7 @@ def main():
                 print(f"\n💭 Searching for: {query}")
                 print("-" * 40)
                 
-                response = query_rag(query)
-                
-                # Handle streaming vs non-streaming responses
-                if hasattr(response, '__iter__') and not isinstance(response, str):
-                    for chunk in response:
-                        print(chunk, end="", flush=True)
-                    print()  # New line after streaming
-                else:
-                    print(response)
+                print_events(query_rag_stream(query))
                     
             except KeyboardInterrupt:
                 print("\n\n👋 Goodbye!")
@@ -94,15 +116,7 @@ def main():
         print(f"\n🔍 Query: {args.query}")
         print("-" * 40)
         
-        response = query_rag(args.query)
-        
-        # Handle streaming vs non-streaming responses
-        if hasattr(response, '__iter__') and not isinstance(response, str):
-            for chunk in response:
-                print(chunk, end="", flush=True)
-            print()  # New line after streaming
-        else:
-            print(response)
+        print_events(query_rag_stream(args.query))
     
     else:
         # No query provided, show usage
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Chroma → Upstash Vector Migration (raw vectors)
+===============================================
+
+Copies the embeddings already stored in a Chroma database to Upstash
+Vector instead of sending text for Upstash to embed again. Chroma is read
+one page at a time and each page is upserted as raw vectors in concurrent,
+retried batches (see src/bulk_upsert.py), so a migration is a pure data
+copy bounded by bandwidth.
+
+Text and metadata come from data/foods.json in the same shape as
+upload_foods_to_upstash.py, and the upload is recorded in the same sync
+manifest: unchanged items are skipped on the next run, and the text
+uploader treats migrated items as up to date. Because the manifest then
+vouches for the vector, a Chroma vector is only copied when its stored
+document is exactly the text being recorded; any other item (a store that
+kept plain documents, or an item edited after the store was built) is sent
+as text for Upstash to embed.
+
+Afterwards a sample of items is verified twice: by querying Upstash with
+each item's own vector and comparing the top-k ranking with an exact
+cosine search over the Chroma vectors, and by querying with each item's
+original text, which must find the item, as real (text) queries would.
+
+Usage:
+    python3 scripts/migrate_chroma_to_upstash.py
+    python3 scripts/migrate_chroma_to_upstash.py --dry-run
+    python3 scripts/migrate_chroma_to_upstash.py --full --prune
+    python3 scripts/migrate_chroma_to_upstash.py --verify-only --sample 20
+    python3 scripts/migrate_chroma_to_upstash.py --chroma-dir chroma_db
+"""
+
+import os
+import sys
+import random
+import argparse
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Add the repo root (upload script) and src directory to path
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.join(ROOT_DIR, 'src'))
+
+from resilience import get_policy
+
+DEFAULT_CHROMA_DIR = os.path.join(ROOT_DIR, 'local-version', 'chroma_db_backup')
+COLLECTION_NAME = "foods"
+FOODS_DATASET = "foods"
+PAGE_SIZE = 500
+VERIFY_SAMPLE = 10
+VERIFY_TOP_K = 5
+MIN_OVERLAP = 0.8
+MIN_TEXT_HITS = 0.8
+
+
+def print_header(text):
+    """Print formatted header"""
+    print(f"\n{'='*70}")
+    print(f"  {text}")
+    print(f"{'='*70}\n")
+
+
+def iter_chroma_pages(collection, page_size=PAGE_SIZE, ids=None):
+    """Yield (ids, embeddings, documents) pages from a Chroma collection"""
+    if ids is not None:
+        ids = list(ids)
+        for start in range(0, len(ids), page_size):
+            page = collection.get(ids=ids[start:start + page_size],
+                                  include=["embeddings", "documents"])
+            yield page["ids"], page["embeddings"], page["documents"]
+        return
+
+    offset = 0
+    while True:
+        page = collection.get(limit=page_size, offset=offset,
+                              include=["embeddings", "documents"])
+        if not len(page["ids"]):
+            return
+        yield page["ids"], page["embeddings"], page["documents"]
+        offset += len(page["ids"])
+
+
+def make_raw_upsert(collection, namespace, page_size, checkpoint_path):
+    """
+    Build an upsert_fn for sync_vectors that sends Chroma vectors
+
+    sync_vectors plans with (id, text, metadata) tuples; this looks up each
+    planned ID's stored embedding page by page and uploads it as a raw
+    vector when the Chroma document is the planned text, keeping that text
+    as the vector's data. Everything else is sent as text.
+    """
+    from bulk_upsert import bulk_upsert
+
+    def upsert(index, vectors):
+        planned = {vector[0]: vector for vector in vectors}
+        copied = set()
+        for page_ids, embeddings, documents in iter_chroma_pages(collection, page_size, ids=planned):
+            batch = []
+            for vector_id, embedding, document in zip(page_ids, embeddings, documents):
+                _, text, metadata = planned[vector_id]
+                if document != text:
+                    continue
+                batch.append({
+                    "id": vector_id,
+                    "vector": [float(x) for x in embedding],
+                    "metadata": metadata,
+                    "data": text,
+                })
+                copied.add(vector_id)
+            if batch:
+                bulk_upsert(index, batch, checkpoint_path=checkpoint_path, namespace=namespace)
+
+        # Not in Chroma, or embedded from different text (stale or plain documents)
+        as_text = [planned[vector_id] for vector_id in planned if vector_id not in copied]
+        if as_text:
+            print(f"⚠️  {len(as_text)} items have no matching Chroma embedding; "
+                  f"sending their text for Upstash to embed: {[v[0] for v in as_text]}")
+            bulk_upsert(index, as_text, checkpoint_path=checkpoint_path, namespace=namespace)
+        print(f"📦 {len(copied)} vectors copied from Chroma, {len(as_text)} sent as text")
+
+    return upsert
+
+
+def check_dimension(index, collection):
+    """Abort early if the Chroma vectors do not fit the Upstash index"""
+    sample = collection.get(limit=1, include=["embeddings"])
+    if not len(sample["ids"]):
+        raise RuntimeError("Chroma collection is empty")
+    chroma_dim = len(sample["embeddings"][0])
+    upstash_dim = get_policy("upstash").call(index.info).dimension
+    if chroma_dim != upstash_dim:
+        raise RuntimeError(
+            f"Chroma vectors are {chroma_dim}-d but the Upstash index is {upstash_dim}-d"
+        )
+    return chroma_dim
+
+
+def exact_top_k(collection, queries, top_k, page_size=PAGE_SIZE):
+    """
+    Exact cosine top-k of each query over every Chroma vector
+
+    Chroma's own query uses approximate HNSW search and L2 distance on
+    unnormalised vectors, so its ranking is not a fair reference for a
+    cosine index. This scans the stored vectors page by page and keeps a
+    running top-k per query.
+    """
+    import numpy as np
+
+    queries = np.asarray(queries, dtype=np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+    best_ids = np.empty((len(queries), 0), dtype=object)
+
+    for page_ids, embeddings, _ in iter_chroma_pages(collection, page_size):
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        scores = np.concatenate([best_scores, queries @ (matrix / norms).T], axis=1)
+        ids = np.concatenate([best_ids, np.tile(np.array(page_ids, dtype=object), (len(queries), 1))], axis=1)
+        keep = np.argsort(-scores, axis=1)[:, :top_k]
+        best_scores = np.take_along_axis(scores, keep, axis=1)
+        best_ids = np.take_along_axis(ids, keep, axis=1)
+
+    return [list(row) for row in best_ids]
+
+
+def verify_sample(index, collection, namespace, sample_size=VERIFY_SAMPLE, top_k=VERIFY_TOP_K, seed=0):
+    """
+    Query Upstash with a sample of stored vectors and compare its rankings
+    with an exact cosine search over the Chroma vectors
+
+    Returns:
+        Dictionary with sample size, mean top-k overlap, how many queries
+        ranked the item itself first in Upstash, and per-item details
+    """
+    all_ids = collection.get(include=[])["ids"]
+    sample_ids = random.Random(seed).sample(all_ids, min(sample_size, len(all_ids)))
+    if not sample_ids:
+        return {"sample": 0, "mean_overlap": 0.0, "self_top1": 0, "items": []}
+
+    page = collection.get(ids=sample_ids, include=["embeddings"])
+    embeddings = [[float(x) for x in embedding] for embedding in page["embeddings"]]
+    references = exact_top_k(collection, embeddings, top_k)
+
+    items = []
+    for vector_id, embedding, reference in zip(page["ids"], embeddings, references):
+        results = get_policy("upstash").call(
+            lambda: index.query(vector=embedding, top_k=top_k, namespace=namespace)
+        )
+        upstash_ids = [r.id for r in results]
+        overlap = len(set(reference) & set(upstash_ids)) / max(1, len(reference))
+        items.append({
+            "id": vector_id,
+            "chroma": reference,
+            "upstash": upstash_ids,
+            "overlap": round(overlap, 3),
+            "self_top1": bool(upstash_ids) and upstash_ids[0] == vector_id,
+        })
+
+    return {
+        "sample": len(items),
+        "mean_overlap": round(sum(item["overlap"] for item in items) / len(items), 3),
+        "self_top1": sum(item["self_top1"] for item in items),
+        "items": items,
+    }
+
+
+def verify_text_queries(index, vectors, namespace, sample_size=VERIFY_SAMPLE, top_k=VERIFY_TOP_K, seed=0):
+    """
+    Query Upstash with a sample of items' original text, as users' text
+    queries are embedded, and check each item is retrieved
+
+    A copied vector that does not represent its text passes the vector
+    check above but fails this one.
+
+    Returns:
+        Dictionary with sample size, how many items were found in the
+        top-k, and per-item details
+    """
+    sample = random.Random(seed).sample(vectors, min(sample_size, len(vectors)))
+    items = []
+    for vector_id, text, metadata in sample:
+        query = metadata.get("original_text") or text
+        results = get_policy("upstash").call(
+            lambda: index.query(data=query, top_k=top_k, namespace=namespace)
+        )
+        found = [r.id for r in results]
+        items.append({"id": vector_id, "found": vector_id in found, "upstash": found})
+    return {
+        "sample": len(items),
+        "hits": sum(item["found"] for item in items),
+        "items": items,
+    }
+
+
+def print_verification(report, top_k):
+    for item in report["items"]:
+        status = "✅" if item["overlap"] >= MIN_OVERLAP and item["self_top1"] else "⚠️"
+        print(f"{status} {item['id']:>5}: overlap@{top_k} {item['overlap']:.2f}  "
+              f"chroma {item['chroma']}  upstash {item['upstash']}")
+    print(f"\n📊 Mean overlap@{top_k}: {report['mean_overlap']:.3f}, "
+          f"self ranked first: {report['self_top1']}/{report['sample']}")
+
+
+def print_text_verification(report, top_k):
+    for item in report["items"]:
+        status = "✅" if item["found"] else "⚠️"
+        print(f"{status} {item['id']:>5}: text query top-{top_k} {item['upstash']}")
+    print(f"\n📊 Found by their own text: {report['hits']}/{report['sample']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Copy Chroma embeddings to Upstash Vector as raw vectors')
+    parser.add_argument('--chroma-dir', default=DEFAULT_CHROMA_DIR)
+    parser.add_argument('--collection', default=COLLECTION_NAME)
+    parser.add_argument('--json-file', default=os.path.join(ROOT_DIR, 'data', 'foods.json'))
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE)
+    parser.add_argument('--dry-run', action='store_true', help='Show the diff only')
+    parser.add_argument('--full', action='store_true', help='Ignore the manifest and copy everything')
+    parser.add_argument('--prune', action='store_true', help='Also delete items removed from foods.json')
+    parser.add_argument('--verify-only', action='store_true', help='Skip the copy, only verify')
+    parser.add_argument('--sample', type=int, default=VERIFY_SAMPLE, help='Items to verify (0 to skip)')
+    parser.add_argument('--top-k', type=int, default=VERIFY_TOP_K)
+    args = parser.parse_args()
+
+    import chromadb
+    from dotenv import load_dotenv
+    from upstash_vector import Index
+    from upstash_sync import sync_vectors, dataset_namespace, MANIFEST_FILE
+    from upload_foods_to_upstash import load_food_data, prepare_vectors
+
+    load_dotenv()
+    namespace = dataset_namespace(FOODS_DATASET)
+
+    print_header("🔄 CHROMA → UPSTASH VECTOR MIGRATION")
+    client = chromadb.PersistentClient(path=args.chroma_dir)
+    collection = client.get_collection(args.collection)
+    index = Index.from_env(retries=0)  # Retries go through get_policy("upstash")
+    print(f"📁 Chroma: {args.chroma_dir} ({collection.count()} vectors)")
+    print(f"🔗 Upstash namespace: '{namespace or 'default'}'")
+
+    try:
+        dimension = check_dimension(index, collection)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"✅ Dimensions match ({dimension}-d)")
+
+    vectors = prepare_vectors(load_food_data(args.json_file))
+    if not args.verify_only:
+        checkpoint_path = f"{MANIFEST_FILE}.{FOODS_DATASET}.migrate.checkpoint"
+        result = sync_vectors(
+            index, FOODS_DATASET, vectors,
+            prune=args.prune, dry_run=args.dry_run, full=args.full,
+            upsert_fn=make_raw_upsert(collection, namespace, args.page_size, checkpoint_path),
+        )
+        if args.dry_run:
+            return
+        print(f"✅ Migration complete! ({result['upserted']} copied, "
+              f"{result['unchanged']} unchanged, {result['deleted']} deleted)")
+
+    if args.sample > 0:
+        print_header("🧪 RANKING VERIFICATION")
+        report = verify_sample(index, collection, namespace, args.sample, args.top_k)
+        print_verification(report, args.top_k)
+        if report["mean_overlap"] < MIN_OVERLAP:
+            print(f"❌ Rankings differ more than expected (mean overlap < {MIN_OVERLAP})")
+            sys.exit(1)
+        print("✅ Rankings match")
+
+        print_header("🧪 TEXT QUERY VERIFICATION")
+        text_report = verify_text_queries(index, vectors, namespace, args.sample, args.top_k)
+        print_text_verification(text_report, args.top_k)
+        if text_report["hits"] < MIN_TEXT_HITS * text_report["sample"]:
+            print(f"❌ Too few items found by their own text (< {MIN_TEXT_HITS:.0%})")
+            sys.exit(1)
+        print("✅ Text queries find their items")
+
+
+if __name__ == "__main__":
+    main()
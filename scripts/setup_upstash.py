@@ -8,7 +8,9 @@ This script helps you set up and validate your Upstash Vector configuration.
 Usage:
     python3 scripts/setup_upstash.py --validate    # Check configuration
     python3 scripts/setup_upstash.py --test        # Test connection
-    python3 scripts/setup_upstash.py --upload      # Upload data
+    python3 scripts/setup_upstash.py --upload      # Upload new/changed data
+    python3 scripts/setup_upstash.py --upload --dry-run  # Show the diff only
+    python3 scripts/setup_upstash.py --upload --prune    # Also delete removed items
     python3 scripts/setup_upstash.py --query TEXT  # Test query
 """
 
@@ -17,6 +19,9 @@ import sys
 import json
 from pathlib import Path
 
+# Add src directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
 def print_header(text):
     """Print formatted header"""
     print(f"\n{'='*70}")
@@ -94,15 +99,16 @@ def test_connection():
     try:
         from upstash_vector import Index
         from dotenv import load_dotenv
+        from resilience import get_policy
         
         load_dotenv()
         
         print("🔄 Initializing Upstash Vector client...")
-        index = Index.from_env()
+        index = Index.from_env(retries=0)  # Retries go through get_policy("upstash")
         print("✅ Client initialized successfully")
         
         print("\n🔄 Fetching index information...")
-        info = index.info()
+        info = get_policy("upstash").call(index.info)
         
         print(f"\n📊 Index Information:")
         print(f"   Vectors: {info.vector_count}")
@@ -125,13 +131,16 @@ def test_connection():
         print("3. Ensure index is created with correct embedding model")
         return False
 
-def upload_data():
-    """Upload food data to Upstash Vector"""
+def upload_data(dry_run=False, prune=False):
+    """Upload new or changed food data to Upstash Vector"""
     print_header("📤 Uploading Data to Upstash Vector")
     
     try:
         from upstash_vector import Index
         from dotenv import load_dotenv
+        from resilience import get_policy
+        from upstash_sync import sync_vectors
+        from food_catalog import prepare_food_vectors
         
         load_dotenv()
         
@@ -148,61 +157,25 @@ def upload_data():
         
         # Initialize index
         print("🔄 Connecting to Upstash Vector...")
-        index = Index.from_env()
+        index = Index.from_env(retries=0)  # Retries go through get_policy("upstash")
         print("✅ Connected")
         
         # Prepare vectors
         print(f"\n🔄 Preparing {len(food_data)} vectors for upload...")
-        vectors = []
-        
-        for item in food_data:
-            # Handle two data formats: simple (text/region/type) and detailed (name/description/origin)
-            if "text" in item:
-                # Format 1: Simple format
-                enriched_text = item["text"]
-                if "region" in item:
-                    enriched_text += f" This food is popular in {item['region']}."
-                if "type" in item:
-                    enriched_text += f" It is a type of {item['type']}."
-                
-                vectors.append((
-                    item["id"],
-                    enriched_text,
-                    {
-                        "original_text": item["text"],
-                        "region": item.get("region", "Unknown"),
-                        "type": item.get("type", "Unknown")
-                    }
-                ))
-            else:
-                # Format 2: Detailed format (name/description/origin/ingredients)
-                enriched_text = f"{item['name']}: {item['description']}"
-                if "origin" in item:
-                    enriched_text += f" This dish originates from {item['origin']}."
-                if "ingredients" in item:
-                    ingredients = ", ".join(item['ingredients'][:5])  # First 5 ingredients
-                    enriched_text += f" Main ingredients: {ingredients}."
-                
-                vectors.append((
-                    item["id"],
-                    enriched_text,
-                    {
-                        "original_text": item.get("description", item.get("name", "")),
-                        "name": item.get("name", "Unknown"),
-                        "origin": item.get("origin", "Unknown"),
-                        "category": item.get("category", "Unknown")
-                    }
-                ))
+        vectors = prepare_food_vectors(food_data)
         
         print("✅ Vectors prepared")
         
         # Upload
-        print(f"\n📤 Uploading to Upstash...")
-        index.upsert(vectors=vectors)
-        print("✅ Upload complete!")
+        print(f"\n📤 Syncing to Upstash...")
+        result = sync_vectors(index, "foods", vectors, prune=prune, dry_run=dry_run)
+        if dry_run:
+            return True
+        print(f"✅ Upload complete! ({result['upserted']} uploaded, "
+              f"{result['unchanged']} unchanged, {result['deleted']} deleted)")
         
         # Verify
-        info = index.info()
+        info = get_policy("upstash").call(index.info)
         print(f"\n✅ Success! Index now has {info.vector_count} vectors")
         
         return True
@@ -220,19 +193,20 @@ def test_query(query_text):
     try:
         from upstash_vector import Index
         from dotenv import load_dotenv
+        from resilience import get_policy
         
         load_dotenv()
         
         print("🔄 Connecting to Upstash Vector...")
-        index = Index.from_env()
+        index = Index.from_env(retries=0)  # Retries go through get_policy("upstash")
         print("✅ Connected")
         
         print(f"\n🔍 Searching for: '{query_text}'")
-        results = index.query(
+        results = get_policy("upstash").call(lambda: index.query(
             data=query_text,
             top_k=3,
             include_metadata=True
-        )
+        ))
         
         if not results:
             print("❌ No results found")
@@ -304,12 +278,16 @@ def main():
         if not validate_env_file():
             sys.exit(1)
         
-        response = input("\n⚠️  This will upload all food data to Upstash. Continue? (y/n): ")
-        if response.lower() != 'y':
-            print("❌ Upload cancelled")
-            sys.exit(0)
+        dry_run = "--dry-run" in sys.argv[2:]
+        prune = "--prune" in sys.argv[2:]
+        
+        if not dry_run:
+            response = input("\n⚠️  This will upload new or changed food data to Upstash. Continue? (y/n): ")
+            if response.lower() != 'y':
+                print("❌ Upload cancelled")
+                sys.exit(0)
         
-        if upload_data():
+        if upload_data(dry_run=dry_run, prune=prune):
             print("\n✅ Data upload successful!")
         else:
             sys.exit(1)
@@ -0,0 +1,254 @@
+"""
+Adaptive (AIMD) concurrency control for Groq and Upstash calls
+
+A fixed number of calls in flight is either too timid for a generous
+API key or too aggressive for a free one. A controller instead lets calls
+through up to its current limit and adjusts that limit from what it sees:
+
+- additive increase: each healthy call made while the limit was fully used
+  raises it by 1/limit, so it grows by about one per round of calls
+- multiplicative decrease: a 429, a timeout or a latency spike (more than
+  LATENCY_SPIKE times the running baseline) halves it
+
+Only one cut is made per round: signals from calls that started before the
+last cut describe the old limit and are ignored. Every adjustment is kept
+with its reason, and stats() exports the current limit for /health and
+batch reports.
+
+Usage:
+    from adaptive_concurrency import get_controller
+
+    controller = get_controller("upstash")
+    with controller.slot():                    # or: async with controller.async_slot()
+        index.upsert(vectors=batch)
+
+Configuration (environment variables, per controller name):
+    UPSTASH_MAX_CONCURRENCY   Upper bound on calls in flight (default 32)
+    GROQ_MAX_CONCURRENCY      Upper bound on calls in flight (default 16)
+"""
+
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+
+from resilience import classify
+
+# name -> (initial, maximum)
+DEFAULT_LIMITS = {
+    "groq": (2, 16),
+    "upstash": (4, 32),
+}
+MIN_CONCURRENCY = 1
+DECREASE_FACTOR = 0.5
+LATENCY_SPIKE = 2.5  # x baseline latency
+LATENCY_ALPHA = 0.1  # Weight of each new sample in the baseline
+WARMUP_SAMPLES = 5  # Healthy calls before spikes are judged
+HISTORY = 50  # Adjustments kept for stats()
+
+
+def overload_reason(error):
+    """"429" or "timeout" when an error means the API is overloaded, else None"""
+    return {"rate_limit": "429", "timeout": "timeout"}.get(classify(error))
+
+
+class Slot:
+    """One call in flight; the outcome is recorded when the slot is released"""
+
+    __slots__ = ("started", "error", "recorded")
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.error = None
+        self.recorded = True
+
+    def fail(self, error):
+        """Mark the call as failed without raising (e.g. an error response)"""
+        self.error = error
+
+    def discard(self):
+        """Release without recording (cache hits say nothing about the API)"""
+        self.recorded = False
+
+
+class AdaptiveConcurrency:
+    """AIMD limit on concurrent calls to one upstream API"""
+
+    def __init__(self, name, initial=4, maximum=32, minimum=MIN_CONCURRENCY):
+        self.name = name
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.limit = float(min(self.maximum, max(minimum, initial)))
+        self.in_flight = 0
+        self.baseline = None  # Seconds, moving average of successful calls
+        self.samples = 0
+        self.increases = 0
+        self.decreases = 0
+        self.adjustments = deque(maxlen=HISTORY)
+
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._async_waiters = []
+        self._last_decrease = 0.0
+
+    @property
+    def current_limit(self):
+        return int(self.limit)
+
+    def _try_enter(self):
+        if self.in_flight < self.current_limit:
+            self.in_flight += 1
+            return True
+        return False
+
+    def acquire(self):
+        """Block until a call may start"""
+        with self._available:
+            while not self._try_enter():
+                self._available.wait()
+        return Slot()
+
+    async def acquire_async(self):
+        """Wait without blocking the event loop until a call may start"""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._try_enter():
+                    return Slot()
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            await waiter
+
+    def _wake(self):
+        """Wake blocked callers (lock held)"""
+        self._available.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_resolve, waiter)
+
+    def release(self, slot):
+        """Free the slot and adjust the limit from the call's outcome"""
+        latency = time.monotonic() - slot.started
+        with self._lock:
+            saturated = self.in_flight >= self.current_limit
+            self.in_flight -= 1
+            if slot.recorded:
+                self._record(slot, latency, saturated)
+            self._wake()
+
+    def _record(self, slot, latency, saturated):
+        if slot.error is not None:
+            reason = overload_reason(slot.error)
+            if reason:
+                self._decrease(slot, reason)
+            return
+
+        spike = None
+        if self.samples >= WARMUP_SAMPLES and latency > LATENCY_SPIKE * self.baseline:
+            spike = (f"latency {latency * 1000:.0f}ms > "
+                     f"{LATENCY_SPIKE}x baseline {self.baseline * 1000:.0f}ms")
+        # Spikes feed the baseline too, so a lasting shift is learned
+        self.samples += 1
+        if self.baseline is None:
+            self.baseline = latency
+        else:
+            self.baseline += LATENCY_ALPHA * (latency - self.baseline)
+
+        if spike:
+            self._decrease(slot, spike)
+        elif saturated and self.limit < self.maximum:
+            before = self.current_limit
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            if self.current_limit > before:
+                self.increases += 1
+                self._log(before, "healthy at full concurrency")
+
+    def _decrease(self, slot, reason):
+        # Calls started before the last cut ran under the old limit
+        if slot.started < self._last_decrease:
+            return
+        before = self.current_limit
+        self.limit = max(self.minimum, self.limit * DECREASE_FACTOR)
+        self._last_decrease = time.monotonic()
+        self.decreases += 1
+        self._log(before, reason)
+
+    def _log(self, before, reason):
+        self.adjustments.append({
+            "time": round(time.time(), 3),
+            "from": before,
+            "to": self.current_limit,
+            "reason": reason,
+        })
+
+    @contextmanager
+    def slot(self):
+        """Hold a slot for the duration of a blocking call"""
+        slot = self.acquire()
+        try:
+            yield slot
+        except Exception as e:
+            slot.fail(e)
+            raise
+        finally:
+            self.release(slot)
+
+    @asynccontextmanager
+    async def async_slot(self):
+        """Hold a slot for the duration of an awaited call"""
+        slot = await self.acquire_async()
+        try:
+            yield slot
+        except Exception as e:
+            slot.fail(e)
+            raise
+        finally:
+            self.release(slot)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "limit": self.current_limit,
+                "in_flight": self.in_flight,
+                "minimum": self.minimum,
+                "maximum": self.maximum,
+                "baseline_ms": round(self.baseline * 1000, 1) if self.baseline is not None else None,
+                "increases": self.increases,
+                "decreases": self.decreases,
+                "adjustments": list(self.adjustments),
+            }
+
+
+def _resolve(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+
+def get_controller(name, initial=None):
+    """
+    Process-wide controller for an upstream API
+
+    initial only applies when the controller is first created.
+    """
+    with _controllers_lock:
+        if name not in _controllers:
+            default_initial, default_maximum = DEFAULT_LIMITS.get(name, (4, 32))
+            _controllers[name] = AdaptiveConcurrency(
+                name,
+                initial=initial or default_initial,
+                maximum=int(os.getenv(f"{name.upper()}_MAX_CONCURRENCY", str(default_maximum))),
+            )
+        return _controllers[name]
+
+
+def concurrency_stats():
+    """Current limits and recent adjustments for every controller"""
+    with _controllers_lock:
+        controllers = dict(_controllers)
+    return {name: controller.stats() for name, controller in controllers.items()}
@@ -0,0 +1,300 @@
+"""
+Persistent answer cache shared by every process
+
+rag_api.py and vivian_profile_query.py usually run as one process per
+website request, so an in-memory cache never sees a repeat. This cache
+lives in a SQLite database in WAL mode: any number of processes read it
+concurrently without blocking each other or the writer, and a repeat
+question is answered without touching Upstash or Groq.
+
+Entries are keyed by the normalised question, the data version (size and
+mtime of the data files) and a fingerprint of the model/prompt parameters,
+so changing the catalog, the model or the prompt never serves a stale
+answer. Normalising only folds case, collapses whitespace and drops
+trailing punctuation; stopwords are kept, since "what is in X" and "how is
+X made" must not share an answer. The database is bounded by total size
+(least recently used entries go first) and by age.
+
+This module only uses the standard library so that a cache hit does not
+pay for importing NumPy or the API clients.
+
+Usage:
+    python3 src/answer_cache.py stats
+    python3 src/answer_cache.py warm questions.txt --dataset food
+    python3 src/answer_cache.py purge --older-than 86400
+    python3 src/answer_cache.py purge --all
+
+Configuration (environment variables):
+    RAG_ANSWER_CACHE            Set to 0 to disable (default 1)
+    RAG_ANSWER_CACHE_DB         Database path (default .cache/answers.sqlite3)
+    RAG_ANSWER_CACHE_MAX_BYTES  Size bound for stored answers (default 64 MB)
+    RAG_ANSWER_CACHE_TTL        Seconds an answer stays valid (default 7 days)
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_FILES = (
+    os.path.join(BASE_DIR, "..", "data", "foods.json"),
+    os.path.join(BASE_DIR, "..", "data", "vivian_professional_profile.json"),
+)
+
+RAG_ANSWER_CACHE = os.getenv("RAG_ANSWER_CACHE", "1") != "0"
+RAG_ANSWER_CACHE_DB = os.getenv(
+    "RAG_ANSWER_CACHE_DB", os.path.join(BASE_DIR, "..", ".cache", "answers.sqlite3")
+)
+RAG_ANSWER_CACHE_MAX_BYTES = int(os.getenv("RAG_ANSWER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RAG_ANSWER_CACHE_TTL = float(os.getenv("RAG_ANSWER_CACHE_TTL", str(7 * 24 * 3600)))
+BUSY_TIMEOUT_MS = 200
+# Touching last-access on every hit would turn reads into writes; only
+# refresh it (and flush the hits counted since) when it is older than this
+ACCESS_REFRESH_SECONDS = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    key TEXT PRIMARY KEY,
+    scope TEXT NOT NULL,
+    question TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS answers_accessed ON answers (accessed);
+"""
+
+
+def normalize_question(question):
+    """Case-folded, whitespace-collapsed question without trailing ?/!/."""
+    return " ".join(str(question).casefold().split()).rstrip("?!. ")
+
+
+def data_version(paths=DATA_FILES):
+    """Size and mtime of each data file"""
+    parts = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            parts.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+        except OSError:
+            parts.append("-")
+    return "|".join(parts)
+
+
+def cache_key(scope, question, params):
+    """Key for a question under a scope ("food"/"profile") and model/prompt params"""
+    payload = json.dumps([scope, normalize_question(question), data_version(), params],
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """SQLite (WAL) answer store safe to share between processes"""
+
+    def __init__(self, path=None, max_bytes=None, ttl=None):
+        self.path = path or RAG_ANSWER_CACHE_DB
+        self.max_bytes = RAG_ANSWER_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.ttl = RAG_ANSWER_CACHE_TTL if ttl is None else ttl
+        self._local = threading.local()
+        self._pending_hits = {}  # key -> [scope, hits not yet written]
+        self._pending_lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+
+    def _connect(self):
+        """One connection per thread (sqlite3 connections are not shareable)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, scope, question, params):
+        """Cached response dict for the question, or None"""
+        key = cache_key(scope, question, params)
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT response, created, accessed FROM answers WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        response, created, accessed = row
+        now = time.time()
+        if now - created > self.ttl:
+            return None
+        with self._pending_lock:
+            pending = self._pending_hits.setdefault(key, [scope, 0])
+            pending[1] += 1
+            hits = pending[1]
+        if now - accessed > ACCESS_REFRESH_SECONDS:
+            try:
+                conn.execute(
+                    "UPDATE answers SET accessed = ?, hits = hits + ? WHERE key = ?", (now, hits, key)
+                )
+            except sqlite3.OperationalError:
+                pass  # Another process is writing; the stamp and hits can wait
+            else:
+                with self._pending_lock:
+                    pending[1] -= hits
+                    if not pending[1]:
+                        self._pending_hits.pop(key, None)
+        return json.loads(response)
+
+    def put(self, scope, question, params, response):
+        """Store a response and evict least recently used entries over the size bound"""
+        key = cache_key(scope, question, params)
+        encoded = json.dumps(response, ensure_ascii=False)
+        size = len(encoded.encode("utf-8")) + len(question.encode("utf-8"))
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO answers (key, scope, question, response, size, created, accessed, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                (key, scope, question, encoded, size, now, now)
+            )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM answers").fetchone()[0]
+            if total > self.max_bytes:
+                self._evict(conn, total - self.max_bytes)
+            conn.execute("COMMIT")
+        except sqlite3.OperationalError:
+            # Busy for longer than the timeout: skip caching this answer
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+
+    def _evict(self, conn, excess):
+        freed = 0
+        doomed = []
+        for key, size in conn.execute("SELECT key, size FROM answers ORDER BY accessed"):
+            doomed.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM answers WHERE key = ?", doomed)
+
+    def purge(self, scope=None, older_than=None):
+        """Delete entries (optionally only a scope and/or older than N seconds)"""
+        clauses, args = [], []
+        if scope:
+            clauses.append("scope = ?")
+            args.append(scope)
+        if older_than is not None:
+            clauses.append("created < ?")
+            args.append(time.time() - older_than)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        conn = self._connect()
+        deleted = conn.execute(f"DELETE FROM answers{where}", args).rowcount
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return deleted
+
+    def stats(self):
+        conn = self._connect()
+        scopes = {}
+        for scope, entries, size, hits, oldest in conn.execute(
+            "SELECT scope, COUNT(*), SUM(size), SUM(hits), MIN(created) FROM answers GROUP BY scope"
+        ):
+            scopes[scope] = {
+                "entries": entries,
+                "bytes": size,
+                "hits": hits,
+                "oldest_seconds": round(time.time() - oldest),
+            }
+        # Hits this process has not written yet
+        with self._pending_lock:
+            pending = list(self._pending_hits.values())
+        for scope, hits in pending:
+            if scope in scopes:
+                scopes[scope]["hits"] += hits
+        return {
+            "path": os.path.abspath(self.path),
+            "file_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "scopes": scopes,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """Process-wide cache, or None when disabled or the database is unusable"""
+    global _cache
+    if not RAG_ANSWER_CACHE:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = AnswerCache()
+            except (sqlite3.Error, OSError):
+                return None
+        return _cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Persistent answer cache tools')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    sub.add_parser('stats', help='Show entries, size and hits per scope')
+
+    warm = sub.add_parser('warm', help='Answer questions from a file (one per line) to fill the cache')
+    warm.add_argument('file')
+    warm.add_argument('--dataset', choices=['food', 'profile'], default='food')
+
+    purge = sub.add_parser('purge', help='Delete cached answers')
+    purge.add_argument('--scope', choices=['food', 'profile'])
+    purge.add_argument('--older-than', type=float, help='Only entries older than N seconds')
+    purge.add_argument('--all', action='store_true', help='Delete everything')
+
+    args = parser.parse_args()
+    cache = AnswerCache()
+
+    if args.command == 'stats':
+        print(json.dumps(cache.stats(), indent=2))
+
+    elif args.command == 'warm':
+        # The pipelines live in the repo root
+        sys.path.insert(0, os.path.join(BASE_DIR, ".."))
+        if args.dataset == 'profile':
+            from vivian_profile_query import handle_request
+        else:
+            from rag_api import handle_request
+        with open(args.file, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+        warmed = 0
+        for question in questions:
+            started = time.perf_counter()
+            response = handle_request({"question": question})
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            status = "✅" if response.get("success") else "❌"
+            if response.get("success"):
+                warmed += 1
+            print(f"{status} {elapsed_ms:7.1f}ms  {question}")
+        print(f"🔥 Warmed {warmed}/{len(questions)} questions")
+
+    elif args.command == 'purge':
+        if not (args.all or args.scope or args.older_than is not None):
+            parser.error('purge needs --all, --scope or --older-than')
+        deleted = cache.purge(scope=args.scope, older_than=args.older_than)
+        print(f"🧹 Deleted {deleted} cached answers")
+
+
+if __name__ == "__main__":
+    main()
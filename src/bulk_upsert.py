@@ -0,0 +1,230 @@
+"""
+Chunked, concurrent, retrying bulk upsert for Upstash Vector
+
+Vectors are split into batches bounded by item count and serialized size,
+uploaded by a bounded pool of workers with per-batch retries (jittered
+backoff, retry budget and circuit breaker from src/resilience.py), and
+recorded in a checkpoint file so an interrupted run resumes where it
+stopped instead of starting over.
+
+By default the number of batches in flight is set by the shared "upstash"
+adaptive controller (see src/adaptive_concurrency.py): it starts at
+UPSTASH_UPLOAD_CONCURRENCY, grows while uploads stay fast and is cut on
+429s, timeouts and latency spikes.
+
+Usage:
+    from bulk_upsert import bulk_upsert
+
+    stats = bulk_upsert(index, vectors, checkpoint_path=".upload.checkpoint")
+
+Configuration (environment variables):
+    UPSTASH_BATCH_ITEMS         Max vectors per request (default 100)
+    UPSTASH_BATCH_BYTES         Max serialized bytes per request (default 1 MB)
+    UPSTASH_UPLOAD_CONCURRENCY  Batches in flight at the start (default 4)
+    UPSTASH_MAX_CONCURRENCY     Upper bound for the adaptive controller (default 32)
+    ADAPTIVE_CONCURRENCY        Set to 0 for a fixed number of batches in flight
+    UPSTASH_UPLOAD_RETRIES      Attempts per batch (default 5)
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from adaptive_concurrency import get_controller
+from resilience import get_policy
+
+UPSTASH_BATCH_ITEMS = int(os.getenv("UPSTASH_BATCH_ITEMS", "100"))
+UPSTASH_BATCH_BYTES = int(os.getenv("UPSTASH_BATCH_BYTES", str(1024 * 1024)))
+UPSTASH_UPLOAD_CONCURRENCY = int(os.getenv("UPSTASH_UPLOAD_CONCURRENCY", "4"))
+UPSTASH_UPLOAD_RETRIES = int(os.getenv("UPSTASH_UPLOAD_RETRIES", "5"))
+ADAPTIVE_CONCURRENCY = os.getenv("ADAPTIVE_CONCURRENCY", "1") != "0"
+
+
+class BulkUpsertError(Exception):
+    """Raised when some batches still failed after all retries"""
+
+    def __init__(self, message, stats):
+        super().__init__(message)
+        self.stats = stats
+
+
+def _serialize(vector):
+    """JSON form of a vector tuple/dict, used for sizing and batch keys"""
+    if isinstance(vector, dict):
+        return json.dumps(vector, sort_keys=True, default=str)
+    return json.dumps(list(vector), sort_keys=True, default=str)
+
+
+def make_batches(vectors, max_items=None, max_bytes=None):
+    """
+    Split vectors into batches bounded by count and serialized size
+
+    Returns:
+        List of (batch_key, vectors) where batch_key is a content hash
+    """
+    max_items = max(1, max_items or UPSTASH_BATCH_ITEMS)
+    max_bytes = max(1, max_bytes or UPSTASH_BATCH_BYTES)
+
+    batches = []
+    current, current_bytes = [], 0
+    digest = hashlib.sha256()
+
+    def flush():
+        batches.append((digest.hexdigest()[:24], current))
+
+    for vector in vectors:
+        encoded = _serialize(vector).encode("utf-8")
+        if current and (len(current) >= max_items or current_bytes + len(encoded) > max_bytes):
+            flush()
+            current, current_bytes = [], 0
+            digest = hashlib.sha256()
+        current.append(vector)
+        current_bytes += len(encoded)
+        digest.update(encoded)
+
+    if current:
+        flush()
+    return batches
+
+
+class Checkpoint:
+    """Set of completed batch keys persisted to a small JSON file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.done = set(json.load(f).get("done", []))
+            except (ValueError, OSError):
+                self.done = set()
+
+    def mark(self, key):
+        with self._lock:
+            self.done.add(key)
+            if self.path:
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"done": sorted(self.done)}, f)
+                os.replace(tmp_path, self.path)
+
+    def clear(self):
+        with self._lock:
+            self.done = set()
+            if self.path and os.path.exists(self.path):
+                os.remove(self.path)
+
+
+def _upsert_with_retry(index, batch, max_retries, upsert_kwargs, controller=None):
+    """Upload one batch through the Upstash retry policy; returns the retries used"""
+    retries = []
+
+    def upsert():
+        if controller is None:
+            index.upsert(vectors=batch, **upsert_kwargs)
+        else:
+            with controller.slot():
+                index.upsert(vectors=batch, **upsert_kwargs)
+
+    get_policy("upstash").call(upsert, attempts=max_retries,
+                               on_retry=lambda attempt, error, delay: retries.append(attempt))
+    return len(retries)
+
+
+def bulk_upsert(index, vectors, max_items=None, max_bytes=None, concurrency=None,
+                max_retries=None, checkpoint_path=None, verbose=True, **upsert_kwargs):
+    """
+    Upsert many vectors in size-bounded, concurrent, retried batches
+
+    Args:
+        index: Upstash Vector index
+        vectors: (id, data_or_vector, metadata) tuples or Upstash vector dicts
+        max_items / max_bytes: Batch limits (count and serialized bytes)
+        concurrency: Batches uploaded in parallel; fixed when given,
+            otherwise adjusted by the adaptive controller
+        max_retries: Attempts per batch before giving up on it
+        checkpoint_path: File recording finished batches; removed on success
+        **upsert_kwargs: Passed through to index.upsert (e.g. namespace)
+
+    Returns:
+        Dictionary with counts, elapsed seconds and vectors/sec
+
+    Raises:
+        BulkUpsertError: If any batch failed after all retries (the
+        checkpoint keeps the finished ones for the next run)
+    """
+    controller = None
+    if concurrency is None and ADAPTIVE_CONCURRENCY:
+        controller = get_controller("upstash", initial=UPSTASH_UPLOAD_CONCURRENCY)
+        # The controller decides how many of these workers upload at once
+        workers = controller.maximum
+    else:
+        workers = max(1, concurrency or UPSTASH_UPLOAD_CONCURRENCY)
+    max_retries = max(1, max_retries or UPSTASH_UPLOAD_RETRIES)
+
+    batches = make_batches(vectors, max_items, max_bytes)
+    checkpoint = Checkpoint(checkpoint_path)
+    pending = [(key, batch) for key, batch in batches if key not in checkpoint.done]
+    skipped = sum(len(batch) for key, batch in batches if key in checkpoint.done)
+
+    if verbose and skipped:
+        print(f"⏩ Resuming: {skipped} vectors already uploaded by a previous run")
+
+    started = time.perf_counter()
+    uploaded = 0
+    retries = 0
+    failures = []
+
+    with ThreadPoolExecutor(max_workers=min(workers, max(1, len(pending)))) as pool:
+        futures = {
+            pool.submit(_upsert_with_retry, index, batch, max_retries, upsert_kwargs, controller): (key, batch)
+            for key, batch in pending
+        }
+        for future in as_completed(futures):
+            key, batch = futures[future]
+            try:
+                retries += future.result()
+            except Exception as e:
+                failures.append({"batch": key, "size": len(batch), "error": str(e)})
+                continue
+            checkpoint.mark(key)
+            uploaded += len(batch)
+            if verbose:
+                print(f"   ⬆️  {uploaded + skipped}/{len(vectors)} vectors", end="\r", flush=True)
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        "vectors": len(vectors),
+        "uploaded": uploaded,
+        "skipped": skipped,
+        "batches": len(batches),
+        "failed_batches": len(failures),
+        "retries": retries,
+        "seconds": round(elapsed, 2),
+        "vectors_per_second": round(uploaded / elapsed, 1) if elapsed > 0 else 0.0,
+        "concurrency": controller.current_limit if controller else workers,
+    }
+    if controller:
+        stats["adjustments"] = controller.stats()["adjustments"]
+
+    if verbose:
+        mode = " (adaptive)" if controller else ""
+        print(f"\n📈 Upserted {uploaded} vectors in {stats['seconds']}s "
+              f"({stats['vectors_per_second']} vectors/s, {len(batches)} batches, "
+              f"{stats['concurrency']} concurrent{mode}, {retries} retries)")
+        for adjustment in stats.get("adjustments", [])[-5:]:
+            print(f"   🎚️  Concurrency {adjustment['from']} → {adjustment['to']}: {adjustment['reason']}")
+
+    if failures:
+        stats["failures"] = failures
+        raise BulkUpsertError(
+            f"{len(failures)} of {len(batches)} batches failed; rerun to resume", stats
+        )
+
+    checkpoint.clear()
+    return stats
@@ -0,0 +1,242 @@
+"""
+Exact list/count answers over the food catalog
+
+"List all the Japanese desserts" or "how many vegetarian main courses do
+you have" cannot be answered from a top-3 vector search. This module
+detects enumeration and count intents, turns the rest of the question into
+metadata filters (see metadata_index.py) and evaluates them against every
+item in data/foods.json, returning the complete, paginated result set in
+milliseconds. The LLM is only involved when a summary is asked for.
+
+Only questions about the catalog itself are taken over: the question must
+name catalog entries ("dishes", "desserts", ...) and either narrow them
+with at least one filter or ask for all of them. "How many calories are in
+Pad Thai?" or "tell me all about Biryani" fall through to RAG.
+
+Usage:
+    python3 src/catalog_query.py "how many Japanese dishes do you have?"
+    python3 src/catalog_query.py "list all desserts" --page 2 --page-size 5
+    python3 src/catalog_query.py "list all vegan dishes" --summarize
+"""
+
+import os
+import re
+import json
+import math
+import argparse
+import threading
+
+from food_catalog import load_food_catalog
+from lexical_index import tokenize
+from metadata_index import MetadataIndex, parse_filters
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+JSON_FILE = os.path.join(BASE_DIR, "..", "data", "foods.json")
+PAGE_SIZE = 20
+LLM_MODEL = "llama-3.1-8b-instant"
+SUMMARY_MAX_TOKENS = 300
+
+_COUNT_RE = re.compile(r"\b(how many|number of|count)\b", re.IGNORECASE)
+_LIST_RE = re.compile(
+    r"\b(list|enumerate)\b"
+    r"|\b(show|give|tell)\b.*\b(all|every)\b"
+    r"|\b(all|every) (the |of the |your )?\w*\s*(dishes|foods|items|desserts|snacks|soups|drinks|courses|meals)\b"
+    r"|\bwhat\b.*\bdo you have\b"
+    r"|\bwhich\b.*\b(are there|do you have)\b",
+    re.IGNORECASE,
+)
+# Asking for the whole catalog, with no filter needed
+_ALL_RE = re.compile(
+    r"\b(all|every)\s+(of\s+)?(the\s+|your\s+)?(food\s+)?(dish|dishes|foods?|items?|meals?|recipes?)\b"
+    r"|\bhow many\s+(food\s+)?(dishes|foods|items|meals|recipes)\s+(do you have|are there|are in)\b",
+    re.IGNORECASE,
+)
+# Words naming catalog entries, as lexical_index stems ("desserts" -> "dessert")
+CATALOG_NOUNS = {
+    "dish", "food", "item", "meal", "recipe", "course", "main",
+    "dessert", "snack", "soup", "drink", "beverage", "appetizer", "salad",
+}
+
+
+def detect_intent(question):
+    """
+    Return "count" or "list" for a question about the catalog, or None for
+    an ordinary question (including "how many calories are in Pad Thai?")
+    """
+    if not CATALOG_NOUNS.intersection(tokenize(question)):
+        return None
+    if _COUNT_RE.search(question):
+        return "count"
+    if _LIST_RE.search(question):
+        return "list"
+    return None
+
+
+def display_name(item):
+    """Item name, or the subject of its description for simple-format items"""
+    if item.get("name"):
+        return item["name"]
+    text = item.get("text", "")
+    match = re.match(r"^(?:An? |The )?(.+?)\s+(?:is|are|consists?|refers)\b", text)
+    return match.group(1) if match else text[:40]
+
+
+class FoodCatalog:
+    """The loaded catalog with a metadata index over every item"""
+
+    def __init__(self, items):
+        self.items = items
+        self.meta = MetadataIndex(items)
+
+    @classmethod
+    def load(cls, path=JSON_FILE):
+        return cls(load_food_catalog(path))
+
+    def select(self, filters):
+        """Items matching the filters, in catalog order"""
+        return [self.items[row] for row in self.meta.rows(self.meta.match(filters))]
+
+
+# Catalog shared by callers in this process, loaded on first use
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = FoodCatalog.load()
+        return _catalog
+
+
+def run_catalog_query(question, page=1, page_size=PAGE_SIZE, catalog=None):
+    """
+    Answer a list/count question exactly
+
+    Args:
+        question: Free-text question
+        page: 1-based page of the result set to return
+        page_size: Items per page
+
+    Returns:
+        Dictionary with intent, filters, total, pagination and the page's
+        items, or None if the question is not a list/count question
+    """
+    intent = detect_intent(question)
+    if intent is None:
+        return None
+
+    catalog = catalog or get_catalog()
+    filters = parse_filters(question, catalog.meta)
+    if not filters and not _ALL_RE.search(question):
+        return None
+    matches = catalog.select(filters)
+
+    page_size = max(1, int(page_size))
+    pages = max(1, math.ceil(len(matches) / page_size))
+    page = min(max(1, int(page)), pages)
+    start = (page - 1) * page_size
+    items = [
+        {
+            "id": item["id"],
+            "name": display_name(item),
+            "region": item["region"],
+            "type": item["type"],
+            "dietary_tags": item["dietary_tags"],
+        }
+        for item in matches[start:start + page_size]
+    ]
+    return {
+        "intent": intent,
+        "filters": filters,
+        "total": len(matches),
+        "page": page,
+        "page_size": page_size,
+        "pages": pages,
+        "items": items if intent == "list" else [],
+    }
+
+
+def describe_filters(filters):
+    if not filters:
+        return "in the catalog"
+    return "matching " + ", ".join(f"{field} = {' or '.join(values)}" for field, values in filters.items())
+
+
+def format_answer(result):
+    """Plain-text answer for a catalog query result"""
+    scope = describe_filters(result["filters"])
+    if result["intent"] == "count":
+        return f"There are {result['total']} food items {scope}."
+    if not result["total"]:
+        return f"No food items found {scope}."
+
+    lines = [f"Found {result['total']} food items {scope}:"]
+    first = (result["page"] - 1) * result["page_size"]
+    for number, item in enumerate(result["items"], first + 1):
+        lines.append(f"{number}. {item['name']} ({item['region']}, {item['type']})")
+    if result["pages"] > 1:
+        lines.append(f"Page {result['page']} of {result['pages']}")
+    return "\n".join(lines)
+
+
+def summarize(question, result):
+    """Optional one-paragraph LLM summary of an exact result set"""
+    from client_pool import lease_groq
+    from rate_limiter import get_limiter, estimate_tokens
+    from resilience import get_policy
+
+    messages = [{
+        "role": "user",
+        "content": f"Question: {question}\n\nExact catalog result:\n{format_answer(result)}\n\n"
+                   "Summarise this result in a short, friendly paragraph. Do not add items.",
+    }]
+    limiter = get_limiter("groq")
+    estimate = estimate_tokens(messages, SUMMARY_MAX_TOKENS)
+
+    def attempt():
+        with lease_groq() as groq_client:
+            limiter.acquire(estimate)
+            try:
+                completion = groq_client.chat.completions.create(
+                    model=LLM_MODEL,
+                    messages=messages,
+                    temperature=0.3,
+                    max_tokens=SUMMARY_MAX_TOKENS
+                )
+            except Exception:
+                limiter.settle(estimate, 0)  # Refund a failed attempt
+                raise
+        limiter.settle(estimate, getattr(completion.usage, "total_tokens", None))
+        return completion.choices[0].message.content.strip()
+
+    return get_policy("groq").call(attempt)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Exact list/count queries over foods.json')
+    parser.add_argument('question', nargs='+')
+    parser.add_argument('--page', type=int, default=1)
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE)
+    parser.add_argument('--summarize', action='store_true', help='Also ask Groq for a summary')
+    parser.add_argument('--json', action='store_true', help='Print the raw result')
+    args = parser.parse_args()
+
+    question = " ".join(args.question)
+    result = run_catalog_query(question, args.page, args.page_size)
+    if result is None:
+        print("❌ Not a list/count question; use ragfood.py for open questions")
+        return
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(format_answer(result))
+    if args.summarize:
+        from dotenv import load_dotenv
+        load_dotenv()
+        print(f"\n🤖 {summarize(question, result)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Batched, pipelined Ollama embedding ingestion for the Chroma backends
+
+Items are embedded in batches through Ollama's /api/embed endpoint by a
+bounded worker pool while the main thread bulk-writes finished batches to
+Chroma, so embedding batch N+1 overlaps with writing batch N. Texts
+already embedded by an earlier run come from the on-disk embedding cache
+(see embedding_cache.py), so re-ingesting an unchanged catalog makes no
+Ollama calls.
+
+Every vector, for documents and questions alike, comes from get_embeddings
+and is scaled to unit length: /api/embed already returns unit vectors but
+the older /api/embeddings endpoint does not, and mixing the two scales in
+one index breaks ranking. Collections are opened with cosine distance via
+open_collection, which rebuilds stores created with the old L2 setting.
+
+Configuration (environment variables):
+    OLLAMA_URL          Ollama server (default http://localhost:11434)
+    EMBED_BATCH_SIZE    Texts per embedding request / collection.add (default 32)
+    EMBED_WORKERS       Concurrent embedding requests (default 2)
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from embedding_cache import cached_embeddings
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "2"))
+COLLECTION_METADATA = {"hnsw:space": "cosine"}
+
+# Reuse one connection pool for every embedding request
+_http = requests.Session()
+
+
+def enrich_text(item):
+    """Enhance an item's text with its region/type for embedding"""
+    enriched_text = item["text"]
+    if "region" in item:
+        enriched_text += f" This food is popular in {item['region']}."
+    if "type" in item:
+        enriched_text += f" It is a type of {item['type']}."
+    return enriched_text
+
+
+def _unit(vector):
+    """Scale a vector to unit length so both Ollama endpoints agree"""
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm > 0 else vector).tolist()
+
+
+def get_embeddings(texts, model):
+    """
+    Embed several texts with one Ollama request, as unit vectors
+
+    Falls back to one /api/embeddings call per text on Ollama versions
+    that predate the batch /api/embed endpoint.
+    """
+    response = _http.post(f"{OLLAMA_URL}/api/embed", json={
+        "model": model,
+        "input": list(texts)
+    })
+    if response.status_code == 200:
+        return [_unit(vector) for vector in response.json()["embeddings"]]
+    if response.status_code != 404:
+        raise Exception(f"Ollama embedding failed: {response.status_code}")
+
+    embeddings = []
+    for text in texts:
+        response = _http.post(f"{OLLAMA_URL}/api/embeddings", json={
+            "model": model,
+            "prompt": text
+        })
+        if response.status_code != 200:
+            raise Exception(f"Ollama embedding failed: {response.status_code}")
+        embeddings.append(_unit(response.json()["embedding"]))
+    return embeddings
+
+
+def get_query_embedding(text, model):
+    """Embed a question the same way documents are embedded (cached on disk)"""
+    return cached_embeddings([text], model, get_embeddings)[0]
+
+
+def open_collection(client, name):
+    """
+    Get or create a cosine-distance collection
+
+    A collection created before vectors were normalised (L2 distance, mixed
+    scales) is dropped so the caller's ingest step rebuilds it.
+    """
+    collection = client.get_or_create_collection(name=name, metadata=COLLECTION_METADATA)
+    space = (collection.metadata or {}).get("hnsw:space", "l2")
+    if space != COLLECTION_METADATA["hnsw:space"]:
+        print(f"🔄 Rebuilding collection '{name}' with cosine distance ({space} vectors are not comparable)")
+        client.delete_collection(name=name)
+        collection = client.create_collection(name=name, metadata=COLLECTION_METADATA)
+    return collection
+
+
+def ingest_items(collection, items, model, batch_size=None, workers=None, embed_fn=None):
+    """
+    Embed and add items to a Chroma collection
+
+    Args:
+        collection: Chroma collection to write to
+        items: Normalised food items with 'id' and 'text'
+        model: Ollama embedding model name
+        batch_size: Items per embedding request and per collection.add
+        workers: Maximum embedding requests in flight
+        embed_fn: Override for get_embeddings(texts, model); bypasses the
+            embedding cache
+
+    Returns:
+        Dictionary with item/batch counts, timings and throughput
+    """
+    batch_size = max(1, batch_size or EMBED_BATCH_SIZE)
+    workers = max(1, workers or EMBED_WORKERS)
+    fetched = [0]
+    fetched_lock = threading.Lock()
+
+    def fetch(texts, model):
+        # Only cache misses reach Ollama
+        with fetched_lock:
+            fetched[0] += len(texts)
+        return get_embeddings(texts, model)
+
+    use_cache = embed_fn is None
+    if use_cache:
+        embed_fn = lambda texts, model: cached_embeddings(texts, model, fetch)
+
+    batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+    started = time.perf_counter()
+    embed_seconds = 0.0
+    write_seconds = 0.0
+
+    def embed_batch(batch):
+        t0 = time.perf_counter()
+        embeddings = embed_fn([enrich_text(item) for item in batch], model)
+        if len(embeddings) != len(batch):
+            raise Exception(f"Expected {len(batch)} embeddings, got {len(embeddings)}")
+        return embeddings, time.perf_counter() - t0
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        next_batch = 0
+
+        # Keep `workers` batches embedding ahead of the writer
+        while next_batch < len(batches) and len(pending) < workers:
+            pending.append((batches[next_batch], pool.submit(embed_batch, batches[next_batch])))
+            next_batch += 1
+
+        while pending:
+            batch, future = pending.popleft()
+            embeddings, elapsed = future.result()
+            embed_seconds += elapsed
+
+            if next_batch < len(batches):
+                pending.append((batches[next_batch], pool.submit(embed_batch, batches[next_batch])))
+                next_batch += 1
+
+            t0 = time.perf_counter()
+            collection.add(
+                documents=[item["text"] for item in batch],  # Use original text as retrievable context
+                embeddings=embeddings,
+                ids=[item["id"] for item in batch]
+            )
+            write_seconds += time.perf_counter() - t0
+
+    total = time.perf_counter() - started
+    return {
+        "items": len(items),
+        "embedded": fetched[0] if use_cache else len(items),
+        "batches": len(batches),
+        "batch_size": batch_size,
+        "workers": workers,
+        "seconds": round(total, 2),
+        "embed_seconds": round(embed_seconds, 2),
+        "write_seconds": round(write_seconds, 2),
+        "items_per_second": round(len(items) / total, 1) if total > 0 else 0.0,
+    }
+
+
+def print_ingest_report(stats):
+    print(
+        f"📈 Ingested {stats['items']} items in {stats['seconds']}s "
+        f"({stats['items_per_second']} items/s, {stats['batches']} batches of "
+        f"{stats['batch_size']}, {stats['workers']} workers; "
+        f"{stats['embedded']} sent to Ollama, {stats['items'] - stats['embedded']} cached; "
+        f"embed {stats['embed_seconds']}s, write {stats['write_seconds']}s)"
+    )
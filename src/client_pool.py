@@ -0,0 +1,265 @@
+"""
+Process-wide client pool for Upstash Vector and Groq clients
+
+Every entry point leases its clients from here instead of building a new
+Index/Groq per question, so HTTP keep-alive connections and TLS sessions
+are reused across queries.
+
+Usage:
+    from client_pool import lease_index, lease_groq
+
+    with lease_index() as index:
+        results = index.query(data=question, top_k=3, include_metadata=True)
+
+    async with lease_async_groq() as client:
+        completion = await client.chat.completions.create(...)
+
+Clients are built with their SDK's own retries turned off: callers retry
+through resilience.get_policy, which counts every attempt against the
+shared retry budget and circuit breaker.
+
+Configuration (environment variables):
+    RAG_CLIENT_POOL_SIZE    Max clients per pool (default 4)
+    RAG_CLIENT_MAX_AGE      Seconds before a client is recycled (default 900)
+    RAG_CLIENT_MAX_ERRORS   Consecutive failures before recycling (default 3)
+"""
+
+import os
+import time
+import threading
+from contextlib import contextmanager, asynccontextmanager
+
+DEFAULT_POOL_SIZE = int(os.getenv("RAG_CLIENT_POOL_SIZE", "4"))
+DEFAULT_MAX_AGE = float(os.getenv("RAG_CLIENT_MAX_AGE", "900"))
+DEFAULT_MAX_ERRORS = int(os.getenv("RAG_CLIENT_MAX_ERRORS", "3"))
+
+
+def _close_client(client):
+    """Close a synchronous client if it exposes close()"""
+    close = getattr(client, "close", None)
+    if callable(close):
+        try:
+            close()
+        except Exception:
+            pass
+
+
+class _Entry:
+    __slots__ = ("client", "created", "in_use", "errors", "retired")
+
+    def __init__(self, client):
+        self.client = client
+        self.created = time.monotonic()
+        self.in_use = 0
+        self.errors = 0
+        self.retired = False
+
+
+class ClientPool:
+    """
+    Thread-safe pool of lazily created, shareable clients
+
+    The Upstash and Groq clients are safe to use from several threads at
+    once, so leasing never blocks: it hands out the least busy healthy
+    client and only creates a new one while every client is busy and the
+    pool is below `size`. Clients that exceed `max_age` or fail
+    `max_errors` times in a row are retired and closed once idle.
+    """
+
+    def __init__(self, name, factory, size=None, max_age=None, max_errors=None, close=_close_client):
+        self.name = name
+        self.factory = factory
+        self.size = max(1, size or DEFAULT_POOL_SIZE)
+        self.max_age = max_age if max_age is not None else DEFAULT_MAX_AGE
+        self.max_errors = max_errors if max_errors is not None else DEFAULT_MAX_ERRORS
+        self.close = close
+        self._entries = []
+        self._lock = threading.Lock()
+        self._creating = 0
+        self.created_count = 0
+        self.recycled_count = 0
+        self.lease_count = 0
+
+    def _checkout(self):
+        with self._lock:
+            now = time.monotonic()
+            for entry in list(self._entries):
+                if not entry.retired and self.max_age and now - entry.created > self.max_age:
+                    self._retire(entry)
+
+            healthy = [e for e in self._entries if not e.retired]
+            idle = [e for e in healthy if e.in_use == 0]
+            if idle:
+                entry = idle[0]
+            elif len(healthy) + self._creating < self.size or not healthy:
+                entry = None
+                self._creating += 1
+            else:
+                entry = min(healthy, key=lambda e: e.in_use)
+
+            if entry is not None:
+                entry.in_use += 1
+                self.lease_count += 1
+                return entry
+
+        # Building a client can take a network round trip, so other leases
+        # are not held up behind it
+        try:
+            entry = _Entry(self.factory())
+        finally:
+            with self._lock:
+                self._creating -= 1
+        with self._lock:
+            self._entries.append(entry)
+            self.created_count += 1
+            entry.in_use += 1
+            self.lease_count += 1
+            return entry
+
+    def _checkin(self, entry, failed):
+        with self._lock:
+            entry.in_use -= 1
+            if failed:
+                entry.errors += 1
+                if entry.errors >= self.max_errors:
+                    self._retire(entry)
+            else:
+                entry.errors = 0
+            if entry.retired and entry.in_use == 0:
+                self._discard(entry)
+
+    def _retire(self, entry):
+        if entry.retired:
+            return
+        entry.retired = True
+        self.recycled_count += 1
+        if entry.in_use == 0:
+            self._discard(entry)
+
+    def _discard(self, entry):
+        if entry in self._entries:
+            self._entries.remove(entry)
+            if self.close:
+                self.close(entry.client)
+
+    @contextmanager
+    def lease(self):
+        """Borrow a client for the duration of a with-block"""
+        entry = self._checkout()
+        failed = False
+        try:
+            yield entry.client
+        except Exception:
+            failed = True
+            raise
+        finally:
+            # Also runs when an abandoned generator closes the lease
+            self._checkin(entry, failed)
+
+    @asynccontextmanager
+    async def alease(self):
+        """Borrow a client for the duration of an async with-block"""
+        entry = self._checkout()
+        failed = False
+        try:
+            yield entry.client
+        except Exception:
+            failed = True
+            raise
+        finally:
+            # Also runs when an abandoned generator closes the lease
+            self._checkin(entry, failed)
+
+    def reset(self):
+        """Retire every client; new leases get fresh ones"""
+        with self._lock:
+            for entry in list(self._entries):
+                self._retire(entry)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "size": self.size,
+                "clients": len(self._entries),
+                "in_use": sum(e.in_use for e in self._entries),
+                "created": self.created_count,
+                "recycled": self.recycled_count,
+                "leases": self.lease_count,
+            }
+
+
+def _upstash_index():
+    from upstash_vector import Index
+    return Index.from_env(retries=0)
+
+
+def _upstash_async_index():
+    from upstash_vector import AsyncIndex
+    return AsyncIndex.from_env(retries=0)
+
+
+def _groq_client():
+    from groq import Groq
+    return Groq(api_key=os.getenv("GROQ_API_KEY"), max_retries=0)
+
+
+def _groq_async_client():
+    from groq import AsyncGroq
+    return AsyncGroq(api_key=os.getenv("GROQ_API_KEY"), max_retries=0)
+
+
+# Async clients must be closed from their event loop, so they are only dropped
+_DEFAULT_FACTORIES = {
+    "upstash": (_upstash_index, _close_client),
+    "groq": (_groq_client, _close_client),
+    "upstash_async": (_upstash_async_index, None),
+    "groq_async": (_groq_async_client, None),
+}
+
+_pools = {}
+_registry_lock = threading.Lock()
+
+
+def register_pool(name, factory, **kwargs):
+    """Register (or replace) a named pool"""
+    with _registry_lock:
+        pool = ClientPool(name, factory, **kwargs)
+        _pools[name] = pool
+        return pool
+
+
+def get_pool(name):
+    """Return the named pool, creating the built-in ones on first use"""
+    with _registry_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            if name not in _DEFAULT_FACTORIES:
+                raise KeyError(f"Unknown client pool: {name}")
+            factory, close = _DEFAULT_FACTORIES[name]
+            pool = ClientPool(name, factory, close=close)
+            _pools[name] = pool
+        return pool
+
+
+def pool_stats():
+    """Stats for every pool created so far"""
+    with _registry_lock:
+        pools = list(_pools.values())
+    return [pool.stats() for pool in pools]
+
+
+def lease_index():
+    return get_pool("upstash").lease()
+
+
+def lease_groq():
+    return get_pool("groq").lease()
+
+
+def lease_async_index():
+    return get_pool("upstash_async").alease()
+
+
+def lease_async_groq():
+    return get_pool("groq_async").alease()
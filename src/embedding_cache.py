@@ -0,0 +1,204 @@
+"""
+Content-addressed, disk-backed embedding cache for Ollama
+
+Embeddings are keyed by a hash of (format, model, text), so re-ingesting
+an unchanged catalog or asking a question seen in an earlier session costs
+no Ollama call. The format names how vectors were produced (VECTOR_FORMAT,
+currently unit-length vectors from chroma_ingest.get_embeddings), so
+vectors from an older, differently scaled endpoint are never served. Each
+model has two append-only files:
+
+    .cache/embeddings/<model>.<format>.vec   float32 vectors, back to back
+    .cache/embeddings/<model>.<format>.idx   28-byte records: 16-byte key
+                                             hash, uint32 dimension,
+                                             uint64 byte offset
+
+A vector is written before its index record, so a reader never sees an
+index entry without its data; appends are serialised with flock so
+several processes can share the cache. Readers pick up other processes'
+appends by re-reading the index tail on a miss.
+
+Usage:
+    from chroma_ingest import get_embeddings
+    from embedding_cache import cached_embeddings
+
+    vectors = cached_embeddings(texts, "mxbai-embed-large", get_embeddings)
+
+Configuration (environment variables):
+    EMBEDDING_CACHE        Set to 0 to disable (default 1)
+    EMBEDDING_CACHE_DIR    Cache directory (default .cache/embeddings)
+"""
+
+import os
+import re
+import struct
+import hashlib
+import threading
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are not serialised across processes
+    fcntl = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EMBEDDING_CACHE = os.getenv("EMBEDDING_CACHE", "1") != "0"
+EMBEDDING_CACHE_DIR = os.getenv(
+    "EMBEDDING_CACHE_DIR", os.path.join(BASE_DIR, "..", ".cache", "embeddings")
+)
+RECORD = struct.Struct("<16sIQ")
+VECTOR_FORMAT = "unit"
+
+
+def text_key(model, text):
+    key = f"{VECTOR_FORMAT}\0{model}\0{text}"
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+
+class EmbeddingCache:
+    """On-disk (model, text) -> vector cache for one embedding model"""
+
+    def __init__(self, model, directory=None):
+        self.model = model
+        directory = directory or EMBEDDING_CACHE_DIR
+        os.makedirs(directory, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9._-]+", "_", model)
+        self.vec_path = os.path.join(directory, f"{slug}.{VECTOR_FORMAT}.vec")
+        self.idx_path = os.path.join(directory, f"{slug}.{VECTOR_FORMAT}.idx")
+        for path in (self.vec_path, self.idx_path):
+            open(path, "ab").close()
+
+        self._entries = {}  # key -> (offset, dim)
+        self._idx_read = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._refresh()
+
+    def _refresh(self):
+        """Load index records appended since the last read (by any process)"""
+        size = os.path.getsize(self.idx_path)
+        complete = size - (size % RECORD.size)
+        if complete <= self._idx_read:
+            return
+        with open(self.idx_path, "rb") as f:
+            f.seek(self._idx_read)
+            data = f.read(complete - self._idx_read)
+        for key, dim, offset in RECORD.iter_unpack(data):
+            self._entries[key] = (offset, dim)
+        self._idx_read = complete
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_many(self, texts):
+        """Cached vectors in input order, None for each miss"""
+        keys = [text_key(self.model, text) for text in texts]
+        with self._lock:
+            if any(key not in self._entries for key in keys):
+                self._refresh()
+            located = [self._entries.get(key) for key in keys]
+
+        results = []
+        with open(self.vec_path, "rb") as f:
+            for location in located:
+                if location is None:
+                    results.append(None)
+                    continue
+                offset, dim = location
+                f.seek(offset)
+                results.append(np.frombuffer(f.read(dim * 4), dtype=np.float32).tolist())
+
+        hits = sum(result is not None for result in results)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(results) - hits
+        return results
+
+    def put_many(self, texts, vectors):
+        """Append vectors for texts that are not cached yet"""
+        with self._lock:
+            pending = {}
+            for text, vector in zip(texts, vectors):
+                key = text_key(self.model, text)
+                if key not in self._entries and key not in pending:
+                    pending[key] = np.asarray(vector, dtype=np.float32)
+            if not pending:
+                return
+
+            with open(self.vec_path, "ab") as vec_file, open(self.idx_path, "ab") as idx_file:
+                if fcntl:
+                    fcntl.flock(idx_file, fcntl.LOCK_EX)
+                try:
+                    vec_file.seek(0, os.SEEK_END)
+                    offset = vec_file.tell()
+                    records = []
+                    for key, vector in pending.items():
+                        vec_file.write(vector.tobytes())
+                        records.append((key, vector.shape[0], offset))
+                        offset += vector.nbytes
+                    vec_file.flush()
+                    os.fsync(vec_file.fileno())
+                    idx_file.write(b"".join(RECORD.pack(*record) for record in records))
+                    idx_file.flush()
+                finally:
+                    if fcntl:
+                        fcntl.flock(idx_file, fcntl.LOCK_UN)
+
+            for key, dim, offset in records:
+                self._entries[key] = (offset, dim)
+
+    def stats(self):
+        return {
+            "model": self.model,
+            "entries": len(self._entries),
+            "bytes": os.path.getsize(self.vec_path),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model):
+    """Process-wide cache for a model, or None when disabled or unwritable"""
+    if not EMBEDDING_CACHE:
+        return None
+    with _caches_lock:
+        if model not in _caches:
+            try:
+                _caches[model] = EmbeddingCache(model)
+            except OSError:
+                return None
+        return _caches[model]
+
+
+def cached_embeddings(texts, model, embed_fn):
+    """
+    Embed texts, sending only cache misses to embed_fn
+
+    Args:
+        texts: Texts to embed
+        model: Embedding model name (part of the cache key)
+        embed_fn: callable(texts, model) -> list of vectors, called once
+            with the distinct missing texts (or not at all)
+    """
+    texts = list(texts)
+    cache = get_embedding_cache(model)
+    if cache is None:
+        return embed_fn(texts, model)
+
+    vectors = cache.get_many(texts)
+    missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+    if missing:
+        fetched = embed_fn(missing, model)
+        if len(fetched) != len(missing):
+            raise Exception(f"Expected {len(missing)} embeddings, got {len(fetched)}")
+        cache.put_many(missing, fetched)
+        by_text = dict(zip(missing, fetched))
+        vectors = [by_text[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+    return [list(vector) for vector in vectors]
+
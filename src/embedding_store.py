@@ -0,0 +1,453 @@
+"""
+Memory-mapped on-disk embedding store
+
+A store is a directory that any number of processes can open with mmap,
+sharing one copy of the catalog's vectors through the page cache:
+
+    <name>.store/
+        manifest.json   Format version, count, dimension, dtype, checksums
+        vectors.npy     (count, dim) float16/float32 matrix, rows L2-normalised
+        ids.bin         Concatenated UTF-8 IDs
+        ids.idx         uint64 offsets into ids.bin (count + 1, .npy)
+        meta.bin        Concatenated JSON records {"document", "metadata"}
+        meta.idx        uint64 offsets into meta.bin (count + 1, .npy)
+
+IDs, documents and metadata are exposed as RecordColumns, which decode a
+row only when it is read (normally just the top-k hits), so opening a
+store copies nothing into per-process memory.
+
+Usage:
+    python3 src/embedding_store.py from-chroma data/foods.store --chroma-dir local-version/chroma_db_backup
+    python3 src/embedding_store.py from-upstash data/upstash.store
+    python3 src/embedding_store.py verify data/foods.store
+    python3 src/embedding_store.py info data/foods.store
+"""
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+
+import numpy as np
+
+from resilience import get_policy
+
+STORE_FORMAT = "ragfood-embeddings"
+STORE_VERSION = 1
+PAGE_SIZE = 1000
+COPY_CHUNK_BYTES = 16 * 1024 * 1024
+
+
+class StoreError(Exception):
+    """Raised when a store is missing, malformed or fails verification"""
+
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _decode_text(data):
+    return data.decode("utf-8")
+
+
+def decode_document(data):
+    return json.loads(data.decode("utf-8"))["document"]
+
+
+def decode_metadata(data):
+    return json.loads(data.decode("utf-8"))["metadata"]
+
+
+class RecordColumn:
+    """
+    Read-only sequence of variable-length records (a byte blob plus
+    count + 1 offsets), decoding each row only when it is accessed
+    """
+
+    def __init__(self, blob, offsets, decode=_decode_text):
+        self.blob = blob
+        self.offsets = offsets
+        self.decode = decode
+
+    def __len__(self):
+        return max(0, len(self.offsets) - 1)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        row = int(row)
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(f"row {row} out of range")
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return self.decode(self.blob[start:end].tobytes())
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+    def resident_bytes(self):
+        """Bytes private to this process (memory-mapped files are shared)"""
+        return sum(part.nbytes for part in (self.blob, self.offsets) if not isinstance(part, np.memmap))
+
+
+def pack_records(values, encode=lambda value: str(value).encode("utf-8")):
+    """Encode values into (uint8 blob, uint64 offsets) for a RecordColumn"""
+    encoded = [encode(value) for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    if encoded:
+        offsets[1:] = np.cumsum([len(data) for data in encoded], dtype=np.uint64)
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def encode_record(document, metadata):
+    """One meta.bin record"""
+    return json.dumps({"document": document or "", "metadata": metadata or {}}, ensure_ascii=False).encode("utf-8")
+
+
+def resident_bytes(values):
+    """Approximate per-process memory of an ID/document/metadata column"""
+    if isinstance(values, RecordColumn):
+        return values.resident_bytes()
+    seen = set()
+
+    def size(value):
+        if id(value) in seen:
+            return 0
+        seen.add(id(value))
+        total = sys.getsizeof(value)
+        if isinstance(value, dict):
+            total += sum(size(k) + size(v) for k, v in value.items())
+        elif isinstance(value, (list, tuple)):
+            total += sum(size(v) for v in value)
+        return total
+
+    return size(values)
+
+
+class StoreWriter:
+    """
+    Stream batches of vectors into a new store
+
+    The vector count does not need to be known up front: rows are written
+    to a raw file and wrapped in an .npy header when the writer closes.
+    """
+
+    def __init__(self, path, dtype="float16", normalize=True):
+        if dtype not in ("float16", "float32"):
+            raise ValueError("dtype must be float16 or float32")
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.normalize = normalize
+        self.tmp_path = f"{path}.tmp"
+        self.count = 0
+        self.dim = None
+
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        os.makedirs(self.tmp_path)
+        self._raw = open(os.path.join(self.tmp_path, "vectors.raw"), "wb")
+        self._ids = open(os.path.join(self.tmp_path, "ids.bin"), "wb")
+        self._meta = open(os.path.join(self.tmp_path, "meta.bin"), "wb")
+        self._id_offsets = [0]
+        self._meta_offsets = [0]
+
+    def add(self, ids, vectors, documents=None, metadatas=None):
+        """Append one batch of rows"""
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2 or len(matrix) != len(ids):
+            raise ValueError("vectors must be a 2-D matrix with one row per id")
+        if self.dim is None:
+            self.dim = matrix.shape[1]
+        elif matrix.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-d vectors, got {matrix.shape[1]}-d")
+
+        if self.normalize:
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            matrix = matrix / norms
+        self._raw.write(matrix.astype(self.dtype).tobytes())
+
+        for i, vector_id in enumerate(ids):
+            encoded = str(vector_id).encode("utf-8")
+            self._ids.write(encoded)
+            self._id_offsets.append(self._id_offsets[-1] + len(encoded))
+
+            record = encode_record(documents[i] if documents else "",
+                                   metadatas[i] if metadatas else None)
+            self._meta.write(record)
+            self._meta_offsets.append(self._meta_offsets[-1] + len(record))
+
+        self.count += len(ids)
+
+    def close(self):
+        """Finish the files, write the manifest and move the store into place"""
+        for f in (self._raw, self._ids, self._meta):
+            f.close()
+        if self.count == 0:
+            shutil.rmtree(self.tmp_path, ignore_errors=True)
+            raise StoreError("Refusing to build an empty store")
+
+        raw_path = os.path.join(self.tmp_path, "vectors.raw")
+        with open(os.path.join(self.tmp_path, "vectors.npy"), "wb") as out:
+            np.lib.format.write_array_header_1_0(out, {
+                "descr": np.lib.format.dtype_to_descr(self.dtype),
+                "fortran_order": False,
+                "shape": (self.count, self.dim),
+            })
+            with open(raw_path, "rb") as raw:
+                shutil.copyfileobj(raw, out, COPY_CHUNK_BYTES)
+        os.remove(raw_path)
+
+        for name, offsets in (("ids.idx", self._id_offsets), ("meta.idx", self._meta_offsets)):
+            with open(os.path.join(self.tmp_path, name), "wb") as out:
+                np.save(out, np.asarray(offsets, dtype=np.uint64))
+
+        files = ["vectors.npy", "ids.bin", "ids.idx", "meta.bin", "meta.idx"]
+        manifest = {
+            "format": STORE_FORMAT,
+            "version": STORE_VERSION,
+            "count": self.count,
+            "dim": self.dim,
+            "dtype": self.dtype.name,
+            "normalized": self.normalize,
+            "checksums": {name: _sha256_file(os.path.join(self.tmp_path, name)) for name in files},
+        }
+        with open(os.path.join(self.tmp_path, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(self.tmp_path, self.path)
+        return manifest
+
+    def abort(self):
+        for f in (self._raw, self._ids, self._meta):
+            f.close()
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+
+def build_store(path, ids, vectors, documents=None, metadatas=None, dtype="float16", normalize=True):
+    """Write a complete store from in-memory arrays"""
+    writer = StoreWriter(path, dtype=dtype, normalize=normalize)
+    try:
+        writer.add(ids, vectors, documents, metadatas)
+    except Exception:
+        writer.abort()
+        raise
+    return writer.close()
+
+
+class EmbeddingStore:
+    """Read-only, memory-mapped view of a store"""
+
+    def __init__(self, path):
+        self.path = path
+        manifest_path = os.path.join(path, "manifest.json")
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            raise StoreError(f"No embedding store at {path}")
+        if self.manifest.get("format") != STORE_FORMAT or self.manifest.get("version") != STORE_VERSION:
+            raise StoreError(f"Unsupported store format in {path}")
+
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self._id_offsets = np.load(os.path.join(path, "ids.idx"), mmap_mode="r")
+        self._meta_offsets = np.load(os.path.join(path, "meta.idx"), mmap_mode="r")
+        self._id_blob = np.memmap(os.path.join(path, "ids.bin"), dtype=np.uint8, mode="r") \
+            if os.path.getsize(os.path.join(path, "ids.bin")) else np.zeros(0, dtype=np.uint8)
+        self._meta_blob = np.memmap(os.path.join(path, "meta.bin"), dtype=np.uint8, mode="r")
+        self._rows_by_id = None
+        self.id_column = RecordColumn(self._id_blob, self._id_offsets)
+        self.documents = RecordColumn(self._meta_blob, self._meta_offsets, decode_document)
+        self.metadatas = RecordColumn(self._meta_blob, self._meta_offsets, decode_metadata)
+
+    def __len__(self):
+        return int(self.manifest["count"])
+
+    @property
+    def dimension(self):
+        return int(self.manifest["dim"])
+
+    @property
+    def normalized(self):
+        return bool(self.manifest.get("normalized"))
+
+    def id_at(self, row):
+        return self.id_column[row]
+
+    @property
+    def ids(self):
+        return list(self.id_column)
+
+    def row_of(self, vector_id):
+        """Row number for an ID (the lookup table is built on first use)"""
+        if self._rows_by_id is None:
+            self._rows_by_id = {vector_id: row for row, vector_id in enumerate(self.ids)}
+        return self._rows_by_id[vector_id]
+
+    def record(self, row):
+        start, end = int(self._meta_offsets[row]), int(self._meta_offsets[row + 1])
+        return json.loads(self._meta_blob[start:end].tobytes().decode("utf-8"))
+
+    def document(self, row):
+        return self.record(row)["document"]
+
+    def metadata(self, row):
+        return self.record(row)["metadata"]
+
+
+def open_store(path):
+    return EmbeddingStore(path)
+
+
+def verify_store(path, checksums=True):
+    """
+    Check a store's structure (and optionally its checksums)
+
+    Returns:
+        List of problems; empty when the store is healthy
+    """
+    try:
+        store = open_store(path)
+    except (StoreError, OSError, ValueError) as e:
+        return [str(e)]
+
+    problems = []
+    count, dim = len(store), store.dimension
+    if store.vectors.shape != (count, dim):
+        problems.append(f"vectors.npy shape {store.vectors.shape} != ({count}, {dim})")
+    if store.vectors.dtype.name != store.manifest["dtype"]:
+        problems.append(f"vectors.npy dtype {store.vectors.dtype} != {store.manifest['dtype']}")
+
+    for name, offsets, blob in (("ids", store._id_offsets, store._id_blob),
+                                ("meta", store._meta_offsets, store._meta_blob)):
+        if len(offsets) != count + 1:
+            problems.append(f"{name}.idx has {len(offsets)} offsets, expected {count + 1}")
+        elif int(offsets[0]) != 0 or int(offsets[-1]) != len(blob):
+            problems.append(f"{name}.idx does not span {name}.bin")
+        elif count and np.any(np.diff(offsets.astype(np.int64)) < 0):
+            problems.append(f"{name}.idx offsets are not monotonic")
+
+    if checksums:
+        for name, expected in store.manifest.get("checksums", {}).items():
+            if _sha256_file(os.path.join(path, name)) != expected:
+                problems.append(f"{name} checksum mismatch")
+
+    return problems
+
+
+def from_chroma(collection, path, dtype="float16", page_size=PAGE_SIZE):
+    """Convert a Chroma collection into a store, one page at a time"""
+    writer = StoreWriter(path, dtype=dtype)
+    offset = 0
+    try:
+        while True:
+            page = collection.get(
+                limit=page_size,
+                offset=offset,
+                include=["embeddings", "documents", "metadatas"]
+            )
+            if not len(page["ids"]):
+                break
+            writer.add(page["ids"], page["embeddings"], page["documents"], page["metadatas"])
+            offset += len(page["ids"])
+    except Exception:
+        writer.abort()
+        raise
+    return writer.close()
+
+
+def from_upstash(index, path, dtype="float16", page_size=PAGE_SIZE, namespace=""):
+    """Convert an Upstash Vector index into a store via range scans"""
+    writer = StoreWriter(path, dtype=dtype)
+    cursor = ""
+    try:
+        while True:
+            page = get_policy("upstash").call(lambda: index.range(
+                cursor=cursor,
+                limit=page_size,
+                include_vectors=True,
+                include_metadata=True,
+                include_data=True,
+                namespace=namespace
+            ))
+            if page.vectors:
+                metadatas = [v.metadata or {} for v in page.vectors]
+                documents = [
+                    (v.metadata or {}).get("original_text") or getattr(v, "data", None) or ""
+                    for v in page.vectors
+                ]
+                writer.add([v.id for v in page.vectors], [v.vector for v in page.vectors],
+                           documents, metadatas)
+            cursor = page.next_cursor
+            if not cursor:
+                break
+    except Exception:
+        writer.abort()
+        raise
+    return writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory-mapped embedding store tools')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    chroma = sub.add_parser('from-chroma', help='Convert a Chroma collection')
+    chroma.add_argument('path')
+    chroma.add_argument('--chroma-dir', default='chroma_db')
+    chroma.add_argument('--collection', default='foods')
+    chroma.add_argument('--dtype', choices=['float16', 'float32'], default='float16')
+
+    upstash = sub.add_parser('from-upstash', help='Convert an Upstash Vector index')
+    upstash.add_argument('path')
+    upstash.add_argument('--namespace', default='')
+    upstash.add_argument('--dtype', choices=['float16', 'float32'], default='float16')
+
+    verify = sub.add_parser('verify', help='Check structure and checksums')
+    verify.add_argument('path')
+    verify.add_argument('--quick', action='store_true', help='Skip checksums')
+
+    info = sub.add_parser('info', help='Show the manifest')
+    info.add_argument('path')
+
+    args = parser.parse_args()
+
+    if args.command == 'from-chroma':
+        import chromadb
+        collection = chromadb.PersistentClient(path=args.chroma_dir).get_collection(name=args.collection)
+        manifest = from_chroma(collection, args.path, dtype=args.dtype)
+        print(f"✅ Wrote {manifest['count']} vectors ({manifest['dim']}-d {manifest['dtype']}) to {args.path}")
+
+    elif args.command == 'from-upstash':
+        from dotenv import load_dotenv
+        from upstash_vector import Index
+        load_dotenv()
+        manifest = from_upstash(Index.from_env(retries=0), args.path, dtype=args.dtype, namespace=args.namespace)
+        print(f"✅ Wrote {manifest['count']} vectors ({manifest['dim']}-d {manifest['dtype']}) to {args.path}")
+
+    elif args.command == 'verify':
+        problems = verify_store(args.path, checksums=not args.quick)
+        if problems:
+            for problem in problems:
+                print(f"❌ {problem}")
+            sys.exit(1)
+        print(f"✅ {args.path} is healthy")
+
+    elif args.command == 'info':
+        store = open_store(args.path)
+        manifest = dict(store.manifest)
+        manifest.pop("checksums", None)
+        size = sum(os.path.getsize(os.path.join(args.path, f)) for f in os.listdir(args.path))
+        manifest["bytes"] = size
+        print(json.dumps(manifest, indent=2))
+
+
+if __name__ == "__main__":
+    main()
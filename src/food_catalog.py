@@ -0,0 +1,132 @@
+"""
+Food catalog helpers shared by the backends
+foods.json mixes two item formats (text/region/type and
+name/description/origin/category); these helpers unify them.
+
+prepare_food_vectors is the only place that builds the Upstash "foods"
+vectors: every uploader shares one sync manifest, so they must all send
+identical text and metadata or each run would re-upload the other's work.
+"""
+
+import json
+
+
+def normalize_food_item(item):
+    """Normalize food item to consistent format"""
+    normalized = {
+        'id': item['id']
+    }
+    
+    # Handle text/description
+    if 'text' in item:
+        normalized['text'] = item['text']
+    elif 'description' in item:
+        # Create enhanced text from new format
+        text_parts = []
+        if 'name' in item:
+            text_parts.append(f"{item['name']} is")
+        text_parts.append(item['description'])
+        normalized['text'] = ' '.join(text_parts)
+    
+    # Handle region/origin
+    if 'region' in item:
+        normalized['region'] = item['region']
+    elif 'origin' in item:
+        normalized['region'] = item['origin']
+    else:
+        normalized['region'] = 'Unknown'
+    
+    # Handle type/category  
+    if 'type' in item:
+        normalized['type'] = item['type']
+    elif 'category' in item:
+        normalized['type'] = item['category']
+    else:
+        normalized['type'] = 'Unknown'
+    
+    # Structured fields used by the metadata filters (detailed format only)
+    if 'name' in item:
+        normalized['name'] = item['name']
+    normalized['dietary_tags'] = list(item.get('dietary_tags', []))
+    normalized['ingredients'] = list(item.get('ingredients', []))
+        
+    return normalized
+
+
+def read_foods(path):
+    """Load foods.json items as stored (both formats)"""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_food_catalog(path):
+    """Load foods.json and normalize every item"""
+    return [normalize_food_item(item) for item in read_foods(path)]
+
+
+def prepare_food_vectors(raw_items):
+    """
+    Build (id, enriched_text, metadata) tuples for the Upstash foods dataset
+
+    Takes items as stored in foods.json (see read_foods). Upstash embeds
+    the enriched text; metadata keeps the original text and the structured
+    fields used for display and filtering.
+    """
+    vectors = []
+
+    for item in raw_items:
+        if "text" in item:
+            # Simple format (text/region/type)
+            base_text = item["text"]
+            enriched_text = base_text
+
+            if "region" in item and item["region"]:
+                enriched_text += f" This food is popular in {item['region']}."
+
+            if "type" in item and item["type"]:
+                enriched_text += f" It is a type of {item['type']}."
+
+            metadata = {
+                "original_text": base_text,
+                "region": item.get("region", "Unknown"),
+                "type": item.get("type", "Unknown"),
+                "enhanced_text": enriched_text
+            }
+
+        elif "name" in item and "description" in item:
+            # Detailed format (name/description/origin/category)
+            name = item["name"]
+            description = item["description"]
+            category = item.get("category", "Unknown")
+            origin = item.get("origin", "Unknown")
+
+            enriched_text = f"{name}: {description}"
+
+            if origin and origin != "Unknown":
+                enriched_text += f" This dish is from {origin}."
+
+            if category and category != "Unknown":
+                enriched_text += f" It is a {category}."
+
+            if "ingredients" in item and item["ingredients"]:
+                ingredients_str = ", ".join(item["ingredients"][:5])  # First 5 ingredients
+                enriched_text += f" Main ingredients: {ingredients_str}."
+
+            metadata = {
+                "original_text": description,
+                "name": name,
+                "region": origin,
+                "type": category,
+                "enhanced_text": enriched_text,
+                "ingredients": item.get("ingredients", []),
+                "cooking_method": item.get("cooking_method", ""),
+                "dietary_tags": item.get("dietary_tags", [])
+            }
+
+        else:
+            print(f"⚠️  Warning: Item {item.get('id', 'unknown')} missing required fields, skipping...")
+            continue
+
+        vectors.append((item["id"], enriched_text, metadata))
+
+    return vectors
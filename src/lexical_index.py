@@ -0,0 +1,216 @@
+"""
+BM25 lexical index and reciprocal rank fusion for hybrid retrieval
+
+Exact lookups such as "What is Biryani?" or "dishes with chickpeas" are
+answered best by term matching. The inverted index is built once per
+process from data/foods.json (text, name, description, ingredients) and
+the profile JSON (name, text) and searched in-process; its ranking is fused
+with the vector index's results so dense search no longer has to over-fetch
+to keep name lookups in the context.
+
+Usage:
+    from lexical_index import hybrid_results
+
+    fused = hybrid_results("foods", question, vector_results, limit=3)
+
+Configuration (environment variables):
+    HYBRID_RETRIEVAL    Set to 0 to use vector results only (default 1)
+"""
+
+import os
+import re
+import json
+import math
+import threading
+from collections import Counter, namedtuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FOODS_FILE = os.path.join(BASE_DIR, "..", "data", "foods.json")
+PROFILE_FILE = os.path.join(BASE_DIR, "..", "data", "vivian_professional_profile.json")
+
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "1") != "0"
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+LEXICAL_TOP_K = 5
+# Names are short and decisive, so their terms count double
+FIELD_WEIGHTS = {"name": 2, "text": 1, "description": 1, "ingredients": 1}
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for",
+    "from", "has", "have", "how", "i", "in", "is", "it", "its", "me", "my", "of",
+    "on", "or", "some", "that", "the", "their", "this", "to", "was", "what",
+    "which", "who", "with", "you", "your", "tell", "about", "any", "there",
+}
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Shape shared with Upstash query results (id, score, metadata)
+LexicalHit = namedtuple("LexicalHit", ["id", "score", "metadata"])
+
+
+def _stem(token):
+    """Fold common English plurals so 'chickpeas' matches 'chickpea'"""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 4 and token.endswith(("ches", "shes", "sses", "xes", "zes")):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Lowercase word tokens with stopwords removed and plurals folded"""
+    return [_stem(t) for t in _TOKEN_RE.findall(str(text).lower()) if t not in STOPWORDS]
+
+
+class LexicalIndex:
+    """In-memory BM25 inverted index"""
+
+    def __init__(self, documents):
+        """
+        Args:
+            documents: List of (id, fields, metadata) where fields maps a
+                field name to a string or list of strings
+        """
+        self.ids = []
+        self.metadatas = []
+        self.lengths = []
+        self.postings = {}  # term -> list of (doc, weighted term frequency)
+
+        for doc, (doc_id, fields, metadata) in enumerate(documents):
+            counts = Counter()
+            for field, value in fields.items():
+                values = value if isinstance(value, (list, tuple)) else [value]
+                weight = FIELD_WEIGHTS.get(field, 1)
+                for item in values:
+                    for token in tokenize(item):
+                        counts[token] += weight
+            self.ids.append(doc_id)
+            self.metadatas.append(metadata)
+            self.lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, []).append((doc, tf))
+
+        count = len(self.ids)
+        self.average_length = (sum(self.lengths) / count) if count else 0.0
+        self.idf = {
+            term: math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query, k=LEXICAL_TOP_K):
+        """
+        BM25 top-k search
+
+        Returns:
+            List of LexicalHit, best first (documents matching no query
+            term are never returned)
+        """
+        scores = {}
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc, tf in self.postings[term]:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[doc] / self.average_length)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+        return [LexicalHit(self.ids[doc], score, self.metadatas[doc]) for doc, score in best]
+
+
+def food_documents(path=FOODS_FILE):
+    """Index fields and Upstash-style metadata for every food item"""
+    with open(path, "r", encoding="utf-8") as f:
+        raw_data = json.load(f)
+
+    documents = []
+    for item in raw_data:
+        fields = {
+            "name": item.get("name", ""),
+            "text": item.get("text", ""),
+            "description": item.get("description", ""),
+            "ingredients": item.get("ingredients", []),
+        }
+        metadata = {
+            "original_text": item.get("text") or item.get("description", ""),
+            "region": item.get("region", item.get("origin", "Unknown")),
+            "type": item.get("type", item.get("category", "Unknown")),
+        }
+        if "name" in item:
+            metadata["name"] = item["name"]
+        documents.append((str(item["id"]), fields, metadata))
+    return documents
+
+
+def profile_documents(path=PROFILE_FILE):
+    """Index fields and Upstash-style metadata for every profile entry"""
+    with open(path, "r", encoding="utf-8") as f:
+        raw_data = json.load(f)
+
+    documents = []
+    for entry in raw_data:
+        fields = {"name": entry.get("name", ""), "text": entry.get("text", "")}
+        metadata = {
+            "section": entry.get("section", "general"),
+            "category": entry.get("category", ""),
+            "name": entry.get("name", ""),
+            "text": entry.get("text", ""),
+        }
+        documents.append((entry["id"], fields, metadata))
+    return documents
+
+
+DATASETS = {
+    "foods": food_documents,
+    "profile": profile_documents,
+}
+
+# Indexes built on first use, one per dataset
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_lexical_index(dataset):
+    """Return the process-wide BM25 index for a dataset, building it on first use"""
+    with _indexes_lock:
+        if dataset not in _indexes:
+            _indexes[dataset] = LexicalIndex(DATASETS[dataset]())
+        return _indexes[dataset]
+
+
+def reciprocal_rank_fusion(rankings, limit=None, k=RRF_K):
+    """
+    Fuse several ranked result lists by reciprocal rank
+
+    Each result needs an `id`; when an ID appears in more than one list the
+    object from the earliest list is kept (so vector results keep their
+    similarity scores).
+
+    Returns:
+        List of results ordered by fused score
+    """
+    fused = {}
+    chosen = {}
+    for ranking in rankings:
+        for rank, result in enumerate(ranking):
+            fused[result.id] = fused.get(result.id, 0.0) + 1.0 / (k + rank + 1)
+            chosen.setdefault(result.id, result)
+
+    order = sorted(fused, key=lambda result_id: -fused[result_id])
+    if limit is not None:
+        order = order[:limit]
+    return [chosen[result_id] for result_id in order]
+
+
+def hybrid_results(dataset, question, vector_results, limit=None, lexical_k=LEXICAL_TOP_K):
+    """Fuse vector results with the dataset's BM25 results (or pass them through)"""
+    vector_results = list(vector_results or [])
+    if not HYBRID_RETRIEVAL:
+        return vector_results[:limit] if limit is not None else vector_results
+    lexical = get_lexical_index(dataset).search(question, lexical_k)
+    return reciprocal_rank_fusion([vector_results, lexical], limit=limit)
@@ -0,0 +1,237 @@
+"""
+Bitmap metadata index for structured filters
+
+Each categorical field (region, type, dietary_tags, ingredients) interns
+its values to integer codes and keeps one bitset per code, stored as a
+Python int with bit i set for index row i. A filter is evaluated as bitset
+ORs within a field and ANDs across fields, and the surviving row numbers
+are handed to the vector scan (LocalVectorIndex.search(rows=...)), so a
+filtered query never scores rows it would throw away.
+
+Composite values are indexed under each part as well, so "Sichuan, China"
+matches region "China" and "Breakfast / Dessert" matches type "Dessert".
+Multi-word values are also indexed under any run of their words that is a
+value in its own right (or a country named by REGION_ALIASES): "North
+India" counts as "India" and "Healthy Soup" as "Soup", while "New Zealand"
+does not add a region "New".
+Type synonyms are folded together ("Main Dish" is indexed and queried as
+"main course"), so the two spellings in foods.json count as one type.
+
+Usage:
+    from metadata_index import MetadataIndex, parse_filters
+
+    meta = MetadataIndex.from_catalog(index.ids, load_food_catalog(JSON_FILE))
+    filters = parse_filters("vegan desserts from Japan", meta)
+    rows = meta.rows(meta.match(filters))
+"""
+
+import re
+
+import numpy as np
+
+from lexical_index import tokenize
+
+FIELDS = ("region", "type", "dietary_tags", "ingredients")
+# Multi-valued fields require every requested value; single-valued fields any
+MULTI_VALUED = {"dietary_tags", "ingredients"}
+# Adjectives people use for regions ("Japanese desserts")
+REGION_ALIASES = {
+    "japanese": "japan", "chinese": "china", "indian": "india", "thai": "thailand",
+    "korean": "korea", "vietnamese": "vietnam", "italian": "italy", "mexican": "mexico",
+    "greek": "greece", "french": "france", "spanish": "spain", "filipino": "philippines",
+    "indonesian": "indonesia", "malaysian": "malaysia", "mongolian": "mongolia",
+    "nepali": "nepal", "nepalese": "nepal", "pakistani": "pakistan", "moroccan": "morocco",
+    "bangladeshi": "bangladesh", "taiwanese": "taiwan", "australian": "australia",
+    "hawaiian": "hawaii", "samoan": "samoa", "fijian": "fiji", "american": "usa",
+    "british": "united kingdom", "middle eastern": "middle east", "punjabi": "punjab",
+    "bengali": "bengal", "gujarati": "gujarat", "cantonese": "cantonese",
+}
+# Type spellings that mean the same thing, as normalised values
+TYPE_SYNONYMS = {
+    "main dish": "main course",
+    "main": "main course",
+    "vegetarian main": "main course",
+    "beverage": "drink",
+    "side": "side dish",
+}
+_PART_SPLIT = re.compile(r"[,/()]")
+_INGREDIENT_CUE = re.compile(r"\b(?:with|containing|contains|made of|made from)\b(.*)", re.IGNORECASE)
+
+
+def normalize_value(value):
+    """Canonical form of a categorical value: folded tokens joined by spaces"""
+    return " ".join(tokenize(value))
+
+
+def value_keys(value, field=None, known=None):
+    """
+    The whole value plus each comma/slash/parenthesis-separated part, and
+    each shorter run of a part's words that is in known
+    """
+    parts = {normalize_value(value)}
+    parts.update(normalize_value(part) for part in _PART_SPLIT.split(str(value)))
+    parts.discard("")
+    keys = set(parts)
+    if known:
+        for part in parts:
+            words = part.split()
+            for size in range(1, len(words)):
+                for start in range(len(words) - size + 1):
+                    phrase = " ".join(words[start:start + size])
+                    if phrase in known:
+                        keys.add(phrase)
+    if field == "type":
+        keys = {TYPE_SYNONYMS.get(key, key) for key in keys}
+    return keys
+
+
+def _field_values(item, field):
+    raw = item.get(field)
+    if raw is None or raw == "Unknown":
+        return []
+    return raw if isinstance(raw, (list, tuple)) else [raw]
+
+
+def _bitset_from_rows(rows):
+    """Python int with the given row bits set"""
+    if not rows:
+        return 0
+    flags = np.zeros(max(rows) + 1, dtype=bool)
+    flags[rows] = True
+    return int.from_bytes(np.packbits(flags, bitorder="little").tobytes(), "little")
+
+
+class MetadataIndex:
+    """Interned codes and per-value bitsets over the catalog's categorical fields"""
+
+    def __init__(self, rows):
+        """
+        Args:
+            rows: One dict per index row with any of the FIELDS (missing
+                rows may be None)
+        """
+        self.size = len(rows)
+        self.codes = {field: {} for field in FIELDS}   # field -> {value: code}
+        self.values = {field: [] for field in FIELDS}  # field -> [value by code]
+        self.bitsets = {field: [] for field in FIELDS}  # field -> [bitset by code]
+
+        # Values that stand on their own, so word runs of longer values can
+        # be indexed under them
+        known = {field: set() for field in FIELDS}
+        known["region"].update(normalize_value(place) for place in REGION_ALIASES.values())
+        for item in rows:
+            for field in FIELDS:
+                for value in _field_values(item or {}, field):
+                    known[field].update(value_keys(value))
+
+        members = {field: [] for field in FIELDS}  # field -> [[rows] by code]
+        for row, item in enumerate(rows):
+            if not item:
+                continue
+            for field in FIELDS:
+                keys = set()
+                for value in _field_values(item, field):
+                    keys.update(value_keys(value, field, known[field]))
+                for key in keys:
+                    code = self.codes[field].get(key)
+                    if code is None:
+                        code = self.codes[field][key] = len(self.values[field])
+                        self.values[field].append(key)
+                        members[field].append([])
+                    members[field][code].append(row)
+
+        for field in FIELDS:
+            self.bitsets[field] = [_bitset_from_rows(r) for r in members[field]]
+        self.all_rows = (1 << self.size) - 1
+
+    @classmethod
+    def from_catalog(cls, ids, items):
+        """Align normalised catalog items with an index's row order by ID"""
+        by_id = {str(item["id"]): item for item in items}
+        return cls([by_id.get(str(vector_id)) for vector_id in ids])
+
+    def bitset(self, field, value):
+        """Rows whose field has the value (0 when the value is unknown)"""
+        key = normalize_value(value)
+        if field == "type":
+            key = TYPE_SYNONYMS.get(key, key)
+        code = self.codes[field].get(key)
+        return self.bitsets[field][code] if code is not None else 0
+
+    def match(self, filters):
+        """
+        Evaluate filters to a bitset
+
+        Args:
+            filters: {field: value or list of values}. Lists are ORed for
+                region/type and ANDed for dietary_tags/ingredients; fields
+                are ANDed together.
+        """
+        result = self.all_rows
+        for field, wanted in filters.items():
+            if field not in self.codes:
+                raise ValueError(f"Unknown filter field: {field}")
+            wanted = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+            if field in MULTI_VALUED:
+                for value in wanted:
+                    result &= self.bitset(field, value)
+            else:
+                either = 0
+                for value in wanted:
+                    either |= self.bitset(field, value)
+                result &= either
+            if not result:
+                break
+        return result
+
+    def rows(self, bitset):
+        """Row numbers set in a bitset, ascending"""
+        if not bitset:
+            return np.zeros(0, dtype=np.int64)
+        raw = np.frombuffer(bitset.to_bytes((self.size + 7) // 8, "little"), dtype=np.uint8)
+        return np.flatnonzero(np.unpackbits(raw, bitorder="little")[:self.size])
+
+    def count(self, bitset):
+        return bin(bitset).count("1")
+
+
+def parse_filters(question, meta):
+    """
+    Pull structured filters out of a free-text question
+
+    Region (or its adjective, e.g. "Japanese"), type and dietary tag values
+    are matched as whole phrases anywhere in the question (longest first,
+    so "not vegan" wins over "vegan"). Ingredients only count after a cue
+    such as "with" so that "rice dishes" does not turn into an ingredient
+    filter.
+
+    Returns:
+        {field: [values]} for the fields that matched (empty if none)
+    """
+    filters = {}
+
+    def claim(text, field):
+        tokens = tokenize(text)
+        padded = f" {' '.join(tokens)} "
+        phrases = {value: value for value in meta.codes[field]}
+        if field == "type":
+            phrases.update({alias: value for alias, value in TYPE_SYNONYMS.items() if value in meta.codes[field]})
+        for phrase in sorted(phrases, key=len, reverse=True):
+            needle = f" {phrase} "
+            if needle in padded:
+                value = phrases[phrase]
+                if value not in filters.get(field, []):
+                    filters.setdefault(field, []).append(value)
+                padded = padded.replace(needle, " | ")
+        return padded
+
+    remaining = question
+    for alias, region in REGION_ALIASES.items():
+        remaining = re.sub(rf"\b{alias}\b", region, remaining, flags=re.IGNORECASE)
+    for field in ("dietary_tags", "region", "type"):
+        remaining = claim(remaining, field)
+
+    cue = _INGREDIENT_CUE.search(question)
+    if cue:
+        claim(cue.group(1), "ingredients")
+    return filters
@@ -0,0 +1,421 @@
+"""
+Scalar (int8) and binary (1-bit) quantised vector index
+
+Catalog embeddings are kept in RAM as packed sign bits (128 bytes for a
+1024-d vector) and, optionally, per-dimension int8 codes (1 KB). Search is
+two-stage: a Hamming (or int8) prefilter over the whole catalog picks a
+shortlist, which is then rescored exactly against float vectors read from
+a memory-mapped embedding store (or against the int8 codes when no store
+is attached).
+
+IDs, documents and metadata are never decoded up front: an index built
+from a store reads them from the store's memory-mapped files, and a saved
+index keeps them as packed records, so only the top-k hits are decoded.
+
+Usage:
+    python3 src/quantized_index.py build                       # From LOCAL_INDEX_PATH
+    python3 src/quantized_index.py build --source data/foods.store --no-int8
+    python3 src/quantized_index.py bench --synthetic 200000 --dim 1024
+    python3 ragfood.py -i local-quantized -q "spicy curry"
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+import numpy as np
+
+from embedding_store import (RecordColumn, pack_records, encode_record, resident_bytes,
+                             decode_document, decode_metadata)
+from rag_run_local import (LocalVectorIndex, as_column, normalize_rows, rag_query, rag_query_stream,
+                           BASE_DIR, LOCAL_INDEX_PATH, TOP_K)
+
+QUANTIZED_INDEX_PATH = os.getenv(
+    "QUANTIZED_INDEX_PATH", os.path.join(BASE_DIR, "..", "data", "local_index.q.npz")
+)
+PREFILTERS = ("binary", "int8")
+RESCORE_FACTOR = int(os.getenv("QUANTIZED_RESCORE_FACTOR", "10"))
+SCAN_BLOCK_ROWS = 65536
+
+if hasattr(np, "bitwise_count"):
+    _popcount = np.bitwise_count
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(values):
+        return _POPCOUNT_TABLE[values]
+
+
+def quantize_int8(vectors):
+    """Symmetric per-dimension int8 quantisation; returns (codes, scales)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=0) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def quantize_binary(vectors):
+    """Pack the sign bit of every dimension (8 dimensions per byte)"""
+    return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+
+class QuantizedIndex:
+    """
+    Two-stage quantised index with the same search/query interface as
+    LocalVectorIndex
+    """
+
+    def __init__(self, ids, binary_codes, int8_codes=None, scales=None,
+                 documents=None, metadatas=None, floats=None, float_source=None, dim=None):
+        self.ids = as_column(ids, [])
+        self.binary_codes = binary_codes
+        self.int8_codes = int8_codes
+        self.scales = scales
+        self.documents = as_column(documents, [""] * len(self.ids))
+        self.metadatas = as_column(metadatas, [{} for _ in range(len(self.ids))])
+        self.floats = floats
+        self.float_source = float_source
+        self._dim = dim or (int8_codes.shape[1] if int8_codes is not None else binary_codes.shape[1] * 8)
+        if len(self.binary_codes) != len(self.ids):
+            raise ValueError("binary codes must have one row per id")
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dimension(self):
+        return self._dim
+
+    @classmethod
+    def from_local_index(cls, index, keep_int8=True, keep_floats=False, float_source=None):
+        """
+        Quantise a LocalVectorIndex
+
+        With keep_floats the index's rows (memory-mapped when it was opened
+        from an embedding store) are referenced for exact rescoring;
+        otherwise rescoring falls back to the int8 codes, which are then
+        always kept.
+        """
+        floats = index.vectors if keep_floats else None
+        keep_int8 = keep_int8 or floats is None
+        binary = np.empty((len(index), (index.dimension + 7) // 8), dtype=np.uint8)
+        int8_codes = np.empty((len(index), index.dimension), dtype=np.int8) if keep_int8 else None
+
+        scales = None
+        if keep_int8:
+            # Scales need the whole catalog; the abs-max pass streams over it
+            abs_max = np.zeros(index.dimension, dtype=np.float32)
+            for start in range(0, len(index), SCAN_BLOCK_ROWS):
+                block = np.asarray(index.vectors[start:start + SCAN_BLOCK_ROWS], dtype=np.float32)
+                abs_max = np.maximum(abs_max, np.abs(block).max(axis=0))
+            scales = abs_max / 127.0
+            scales[scales == 0] = 1.0
+
+        for start in range(0, len(index), SCAN_BLOCK_ROWS):
+            block = np.asarray(index.vectors[start:start + SCAN_BLOCK_ROWS], dtype=np.float32)
+            binary[start:start + len(block)] = quantize_binary(block)
+            if keep_int8:
+                int8_codes[start:start + len(block)] = np.clip(np.rint(block / scales), -127, 127)
+
+        return cls(index.ids, binary, int8_codes, scales, index.documents, index.metadatas,
+                   floats=floats, float_source=float_source, dim=index.dimension)
+
+    def memory_bytes(self):
+        """Bytes held in this process's RAM, by component"""
+        floats_in_ram = 0
+        if self.floats is not None and not isinstance(self.floats, np.memmap):
+            floats_in_ram = self.floats.nbytes
+        records = resident_bytes(self.ids)
+        # Documents and metadata usually share one blob; count it once
+        if not (isinstance(self.documents, RecordColumn) and isinstance(self.metadatas, RecordColumn)
+                and self.documents.blob is self.metadatas.blob):
+            records += resident_bytes(self.metadatas)
+        records += resident_bytes(self.documents)
+        return {
+            "binary": self.binary_codes.nbytes,
+            "int8": self.int8_codes.nbytes if self.int8_codes is not None else 0,
+            "float": floats_in_ram,
+            "records": records,
+        }
+
+    def _prefilter_scores(self, query, rows, prefilter):
+        """Stage 1 scores (higher is better) for every candidate row"""
+        if prefilter == "int8":
+            codes = self.int8_codes if rows is None else self.int8_codes[rows]
+            weighted = query * self.scales
+            scores = np.empty(len(codes), dtype=np.float32)
+            for start in range(0, len(codes), SCAN_BLOCK_ROWS):
+                block = codes[start:start + SCAN_BLOCK_ROWS]
+                scores[start:start + len(block)] = block.astype(np.float32) @ weighted
+            return scores
+
+        query_bits = quantize_binary(query[None, :])[0]
+        codes = self.binary_codes if rows is None else self.binary_codes[rows]
+        distances = np.empty(len(codes), dtype=np.int32)
+        for start in range(0, len(codes), SCAN_BLOCK_ROWS):
+            block = codes[start:start + SCAN_BLOCK_ROWS]
+            distances[start:start + len(block)] = _popcount(block ^ query_bits).sum(axis=1, dtype=np.int32)
+        return -distances.astype(np.float32)
+
+    def _rescore(self, query, rows):
+        """Stage 2: exact float scores, or int8 scores without a float source"""
+        if self.floats is not None:
+            order = np.argsort(rows)  # Read the memory-mapped rows in file order
+            scores = np.empty(len(rows), dtype=np.float32)
+            scores[order] = np.asarray(self.floats[rows[order]], dtype=np.float32) @ query
+            return scores
+        return self.int8_codes[rows].astype(np.float32) @ (query * self.scales)
+
+    def search(self, query_vector, k=TOP_K, rows=None, prefilter="binary", rescore_factor=None):
+        """
+        Two-stage top-k search
+
+        Args:
+            query_vector: Embedding of the query
+            k: Number of results
+            rows: Optional array of row numbers to restrict the scan to
+            prefilter: "binary" (Hamming) or "int8"
+            rescore_factor: Shortlist size as a multiple of k
+
+        Returns:
+            List of (row, score) pairs, best first
+        """
+        if prefilter not in PREFILTERS:
+            raise ValueError(f"prefilter must be one of {PREFILTERS}")
+        if prefilter == "int8" and self.int8_codes is None:
+            raise ValueError("This index was built without int8 codes")
+
+        query = normalize_rows(np.asarray(query_vector, dtype=np.float32)[None, :])[0]
+        candidates = None if rows is None else np.asarray(rows, dtype=np.int64)
+        if candidates is not None and candidates.size == 0:
+            return []
+
+        stage1 = self._prefilter_scores(query, candidates, prefilter)
+        k = min(k, stage1.shape[0])
+        if k <= 0:
+            return []
+        shortlist_size = min(stage1.shape[0], k * max(1, rescore_factor or RESCORE_FACTOR))
+        shortlist = np.argpartition(-stage1, shortlist_size - 1)[:shortlist_size]
+        shortlist_rows = shortlist if candidates is None else candidates[shortlist]
+
+        scores = self._rescore(query, shortlist_rows)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(shortlist_rows[i]), float(scores[i])) for i in top]
+
+    def query(self, query_vector, k=TOP_K, **search_kwargs):
+        """Search and return dicts with id, score, document and metadata"""
+        return [
+            {
+                "id": self.ids[row],
+                "score": score,
+                "document": self.documents[row],
+                "metadata": self.metadatas[row],
+            }
+            for row, score in self.search(query_vector, k, **search_kwargs)
+        ]
+
+    def save(self, path=QUANTIZED_INDEX_PATH):
+        """
+        Save codes and side data; float rows stay in their store
+
+        With a store attached, IDs, documents and metadata are read from
+        the store too; otherwise they are saved as packed records.
+        """
+        arrays = {
+            "binary": self.binary_codes,
+            "dim": np.array(self._dim),
+            "float_source": np.array(self.float_source or ""),
+        }
+        if not self.float_source:
+            arrays["id_blob"], arrays["id_offsets"] = pack_records(self.ids)
+            arrays["record_blob"], arrays["record_offsets"] = pack_records(
+                range(len(self.ids)), lambda row: encode_record(self.documents[row], self.metadatas[row])
+            )
+        if self.int8_codes is not None:
+            arrays["int8"] = self.int8_codes
+            arrays["scales"] = self.scales
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path=QUANTIZED_INDEX_PATH):
+        with np.load(path) as data:
+            float_source = str(data["float_source"]) or None
+            floats = None
+            if float_source:
+                from embedding_store import open_store
+                store = open_store(float_source)
+                floats = store.vectors
+                ids, documents, metadatas = store.id_column, store.documents, store.metadatas
+            if "id_blob" in data:
+                ids = RecordColumn(data["id_blob"], data["id_offsets"])
+                blob, offsets = data["record_blob"], data["record_offsets"]
+                documents = RecordColumn(blob, offsets, decode_document)
+                metadatas = RecordColumn(blob, offsets, decode_metadata)
+            elif "ids" in data:
+                # Indexes saved before records were packed
+                ids = json.loads(str(data["ids"]))
+                documents = json.loads(str(data["documents"]))
+                metadatas = json.loads(str(data["metadatas"]))
+            return cls(
+                ids,
+                data["binary"],
+                data["int8"] if "int8" in data else None,
+                data["scales"] if "scales" in data else None,
+                documents,
+                metadatas,
+                floats=floats,
+                float_source=float_source,
+                dim=int(data["dim"]),
+            )
+
+
+def build(source=LOCAL_INDEX_PATH, path=QUANTIZED_INDEX_PATH, keep_int8=True):
+    """Quantise a saved local index (.npz) or embedding store directory"""
+    index = LocalVectorIndex.load(source)
+    float_source = os.path.abspath(source) if os.path.isdir(source) else None
+    quantized = QuantizedIndex.from_local_index(
+        index, keep_int8=keep_int8, keep_floats=bool(float_source), float_source=float_source
+    )
+    quantized.save(path)
+    memory = quantized.memory_bytes()
+    print(f"✅ Quantised {len(quantized)} vectors into {path} "
+          f"(binary {memory['binary'] / 1e6:.1f} MB, int8 {memory['int8'] / 1e6:.1f} MB, "
+          f"records {memory['records'] / 1e6:.1f} MB"
+          + (f", rescoring from {float_source})" if float_source else ", rescoring from int8)"))
+    return quantized
+
+
+def bench(index, queries=100, k=10, rescore_factors=(4, 10, 20)):
+    """
+    Report recall@k and memory for each search mode against exact float search
+
+    Args:
+        index: LocalVectorIndex holding the float vectors (ground truth)
+        queries: Number of catalog rows (with noise) used as queries
+        k: Results per query
+    """
+    rng = np.random.default_rng(0)
+    picks = rng.choice(len(index), size=min(queries, len(index)), replace=False)
+    query_vectors = np.asarray(index.vectors[picks], dtype=np.float32)
+    query_vectors += rng.normal(0, 0.02, query_vectors.shape).astype(np.float32)
+
+    started = time.perf_counter()
+    truth = [{row for row, _ in index.search(q, k)} for q in query_vectors]
+    exact_ms = (time.perf_counter() - started) * 1000 / len(query_vectors)
+
+    with_floats = QuantizedIndex.from_local_index(index, keep_int8=True, keep_floats=True)
+    int8_only = QuantizedIndex(index.ids, with_floats.binary_codes, with_floats.int8_codes,
+                               with_floats.scales, dim=index.dimension)
+    float_bytes = np.dtype(np.float32).itemsize * len(index) * index.dimension
+    # IDs, documents and metadata cost the same in every mode but are part of the footprint
+    records = with_floats.memory_bytes()["records"]
+
+    modes = [("float32 exact", None, None, None, float_bytes + records, exact_ms, 1.0)]
+    for label, quantized, prefilter, in_ram in (
+        ("binary → float", with_floats, "binary", with_floats.binary_codes.nbytes + records),
+        ("int8 → float", with_floats, "int8", with_floats.int8_codes.nbytes + records),
+        ("binary → int8", int8_only, "binary",
+         with_floats.binary_codes.nbytes + with_floats.int8_codes.nbytes + records),
+    ):
+        for factor in rescore_factors:
+            started = time.perf_counter()
+            hits = 0
+            for q, expected in zip(query_vectors, truth):
+                found = {row for row, _ in quantized.search(q, k, prefilter=prefilter, rescore_factor=factor)}
+                hits += len(found & expected)
+            elapsed_ms = (time.perf_counter() - started) * 1000 / len(query_vectors)
+            modes.append((f"{label} (x{factor})", quantized, prefilter, factor, in_ram, elapsed_ms,
+                          hits / (k * len(query_vectors))))
+
+    print(f"\n📊 {len(index)} vectors, {index.dimension}-d, {len(query_vectors)} queries, recall@{k}")
+    print(f"   RAM includes {records / 1e6:.1f} MB of IDs, documents and metadata")
+    print(f"{'mode':<24}{'RAM MB':>10}{'B/vector':>10}{'ms/query':>10}{'recall':>8}")
+    results = []
+    for label, _, _, _, in_ram, elapsed_ms, recall in modes:
+        print(f"{label:<24}{in_ram / 1e6:>10.1f}{in_ram / len(index):>10.0f}{elapsed_ms:>10.2f}{recall:>8.3f}")
+        results.append({"mode": label, "bytes": in_ram, "ms_per_query": round(elapsed_ms, 3),
+                        "recall": round(recall, 4)})
+    return results
+
+
+# Index shared by query_rag() callers, loaded on first use
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Return the process-wide quantised index, loading it on first use"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            if not os.path.exists(QUANTIZED_INDEX_PATH):
+                raise RuntimeError(
+                    f"No quantised index at {QUANTIZED_INDEX_PATH}. "
+                    "Run: python3 src/quantized_index.py build"
+                )
+            _index = QuantizedIndex.load(QUANTIZED_INDEX_PATH)
+        return _index
+
+
+# Standardized wrapper function
+def query_rag(question):
+    try:
+        index = get_index()
+    except RuntimeError as e:
+        return f"❌ {e}"
+    return rag_query(question, index)
+
+
+def query_rag_stream(question):
+    """Standardized streaming entry point: yields (event, data) pairs"""
+    try:
+        index = get_index()
+    except RuntimeError as e:
+        return iter([("error", {"error": str(e)})])
+    return rag_query_stream(question, index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Quantised local vector index')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build_cmd = sub.add_parser('build', help='Quantise a local index or embedding store')
+    build_cmd.add_argument('--source', default=LOCAL_INDEX_PATH)
+    build_cmd.add_argument('--output', default=QUANTIZED_INDEX_PATH)
+    build_cmd.add_argument('--no-int8', action='store_true',
+                           help='Keep only binary codes (needs a store source for rescoring)')
+
+    bench_cmd = sub.add_parser('bench', help='Recall@k versus memory for each search mode')
+    bench_cmd.add_argument('--source', default=LOCAL_INDEX_PATH)
+    bench_cmd.add_argument('--synthetic', type=int, help='Benchmark N random clustered vectors instead')
+    bench_cmd.add_argument('--dim', type=int, default=1024)
+    bench_cmd.add_argument('--queries', type=int, default=100)
+    bench_cmd.add_argument('-k', type=int, default=10)
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build(args.source, args.output, keep_int8=not args.no_int8)
+        return
+
+    if args.synthetic:
+        rng = np.random.default_rng(42)
+        centers = rng.normal(size=(max(1, args.synthetic // 100), args.dim)).astype(np.float32)
+        assignments = rng.integers(0, len(centers), size=args.synthetic)
+        vectors = centers[assignments] + rng.normal(0, 0.5, (args.synthetic, args.dim)).astype(np.float32)
+        index = LocalVectorIndex([str(i) for i in range(args.synthetic)], vectors)
+    else:
+        if not os.path.exists(args.source):
+            print(f"❌ No local index at {args.source}. Run: python3 src/rag_run_local.py --export-chroma")
+            sys.exit(1)
+        index = LocalVectorIndex.load(args.source)
+    bench(index, queries=args.queries, k=args.k)
+
+
+if __name__ == "__main__":
+    main()
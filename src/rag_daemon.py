@@ -0,0 +1,133 @@
+"""
+Long-lived query daemon helpers
+Serve newline-delimited JSON requests over stdin/stdout or a Unix socket so
+one warm Python process can answer many questions.
+
+Protocol (one JSON object per line, one response line per request):
+    {"id": 1, "question": "What is Biryani?"}
+    {"id": 1, "success": true, "question": "...", "answer": "..."}
+
+    {"op": "ping"}  ->  {"success": true, "pong": true}
+    {"op": "stats"} ->  {"success": true, "flights": {...}}  (coalesced calls)
+"""
+
+import json
+import os
+import socket
+import socketserver
+import sys
+
+from single_flight import flight_stats
+
+DEFAULT_SOCKET_TIMEOUT = 120  # seconds a client waits for an answer
+
+
+def handle_line(line, handler):
+    """Decode one request line, run the handler and return the response dict"""
+    try:
+        request = json.loads(line)
+        if not isinstance(request, dict):
+            raise ValueError("request must be a JSON object")
+    except ValueError as e:
+        return {"success": False, "error": f"Invalid request: {e}"}
+
+    if request.get("op") == "ping":
+        response = {"success": True, "pong": True, "pid": os.getpid()}
+    elif request.get("op") == "stats":
+        response = {"success": True, "flights": flight_stats()}
+    else:
+        try:
+            response = handler(request)
+        except Exception as e:
+            response = {"success": False, "error": str(e), "question": request.get("question")}
+
+    if "id" in request:
+        response["id"] = request["id"]
+    return response
+
+
+def serve_stdio(handler, stdin=None, stdout=None):
+    """Answer NDJSON requests from stdin until EOF"""
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+
+    for line in stdin:
+        if not line.strip():
+            continue
+        response = handle_line(line, handler)
+        stdout.write(json.dumps(response) + "\n")
+        stdout.flush()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Read request lines from one client connection until it closes"""
+
+    def handle(self):
+        for raw in self.rfile:
+            line = raw.decode("utf-8")
+            if not line.strip():
+                continue
+            response = handle_line(line, self.server.query_handler)
+            self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve_unix(path, handler):
+    """Answer NDJSON requests on a Unix socket until interrupted"""
+    if os.path.exists(path):
+        # Refuse to steal the socket from a daemon that is still alive (even
+        # one too busy to answer the ping)
+        if request_daemon(path, {"op": "ping"}, timeout=1) is not None:
+            raise RuntimeError(f"A daemon is already listening on {path}")
+        os.unlink(path)
+
+    server = _UnixServer(path, _RequestHandler)
+    server.query_handler = handler
+    try:
+        print(f"🟢 Listening on {path} (pid {os.getpid()})", file=sys.stderr, flush=True)
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def request_daemon(path, payload, timeout=DEFAULT_SOCKET_TIMEOUT):
+    """
+    Send one request to a running daemon
+
+    Returns:
+        Response dict, or None when no daemon is listening at `path`. A
+        daemon that is running but does not answer (busy past the timeout,
+        or gone mid-request) gives an error response instead, since
+        answering again in-process could pay for the same question twice.
+    """
+    if not path or not os.path.exists(path):
+        return None
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            sock.sendall((json.dumps(payload) + "\n").encode("utf-8"))
+            with sock.makefile("rb") as reader:
+                line = reader.readline()
+    except (FileNotFoundError, ConnectionRefusedError):
+        return None  # Stale socket file: nothing is listening
+    except (socket.timeout, TimeoutError):
+        return {"success": False, "question": payload.get("question"),
+                "error": f"Daemon at {path} did not answer within {timeout:g}s (busy?)"}
+    except OSError as e:
+        return {"success": False, "question": payload.get("question"),
+                "error": f"Daemon at {path} failed: {e}"}
+
+    if not line:
+        return {"success": False, "question": payload.get("question"),
+                "error": f"Daemon at {path} closed the connection without answering"}
+    return json.loads(line.decode("utf-8"))
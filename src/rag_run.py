@@ -1,9 +1,19 @@
+"""
+Upstash Vector + Groq RAG backend
+
+Importing this module is free: nothing is loaded, uploaded or connected
+until setup_pipeline()/upload_food_data() are called or query_rag() needs
+the pipeline for the first time.
+"""
+
 import os
-import json
-import time
-from upstash_vector import Index
+import threading
 from dotenv import load_dotenv
-from groq import Groq
+from client_pool import lease_index, lease_groq
+from food_catalog import read_foods, prepare_food_vectors
+from upstash_sync import sync_vectors
+from rag_stream import groq_deltas, rag_events
+from resilience import get_policy, describe
 
 # Load environment variables
 load_dotenv()
@@ -12,7 +22,7 @@ load_dotenv()
 JSON_FILE = "../data/foods.json" if os.path.exists("../data/foods.json") else "data/foods.json"
 LLM_MODEL = "llama-3.1-8b-instant"  # Groq model
 MAX_RETRIES = 3
-RETRY_DELAY = 1  # seconds
+SYSTEM_MESSAGE = "You are a helpful food expert assistant. Use the provided context to answer questions accurately and concisely."
 
 def validate_upstash_setup():
     """Validate Upstash configuration"""
@@ -46,79 +56,165 @@ def validate_groq_setup():
         return False
 
 def initialize_groq_client():
-    """Initialize Groq client"""
+    """Warm up the shared Groq client"""
     try:
-        client = Groq(api_key=os.getenv('GROQ_API_KEY'))
+        with lease_groq():
+            pass
         print("✅ Groq client initialized successfully")
-        return client
+        return True
     except Exception as e:
         print(f"❌ Failed to initialize Groq client: {e}")
-        return None
+        return False
 
 def initialize_upstash_index():
-    """Initialize Upstash Vector index"""
+    """Warm up the shared Upstash Vector index"""
     try:
-        index = Index.from_env()
+        with lease_index():
+            pass
         print("✅ Upstash Vector client initialized successfully")
-        return index
+        return True
     except Exception as e:
         print(f"❌ Failed to initialize Upstash Vector: {e}")
+        return False
+
+def load_food_data():
+    """Load foods.json items as stored, for upload"""
+    food_data = read_foods(JSON_FILE)
+    print(f"✅ Loaded {len(food_data)} food items from {JSON_FILE}")
+    return food_data
+
+def prepare_vectors(food_data):
+    """Build (id, enriched_text, metadata) tuples for upload"""
+    return prepare_food_vectors(food_data)
+
+def upload_food_data(food_data=None, prune=False):
+    """
+    Upload new or changed food items to Upstash Vector
+    
+    Idempotent: items whose content is unchanged since the last sync are
+    skipped, so calling this repeatedly costs one manifest diff.
+    """
+    if food_data is None:
+        food_data = load_food_data()
+    
+    vectors = prepare_vectors(food_data)
+    print(f"🚀 Syncing {len(vectors)} documents to Upstash Vector...")
+    try:
+        with lease_index() as index:
+            result = sync_vectors(index, "foods", vectors, prune=prune)
+        print("✅ All documents uploaded to Upstash Vector successfully!")
+        return result
+    except Exception as e:
+        print(f"❌ Failed to upload data: {e}")
         return None
 
-# Load data
-with open(JSON_FILE, "r", encoding="utf-8") as f:
-    food_data = json.load(f)
-
-print(f"✅ Loaded {len(food_data)} food items from {JSON_FILE}")
-
-# Setup Upstash Vector
-if not validate_upstash_setup():
-    print("⚠️  Please configure Upstash Vector to continue")
-    index = None
-else:
-    index = initialize_upstash_index()
-
-# Setup Groq client
-if not validate_groq_setup():
-    print("⚠️  Please configure Groq API to continue")
-    groq_client = None
-else:
-    groq_client = initialize_groq_client()
+class RagPipeline:
+    """Validated Upstash + Groq configuration backed by the shared client pool"""
     
-    # Prepare and upload all data (Upstash handles embeddings automatically)
-    if index:
-        print(f"🚀 Uploading {len(food_data)} documents to Upstash Vector...")
-        vectors_to_upsert = []
-        
-        for item in food_data:
-            # Enhance text with region/type context
-            enriched_text = item["text"]
-            if "region" in item:
-                enriched_text += f" This food is popular in {item['region']}."
-            if "type" in item:
-                enriched_text += f" It is a type of {item['type']}."
-            
-            # Upstash auto-embeds the text - no manual embedding needed!
-            vectors_to_upsert.append((
-                item["id"],
-                enriched_text,
-                {
-                    "original_text": item["text"],
-                    "region": item.get("region", "Unknown"),
-                    "type": item.get("type", "Unknown")
-                }
-            ))
-        
-        try:
-            index.upsert(vectors=vectors_to_upsert)
-            print("✅ All documents uploaded to Upstash Vector successfully!")
-        except Exception as e:
-            print(f"❌ Failed to upload data: {e}")
+    def __init__(self, upstash_ready, groq_ready):
+        self.upstash_ready = upstash_ready
+        self.groq_ready = groq_ready
+    
+    @property
+    def ready(self):
+        return self.upstash_ready and self.groq_ready
+
+def setup_pipeline(upload=False):
+    """
+    Validate configuration and warm up the clients
+    
+    Args:
+        upload: Also sync foods.json to Upstash (see upload_food_data)
+    """
+    upstash_ready = False
+    if not validate_upstash_setup():
+        print("⚠️  Please configure Upstash Vector to continue")
+    else:
+        upstash_ready = initialize_upstash_index()
+    
+    groq_ready = False
+    if not validate_groq_setup():
+        print("⚠️  Please configure Groq API to continue")
+    else:
+        groq_ready = initialize_groq_client()
+    
+    if upload and upstash_ready:
+        upload_food_data()
+    
+    return RagPipeline(upstash_ready, groq_ready)
+
+# Pipeline shared by query_rag() callers, created on first use
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+def get_pipeline():
+    """Return the process-wide pipeline, setting it up on first use"""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = setup_pipeline()
+        return _pipeline
+
+def build_messages(question, context):
+    """Chat messages asking Groq to answer from the retrieved context"""
+    return [
+        {"role": "system", "content": SYSTEM_MESSAGE},
+        {"role": "user", "content": f"""Context:
+{context}
+
+Question: {question}
+
+Please provide a helpful answer based on the context above."""}
+    ]
+
+def rag_query_stream(question, pipeline=None):
+    """
+    RAG query as a stream of (event, data) pairs: sources, deltas, done
+    
+    Nothing is printed; see rag_stream.print_events for the terminal view.
+    """
+    pipeline = pipeline or get_pipeline()
+    if not pipeline.upstash_ready:
+        yield "error", {"error": "Upstash Vector not initialized. Please check configuration."}
+        return
+    if not pipeline.groq_ready:
+        yield "error", {"error": "Groq client not initialized. Please check your API key configuration."}
+        return
+    
+    def retrieve():
+        def search():
+            with lease_index() as index:
+                return index.query(data=question, top_k=3, include_metadata=True)
+        results = get_policy("upstash").call(search)
+        if not results:
+            return None
+        sources = [
+            {"id": r.id, "text": r.metadata['original_text'], "relevance": f"{r.score:.3f}"}
+            for r in results
+        ]
+        return sources, build_messages(question, "\n".join(s["text"] for s in sources))
+    
+    def generate(messages):
+        def attempt():
+            with lease_groq() as groq_client:
+                return (yield from groq_deltas(
+                    groq_client,
+                    messages,
+                    model=LLM_MODEL,
+                    temperature=0.7,
+                    max_tokens=1024,
+                    top_p=1
+                ))
+        # Retried (before the first token) by the shared Groq policy
+        return get_policy("groq").call_stream(attempt, attempts=MAX_RETRIES)
+    
+    yield from rag_events(question, retrieve, generate)
 
 # RAG query
-def rag_query(question):
+def rag_query(question, pipeline=None):
     """Perform RAG query using Upstash Vector"""
-    if not index:
+    pipeline = pipeline or get_pipeline()
+    if not pipeline.upstash_ready:
         return "❌ Upstash Vector not initialized. Please check configuration."
     
     try:
@@ -126,11 +222,14 @@ def rag_query(question):
         
         # Step 1: Query Upstash Vector (automatic embedding + search)
         print("🧠 Searching Upstash Vector database...")
-        results = index.query(
-            data=question,  # Upstash auto-embeds the query
-            top_k=3,
-            include_metadata=True
-        )
+        def search():
+            with lease_index() as index:
+                return index.query(
+                    data=question,  # Upstash auto-embeds the query
+                    top_k=3,
+                    include_metadata=True
+                )
+        results = get_policy("upstash").call(search, attempts=MAX_RETRIES, verbose=True)
         
         if not results:
             return "❌ No relevant food information found."
@@ -147,91 +246,67 @@ def rag_query(question):
         print("📚 These are the most relevant pieces of information to answer your question.\n")
         
         # Step 3: Build prompt from context
-        context = "\n".join(top_docs)
-        
-        system_message = "You are a helpful food expert assistant. Use the provided context to answer questions accurately and concisely."
-        user_message = f"""Context:
-{context}
-
-Question: {question}
-
-Please provide a helpful answer based on the context above."""
+        messages = build_messages(question, "\n".join(top_docs))
         
         # Step 4: Generate answer with Groq (with retry logic)
-        if not groq_client:
+        if not pipeline.groq_ready:
             return "❌ Groq client not initialized. Please check your API key configuration."
         
-        for attempt in range(MAX_RETRIES):
-            try:
-                print(f"🤖 Generating response with Groq ({LLM_MODEL})...")
-                
+        def generate():
+            with lease_groq() as groq_client:
                 chat_completion = groq_client.chat.completions.create(
-                    messages=[
-                        {"role": "system", "content": system_message},
-                        {"role": "user", "content": user_message}
-                    ],
+                    messages=messages,
                     model=LLM_MODEL,
                     temperature=0.7,
                     max_tokens=1024,
                     top_p=1,
                     stream=False
                 )
-                
-                answer = chat_completion.choices[0].message.content.strip()
-                return answer
-                
-            except Exception as e:
-                error_msg = str(e)
-                
-                # Check for rate limiting
-                if "rate_limit" in error_msg.lower():
-                    if attempt < MAX_RETRIES - 1:
-                        wait_time = RETRY_DELAY * (2 ** attempt)  # Exponential backoff
-                        print(f"⚠️  Rate limit hit. Retrying in {wait_time}s... (attempt {attempt + 1}/{MAX_RETRIES})")
-                        time.sleep(wait_time)
-                        continue
-                    else:
-                        return f"❌ Rate limit exceeded. Please try again later."
-                
-                # Check for authentication errors
-                elif "authentication" in error_msg.lower() or "api key" in error_msg.lower():
-                    return f"❌ Authentication failed. Please check your GROQ_API_KEY in .env file."
-                
-                # Other errors
-                else:
-                    if attempt < MAX_RETRIES - 1:
-                        print(f"⚠️  Error occurred. Retrying... (attempt {attempt + 1}/{MAX_RETRIES})")
-                        time.sleep(RETRY_DELAY)
-                        continue
-                    else:
-                        return f"❌ Error generating response: {error_msg}"
+            return chat_completion.choices[0].message.content.strip()
         
-        return "❌ Failed to generate response after multiple attempts."
+        print(f"🤖 Generating response with Groq ({LLM_MODEL})...")
+        try:
+            return get_policy("groq").call(generate, attempts=MAX_RETRIES, verbose=True)
+        except Exception as e:
+            return f"❌ Error generating response: {describe(e, credential='GROQ_API_KEY in .env file')}"
             
     except Exception as e:
         return f"❌ Error during RAG query: {str(e)}"
 
-# Standardized wrapper function
+# Standardized wrapper functions
 def query_rag(question):
     return rag_query(question)
 
-# Interactive loop
-if index and groq_client:
-    print("\n🧠 RAG is ready with Upstash Vector + Groq Cloud. Ask a question (type 'exit' to quit):\n")
-    print(f"   Vector DB: Upstash Vector (mixedbread-ai/mxbai-embed-large-v1)")
-    print(f"   LLM: Groq Cloud ({LLM_MODEL})\n")
+def query_rag_stream(question):
+    """Yield (event, data) pairs for a question (see rag_query_stream)"""
+    return rag_query_stream(question)
+
+def main():
+    """Set up the pipeline, sync the data and run the interactive loop"""
+    pipeline = setup_pipeline(upload=True)
     
-    while True:
-        question = input("You: ")
-        if question.lower() in ["exit", "quit"]:
-            print("👋 Goodbye!")
-            break
-        answer = rag_query(question)
-        print("🤖:", answer)
-else:
-    print("\n⚠️  Cannot start interactive mode - Missing configuration:")
-    if not index:
-        print("   ❌ Upstash Vector not initialized")
-    if not groq_client:
-        print("   ❌ Groq client not initialized")
-    print("\nPlease check your .env configuration and try again")
+    if pipeline.ready:
+        global _pipeline
+        _pipeline = pipeline
+        
+        print("\n🧠 RAG is ready with Upstash Vector + Groq Cloud. Ask a question (type 'exit' to quit):\n")
+        print(f"   Vector DB: Upstash Vector (mixedbread-ai/mxbai-embed-large-v1)")
+        print(f"   LLM: Groq Cloud ({LLM_MODEL})\n")
+        
+        while True:
+            question = input("You: ")
+            if question.lower() in ["exit", "quit"]:
+                print("👋 Goodbye!")
+                break
+            answer = rag_query(question, pipeline)
+            print("🤖:", answer)
+    else:
+        print("\n⚠️  Cannot start interactive mode - Missing configuration:")
+        if not pipeline.upstash_ready:
+            print("   ❌ Upstash Vector not initialized")
+        if not pipeline.groq_ready:
+            print("   ❌ Groq client not initialized")
+        print("\nPlease check your .env configuration and try again")
+
+if __name__ == "__main__":
+    main()
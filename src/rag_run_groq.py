@@ -1,11 +1,15 @@
 import os
 import json
 import chromadb
-import requests
 from groq import Groq
 from dotenv import load_dotenv
-import time
 from typing import Optional
+from client_pool import lease_groq
+from chroma_ingest import ingest_items, print_ingest_report, get_query_embedding, open_collection
+from food_catalog import load_food_catalog
+from rag_stream import groq_deltas, rag_events
+from rate_limiter import get_limiter, estimate_tokens
+from resilience import get_policy, describe
 
 # Load environment variables
 load_dotenv()
@@ -20,28 +24,9 @@ GROQ_MAX_TOKENS = 1024
 GROQ_TEMPERATURE = 0.7
 GROQ_TIMEOUT = 30
 
-class GroqRateLimiter:
-    """Simple rate limiter for Groq API calls"""
-    def __init__(self, requests_per_minute=30):
-        self.requests_per_minute = requests_per_minute
-        self.requests = []
-    
-    def wait_if_needed(self):
-        """Implement rate limiting"""
-        now = time.time()
-        # Remove requests older than 1 minute
-        self.requests = [req_time for req_time in self.requests if now - req_time < 60]
-        
-        if len(self.requests) >= self.requests_per_minute:
-            sleep_time = 60 - (now - self.requests[0])
-            if sleep_time > 0:
-                print(f"⏳ Rate limit: waiting {sleep_time:.1f}s...")
-                time.sleep(sleep_time)
-        
-        self.requests.append(now)
-
-# Global rate limiter
-rate_limiter = GroqRateLimiter()
+# Groq request/token budget, shared by every caller in the process
+# (and across processes with RATE_LIMIT_STATE; see src/rate_limiter.py)
+rate_limiter = get_limiter("groq")
 
 def validate_environment():
     """Validate required environment variables and setup"""
@@ -74,7 +59,7 @@ def validate_environment():
 def initialize_groq_client():
     """Initialize Groq client with API key validation"""
     try:
-        client = Groq()
+        client = Groq(max_retries=0)  # Retries go through get_policy("groq")
         print("✅ Groq client initialized successfully")
         return client
     except Exception as e:
@@ -106,83 +91,50 @@ def test_groq_connection(client):
 def generate_with_groq(client, prompt, max_retries=3):
     """Generate response using Groq API with comprehensive error handling"""
     
-    for attempt in range(max_retries):
+    messages = [
+        {
+            "role": "user", 
+            "content": prompt
+        }
+    ]
+    estimate = estimate_tokens(messages, GROQ_MAX_TOKENS)
+    
+    def attempt():
+        # Apply rate limiting
+        rate_limiter.acquire(estimate, verbose=True)
+        
+        # Make API call
         try:
-            # Apply rate limiting
-            rate_limiter.wait_if_needed()
-            
-            # Make API call
             completion = client.chat.completions.create(
                 model=LLM_MODEL,
-                messages=[
-                    {
-                        "role": "user", 
-                        "content": prompt
-                    }
-                ],
+                messages=messages,
                 temperature=GROQ_TEMPERATURE,
                 max_tokens=GROQ_MAX_TOKENS,
                 timeout=GROQ_TIMEOUT,
                 stream=False
             )
-            
-            # Extract and return response
-            response = completion.choices[0].message.content.strip()
-            if not response:
-                raise ValueError("Empty response from Groq API")
-                
-            return response
-            
-        except Exception as e:
-            error_msg = str(e).lower()
-            
-            # Handle specific error types
-            if "rate limit" in error_msg or "429" in error_msg:
-                if attempt < max_retries - 1:
-                    wait_time = (2 ** attempt) * 5  # 5, 10, 20 seconds
-                    print(f"⏳ Rate limited. Waiting {wait_time}s before retry {attempt + 2}/{max_retries}...")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    return "❌ Rate limit exceeded. Please try again later."
-            
-            elif "quota" in error_msg or "credits" in error_msg:
-                return "❌ API quota exceeded. Please check your Groq account credits."
-            
-            elif "timeout" in error_msg:
-                if attempt < max_retries - 1:
-                    wait_time = 2 ** attempt
-                    print(f"⏳ Request timeout. Retrying in {wait_time}s...")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    return "❌ Request timed out after multiple attempts."
-            
-            elif "authentication" in error_msg or "401" in error_msg:
-                return "❌ Authentication failed. Please check your GROQ_API_KEY."
-            
-            else:
-                if attempt < max_retries - 1:
-                    wait_time = 2 ** attempt
-                    print(f"⚠️ Groq API attempt {attempt + 1}/{max_retries} failed: {e}")
-                    print(f"⏳ Retrying in {wait_time}s...")
-                    time.sleep(wait_time)
-                    continue
+        except Exception:
+            rate_limiter.settle(estimate, 0)  # Refund a failed attempt
+            raise
+        rate_limiter.settle(estimate, getattr(completion.usage, "total_tokens", None))
+        
+        # Extract and return response
+        response = completion.choices[0].message.content.strip()
+        if not response:
+            raise ValueError("Empty response from Groq API")
+        return response
     
-    return f"❌ Groq API failed after {max_retries} attempts. Please try again later."
+    # Backoff, retry budget and circuit breaker are shared by every Groq caller
+    try:
+        return get_policy("groq").call(attempt, attempts=max_retries, verbose=True)
+    except Exception as e:
+        return f"❌ {describe(e, credential='GROQ_API_KEY')}"
 
-# Ollama embedding function (unchanged)
+# Ollama embedding function, cached on disk by (model, text)
 def get_embedding(text):
     """Get embedding from local Ollama server"""
     try:
-        response = requests.post("http://localhost:11434/api/embeddings", json={
-            "model": EMBED_MODEL,
-            "prompt": text
-        })
-        if response.status_code == 200:
-            return response.json()["embedding"]
-        else:
-            raise Exception(f"Ollama embedding failed: {response.status_code}")
+        return get_query_embedding(text, EMBED_MODEL)
     except Exception as e:
         print(f"❌ Embedding error: {e}")
         print("💡 Make sure Ollama is running: ollama serve")
@@ -194,8 +146,7 @@ def load_and_setup_data():
     
     # Load food data
     try:
-        with open(JSON_FILE, "r", encoding="utf-8") as f:
-            food_data = json.load(f)
+        food_data = load_food_catalog(JSON_FILE)
         print(f"✅ Loaded {len(food_data)} food items from {JSON_FILE}")
     except Exception as e:
         print(f"❌ Failed to load food data: {e}")
@@ -204,7 +155,7 @@ def load_and_setup_data():
     # Setup ChromaDB
     try:
         chroma_client = chromadb.PersistentClient(path=CHROMA_DIR)
-        collection = chroma_client.get_or_create_collection(name=COLLECTION_NAME)
+        collection = open_collection(chroma_client, COLLECTION_NAME)
         print("✅ ChromaDB setup successful")
     except Exception as e:
         print(f"❌ ChromaDB setup failed: {e}")
@@ -212,26 +163,14 @@ def load_and_setup_data():
     
     # Add new items to ChromaDB
     try:
-        existing_ids = set(collection.get()['ids'])
+        # Only ask Chroma about our own IDs, without fetching documents or embeddings
+        existing_ids = set(collection.get(ids=[item['id'] for item in food_data], include=[])['ids'])
         new_items = [item for item in food_data if item['id'] not in existing_ids]
 
         if new_items:
             print(f"🆕 Adding {len(new_items)} new documents to ChromaDB...")
-            for item in new_items:
-                # Enhance text with region/type
-                enriched_text = item["text"]
-                if "region" in item:
-                    enriched_text += f" This food is popular in {item['region']}."
-                if "type" in item:
-                    enriched_text += f" It is a type of {item['type']}."
-
-                emb = get_embedding(enriched_text)
-
-                collection.add(
-                    documents=[item["text"]],  # Use original text as retrievable context
-                    embeddings=[emb],
-                    ids=[item["id"]]
-                )
+            stats = ingest_items(collection, new_items, EMBED_MODEL)
+            print_ingest_report(stats)
             print("✅ All new documents added to ChromaDB")
         else:
             print("✅ All documents already in ChromaDB")
@@ -242,22 +181,72 @@ def load_and_setup_data():
     
     return food_data, collection
 
+def build_prompt(question, context):
+    """Prompt for the food expert answer"""
+    return f"""You are a knowledgeable food expert. Use the provided context to give a comprehensive, engaging, and accurate answer about food.
+
+Context about relevant foods:
+{context}
+
+User Question: {question}
+
+Please provide a detailed, informative response that:
+1. Directly addresses the user's question
+2. Uses information from the provided context
+3. Is engaging and conversational
+4. Includes interesting details about the foods mentioned
+5. Is accurate and helpful
+
+Your response:"""
+
+def retrieve(question, collection, n_results=3):
+    """Embed the question and return (ids, documents) of the closest foods"""
+    q_emb = get_embedding(question)
+    results = collection.query(query_embeddings=[q_emb], n_results=n_results)
+    top_docs = results['documents'][0] if results['documents'] and results['documents'][0] else []
+    top_ids = results['ids'][0] if results['ids'] and results['ids'][0] else []
+    return top_ids, top_docs
+
+def rag_query_stream(question, groq_client, collection):
+    """
+    RAG query as a stream of (event, data) pairs: sources, deltas, done
+    
+    Nothing is printed; see rag_stream.print_events for the terminal view.
+    """
+    def retrieve_sources():
+        top_ids, top_docs = retrieve(question, collection)
+        if not top_docs:
+            return None
+        sources = [{"id": doc_id, "text": doc} for doc_id, doc in zip(top_ids, top_docs)]
+        return sources, build_prompt(question, "\n".join(top_docs))
+    
+    def generate(prompt):
+        messages = [{"role": "user", "content": prompt}]
+        estimate = estimate_tokens(messages, GROQ_MAX_TOKENS)
+        
+        def attempt():
+            rate_limiter.acquire(estimate)
+            return (yield from rate_limiter.metered(groq_deltas(
+                groq_client,
+                messages,
+                model=LLM_MODEL,
+                temperature=GROQ_TEMPERATURE,
+                max_tokens=GROQ_MAX_TOKENS,
+                timeout=GROQ_TIMEOUT
+            ), estimate))
+        # Retried (before the first token) by the shared Groq policy
+        return get_policy("groq").call_stream(attempt)
+    
+    return rag_events(question, retrieve_sources, generate)
+
 def rag_query(question, groq_client, collection):
     """Enhanced RAG query using ChromaDB + Groq"""
     try:
         print(f"\n🔍 Processing query: '{question}'")
         
-        # Step 1: Get embedding for the question
-        print("🧠 Generating question embedding...")
-        q_emb = get_embedding(question)
-
-        # Step 2: Query ChromaDB for similar documents
-        print("🔍 Searching vector database...")
-        results = collection.query(query_embeddings=[q_emb], n_results=3)
-
-        # Step 3: Extract documents and IDs
-        top_docs = results['documents'][0] if results['documents'] and results['documents'][0] else []
-        top_ids = results['ids'][0] if results['ids'] and results['ids'][0] else []
+        # Steps 1-3: Embed the question, search ChromaDB, extract documents and IDs
+        print("🧠 Searching vector database...")
+        top_ids, top_docs = retrieve(question, collection)
 
         if not top_docs:
             return "❌ No relevant food information found in the database."
@@ -271,23 +260,7 @@ def rag_query(question, groq_client, collection):
         print("🤖 Generating comprehensive response with Groq...")
 
         # Step 5: Build enhanced prompt for Groq
-        context = "\n".join(top_docs)
-
-        prompt = f"""You are a knowledgeable food expert. Use the provided context to give a comprehensive, engaging, and accurate answer about food.
-
-Context about relevant foods:
-{context}
-
-User Question: {question}
-
-Please provide a detailed, informative response that:
-1. Directly addresses the user's question
-2. Uses information from the provided context
-3. Is engaging and conversational
-4. Includes interesting details about the foods mentioned
-5. Is accurate and helpful
-
-Your response:"""
+        prompt = build_prompt(question, "\n".join(top_docs))
 
         # Step 6: Generate response with Groq
         response = generate_with_groq(groq_client, prompt)
@@ -298,12 +271,24 @@ Your response:"""
 
 # Standardized wrapper function
 def query_rag(question):
-    groq_client = initialize_groq()
-    collection = initialize_chromadb()
-    if groq_client and collection:
-        return rag_query(question, groq_client, collection)
+    food_data, collection = load_and_setup_data()
+    if collection:
+        with lease_groq() as groq_client:
+            return rag_query(question, groq_client, collection)
     return "❌ Failed to initialize Groq or ChromaDB"
 
+def query_rag_stream(question):
+    """Standardized streaming entry point: yields (event, data) pairs"""
+    food_data, collection = load_and_setup_data()
+    if not collection:
+        yield "error", {"error": "Failed to initialize Groq or ChromaDB"}
+        return
+    try:
+        with lease_groq() as groq_client:
+            yield from rag_query_stream(question, groq_client, collection)
+    except Exception as e:
+        yield "error", {"error": f"Failed to initialize Groq: {e}"}
+
 def main():
     """Main function with comprehensive setup and error handling"""
     print("🍽️  RAG Food System with Groq AI")
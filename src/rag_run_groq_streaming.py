@@ -1,11 +1,14 @@
 import os
-import json
 import chromadb
-import requests
 from groq import Groq
 from dotenv import load_dotenv
-import time
-from typing import Optional
+import threading
+from client_pool import lease_groq
+from chroma_ingest import ingest_items, print_ingest_report, get_query_embedding, open_collection
+from food_catalog import load_food_catalog
+from rag_stream import groq_deltas, rag_events
+from rate_limiter import get_limiter, estimate_tokens
+from resilience import get_policy, describe
 
 # Load environment variables
 load_dotenv()
@@ -20,28 +23,9 @@ GROQ_MAX_TOKENS = 1024
 GROQ_TEMPERATURE = 0.7
 GROQ_TIMEOUT = 30
 
-class GroqRateLimiter:
-    """Simple rate limiter for Groq API calls"""
-    def __init__(self, requests_per_minute=30):
-        self.requests_per_minute = requests_per_minute
-        self.requests = []
-    
-    def wait_if_needed(self):
-        """Implement rate limiting"""
-        now = time.time()
-        # Remove requests older than 1 minute
-        self.requests = [req_time for req_time in self.requests if now - req_time < 60]
-        
-        if len(self.requests) >= self.requests_per_minute:
-            sleep_time = 60 - (now - self.requests[0])
-            if sleep_time > 0:
-                print(f"⏳ Rate limit: waiting {sleep_time:.1f}s...")
-                time.sleep(sleep_time)
-        
-        self.requests.append(now)
-
-# Global rate limiter
-rate_limiter = GroqRateLimiter()
+# Groq request/token budget, shared by every caller in the process
+# (and across processes with RATE_LIMIT_STATE; see src/rate_limiter.py)
+rate_limiter = get_limiter("groq")
 
 def validate_environment():
     """Validate required environment variables and setup"""
@@ -74,7 +58,7 @@ def validate_environment():
 def initialize_groq_client():
     """Initialize Groq client with API key validation"""
     try:
-        client = Groq()
+        client = Groq(max_retries=0)  # Retries go through get_policy("groq")
         print("✅ Groq client initialized successfully")
         return client
     except Exception as e:
@@ -103,215 +87,127 @@ def test_groq_connection(client):
         print("3. Check your internet connection")
         return False
 
-def generate_with_groq_streaming(client, prompt, max_retries=3):
-    """Generate response using Groq API with streaming support"""
+def stream_with_groq(client, prompt, max_retries=3):
+    """
+    Stream a Groq completion, yielding text chunks as they arrive
     
-    for attempt in range(max_retries):
-        try:
-            # Apply rate limiting
-            rate_limiter.wait_if_needed()
-            
-            # Make streaming API call
-            completion = client.chat.completions.create(
-                model=LLM_MODEL,
-                messages=[
-                    {
-                        "role": "user", 
-                        "content": prompt
-                    }
-                ],
-                temperature=GROQ_TEMPERATURE,
-                max_tokens=GROQ_MAX_TOKENS,
-                timeout=GROQ_TIMEOUT,
-                stream=True,
-                stop=None
-            )
-            
-            # Stream the response
-            print("🤖 Groq AI: ", end="", flush=True)
-            full_response = ""
-            
-            for chunk in completion:
-                if chunk.choices[0].delta.content:
-                    content = chunk.choices[0].delta.content
-                    print(content, end="", flush=True)
-                    full_response += content
-            
-            print()  # New line after streaming completes
-            
-            if not full_response.strip():
-                raise ValueError("Empty response from Groq API")
-                
-            return full_response.strip()
-            
-        except Exception as e:
-            error_msg = str(e).lower()
-            
-            # Handle specific error types
-            if "rate limit" in error_msg or "429" in error_msg:
-                if attempt < max_retries - 1:
-                    wait_time = (2 ** attempt) * 5  # 5, 10, 20 seconds
-                    print(f"\n⏳ Rate limited. Waiting {wait_time}s before retry {attempt + 2}/{max_retries}...")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    return "❌ Rate limit exceeded. Please try again later."
-            
-            elif "quota" in error_msg or "credits" in error_msg:
-                return "❌ API quota exceeded. Please check your Groq account credits."
-            
-            elif "timeout" in error_msg:
-                if attempt < max_retries - 1:
-                    wait_time = 2 ** attempt
-                    print(f"\n⏳ Request timeout. Retrying in {wait_time}s...")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    return "❌ Request timed out after multiple attempts."
-            
-            elif "authentication" in error_msg or "401" in error_msg:
-                return "❌ Authentication failed. Please check your GROQ_API_KEY."
-            
-            else:
-                if attempt < max_retries - 1:
-                    wait_time = 2 ** attempt
-                    print(f"\n⚠️ Groq API attempt {attempt + 1}/{max_retries} failed: {e}")
-                    print(f"⏳ Retrying in {wait_time}s...")
-                    time.sleep(wait_time)
-                    continue
+    Failures before the first chunk are retried; once text has been
+    yielded a failure is raised, since it cannot be taken back.
+    
+    Returns:
+        Token usage reported by Groq (generator return value)
+    """
+    messages = [{"role": "user", "content": prompt}]
+    estimate = estimate_tokens(messages, GROQ_MAX_TOKENS)
+    
+    def attempt():
+        # Apply rate limiting
+        rate_limiter.acquire(estimate)
+        
+        chunks = rate_limiter.metered(groq_deltas(
+            client,
+            messages,
+            model=LLM_MODEL,
+            temperature=GROQ_TEMPERATURE,
+            max_tokens=GROQ_MAX_TOKENS,
+            timeout=GROQ_TIMEOUT,
+            stop=None
+        ), estimate)
+        streamed = False
+        while True:
+            try:
+                text = next(chunks)
+            except StopIteration as stop:
+                usage = stop.value
+                break
+            streamed = True
+            yield text
+        
+        if not streamed:
+            raise ValueError("Empty response from Groq API")
+        return usage
+    
+    # Backoff, retry budget and circuit breaker are shared by every Groq caller
+    try:
+        return (yield from get_policy("groq").call_stream(attempt, attempts=max_retries))
+    except Exception as e:
+        raise Exception(describe(e, credential="GROQ_API_KEY")) from e
+
+def generate_with_groq_streaming(client, prompt, max_retries=3):
+    """Generate response using Groq API with streaming, printing tokens as they arrive"""
+    print("🤖 Groq AI: ", end="", flush=True)
+    parts = []
+    try:
+        for text in stream_with_groq(client, prompt, max_retries):
+            print(text, end="", flush=True)
+            parts.append(text)
+    except Exception as e:
+        print()
+        return f"❌ {e}"
     
-    return f"❌ Groq API failed after {max_retries} attempts. Please try again later."
+    print()  # New line after streaming completes
+    return "".join(parts).strip()
 
 def generate_with_groq_non_streaming(client, prompt, max_retries=3):
     """Generate response using Groq API without streaming (faster for simple responses)"""
     
-    for attempt in range(max_retries):
+    messages = [
+        {
+            "role": "user", 
+            "content": prompt
+        }
+    ]
+    estimate = estimate_tokens(messages, GROQ_MAX_TOKENS)
+    
+    def attempt():
+        # Apply rate limiting
+        rate_limiter.acquire(estimate, verbose=True)
+        
+        # Make non-streaming API call
         try:
-            # Apply rate limiting
-            rate_limiter.wait_if_needed()
-            
-            # Make non-streaming API call
             completion = client.chat.completions.create(
                 model=LLM_MODEL,
-                messages=[
-                    {
-                        "role": "user", 
-                        "content": prompt
-                    }
-                ],
+                messages=messages,
                 temperature=GROQ_TEMPERATURE,
                 max_tokens=GROQ_MAX_TOKENS,
                 timeout=GROQ_TIMEOUT,
                 stream=False
             )
-            
-            # Extract and return response
-            response = completion.choices[0].message.content.strip()
-            if not response:
-                raise ValueError("Empty response from Groq API")
-                
-            return response
-            
-        except Exception as e:
-            error_msg = str(e).lower()
-            
-            # Handle specific error types (same as streaming version)
-            if "rate limit" in error_msg or "429" in error_msg:
-                if attempt < max_retries - 1:
-                    wait_time = (2 ** attempt) * 5
-                    print(f"⏳ Rate limited. Waiting {wait_time}s before retry {attempt + 2}/{max_retries}...")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    return "❌ Rate limit exceeded. Please try again later."
-            
-            elif "quota" in error_msg or "credits" in error_msg:
-                return "❌ API quota exceeded. Please check your Groq account credits."
-            
-            elif "timeout" in error_msg:
-                if attempt < max_retries - 1:
-                    wait_time = 2 ** attempt
-                    print(f"⏳ Request timeout. Retrying in {wait_time}s...")
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    return "❌ Request timed out after multiple attempts."
-            
-            elif "authentication" in error_msg or "401" in error_msg:
-                return "❌ Authentication failed. Please check your GROQ_API_KEY."
-            
-            else:
-                if attempt < max_retries - 1:
-                    wait_time = 2 ** attempt
-                    print(f"⚠️ Groq API attempt {attempt + 1}/{max_retries} failed: {e}")
-                    print(f"⏳ Retrying in {wait_time}s...")
-                    time.sleep(wait_time)
-                    continue
+        except Exception:
+            rate_limiter.settle(estimate, 0)  # Refund a failed attempt
+            raise
+        rate_limiter.settle(estimate, getattr(completion.usage, "total_tokens", None))
+        
+        # Extract and return response
+        response = completion.choices[0].message.content.strip()
+        if not response:
+            raise ValueError("Empty response from Groq API")
+        return response
     
-    return f"❌ Groq API failed after {max_retries} attempts. Please try again later."
+    # Backoff, retry budget and circuit breaker are shared by every Groq caller
+    try:
+        return get_policy("groq").call(attempt, attempts=max_retries, verbose=True)
+    except Exception as e:
+        return f"❌ {describe(e, credential='GROQ_API_KEY')}"
 
-# Ollama embedding function (unchanged)
+# Ollama embedding function, cached on disk by (model, text)
 def get_embedding(text):
     """Get embedding from local Ollama server"""
     try:
-        response = requests.post("http://localhost:11434/api/embeddings", json={
-            "model": EMBED_MODEL,
-            "prompt": text
-        })
-        if response.status_code == 200:
-            return response.json()["embedding"]
-        else:
-            raise Exception(f"Ollama embedding failed: {response.status_code}")
+        return get_query_embedding(text, EMBED_MODEL)
     except Exception as e:
         print(f"❌ Embedding error: {e}")
         print("💡 Make sure Ollama is running: ollama serve")
         raise e
 
-def normalize_food_item(item):
-    """Normalize food item to consistent format"""
-    normalized = {
-        'id': item['id']
-    }
-    
-    # Handle text/description
-    if 'text' in item:
-        normalized['text'] = item['text']
-    elif 'description' in item:
-        # Create enhanced text from new format
-        text_parts = []
-        if 'name' in item:
-            text_parts.append(f"{item['name']} is")
-        text_parts.append(item['description'])
-        normalized['text'] = ' '.join(text_parts)
-    
-    # Handle region/origin
-    if 'region' in item:
-        normalized['region'] = item['region']
-    elif 'origin' in item:
-        normalized['region'] = item['origin']
-    else:
-        normalized['region'] = 'Unknown'
-    
-    # Handle type/category  
-    if 'type' in item:
-        normalized['type'] = item['type']
-    elif 'category' in item:
-        normalized['type'] = item['category']
-    else:
-        normalized['type'] = 'Unknown'
-        
-    return normalized
-
 def load_and_setup_data():
     """Load food data and setup ChromaDB"""
     print("📂 Loading food data and setting up vector database...")
     
     # Load food data
     try:
-        with open(JSON_FILE, "r", encoding="utf-8") as f:
-            raw_data = json.load(f)
         # Normalize all items to consistent format
-        food_data = [normalize_food_item(item) for item in raw_data]
+        food_data = load_food_catalog(JSON_FILE)
         print(f"✅ Loaded {len(food_data)} food items from {JSON_FILE}")
     except Exception as e:
         print(f"❌ Failed to load food data: {e}")
@@ -320,7 +216,7 @@ def load_and_setup_data():
     # Setup ChromaDB
     try:
         chroma_client = chromadb.PersistentClient(path=CHROMA_DIR)
-        collection = chroma_client.get_or_create_collection(name=COLLECTION_NAME)
+        collection = open_collection(chroma_client, COLLECTION_NAME)
         print("✅ ChromaDB setup successful")
     except Exception as e:
         print(f"❌ ChromaDB setup failed: {e}")
@@ -328,26 +224,14 @@ def load_and_setup_data():
     
     # Add new items to ChromaDB
     try:
-        existing_ids = set(collection.get()['ids'])
+        # Only ask Chroma about our own IDs, without fetching documents or embeddings
+        existing_ids = set(collection.get(ids=[item['id'] for item in food_data], include=[])['ids'])
         new_items = [item for item in food_data if item['id'] not in existing_ids]
 
         if new_items:
             print(f"🆕 Adding {len(new_items)} new documents to ChromaDB...")
-            for item in new_items:
-                # Enhance text with region/type
-                enriched_text = item["text"]
-                if "region" in item:
-                    enriched_text += f" This food is popular in {item['region']}."
-                if "type" in item:
-                    enriched_text += f" It is a type of {item['type']}."
-
-                emb = get_embedding(enriched_text)
-
-                collection.add(
-                    documents=[item["text"]],  # Use original text as retrievable context
-                    embeddings=[emb],
-                    ids=[item["id"]]
-                )
+            stats = ingest_items(collection, new_items, EMBED_MODEL)
+            print_ingest_report(stats)
             print("✅ All new documents added to ChromaDB")
         else:
             print("✅ All documents already in ChromaDB")
@@ -358,22 +242,55 @@ def load_and_setup_data():
     
     return food_data, collection
 
+def build_prompt(question, context):
+    """Prompt for the food expert answer"""
+    return f"""You are a knowledgeable food expert. Use the provided context to give a comprehensive, engaging, and accurate answer about food.
+
+Context about relevant foods:
+{context}
+
+User Question: {question}
+
+Please provide a detailed, informative response that:
+1. Directly addresses the user's question
+2. Uses information from the provided context
+3. Is engaging and conversational
+4. Includes interesting details about the foods mentioned
+5. Is accurate and helpful
+
+Your response:"""
+
+def retrieve(question, collection, n_results=3):
+    """Embed the question and return (ids, documents) of the closest foods"""
+    q_emb = get_embedding(question)
+    results = collection.query(query_embeddings=[q_emb], n_results=n_results)
+    top_docs = results['documents'][0] if results['documents'] and results['documents'][0] else []
+    top_ids = results['ids'][0] if results['ids'] and results['ids'][0] else []
+    return top_ids, top_docs
+
+def rag_query_stream(question, groq_client, collection):
+    """
+    RAG query as a stream of (event, data) pairs: sources, deltas, done
+    
+    Nothing is printed; see rag_stream.print_events for the terminal view.
+    """
+    def retrieve_sources():
+        top_ids, top_docs = retrieve(question, collection)
+        if not top_docs:
+            return None
+        sources = [{"id": doc_id, "text": doc} for doc_id, doc in zip(top_ids, top_docs)]
+        return sources, build_prompt(question, "\n".join(top_docs))
+    
+    return rag_events(question, retrieve_sources, lambda prompt: stream_with_groq(groq_client, prompt))
+
 def rag_query(question, groq_client, collection, use_streaming=True):
     """Enhanced RAG query using ChromaDB + Groq with streaming option"""
     try:
         print(f"\n🔍 Processing query: '{question}'")
         
-        # Step 1: Get embedding for the question
-        print("🧠 Generating question embedding...")
-        q_emb = get_embedding(question)
-
-        # Step 2: Query ChromaDB for similar documents
-        print("🔍 Searching vector database...")
-        results = collection.query(query_embeddings=[q_emb], n_results=3)
-
-        # Step 3: Extract documents and IDs
-        top_docs = results['documents'][0] if results['documents'] and results['documents'][0] else []
-        top_ids = results['ids'][0] if results['ids'] and results['ids'][0] else []
+        # Steps 1-3: Embed the question, search ChromaDB, extract documents and IDs
+        print("🧠 Searching vector database...")
+        top_ids, top_docs = retrieve(question, collection)
 
         if not top_docs:
             return "❌ No relevant food information found in the database."
@@ -390,23 +307,7 @@ def rag_query(question, groq_client, collection, use_streaming=True):
             print("🤖 Generating response with Groq...")
 
         # Step 5: Build enhanced prompt for Groq
-        context = "\n".join(top_docs)
-
-        prompt = f"""You are a knowledgeable food expert. Use the provided context to give a comprehensive, engaging, and accurate answer about food.
-
-Context about relevant foods:
-{context}
-
-User Question: {question}
-
-Please provide a detailed, informative response that:
-1. Directly addresses the user's question
-2. Uses information from the provided context
-3. Is engaging and conversational
-4. Includes interesting details about the foods mentioned
-5. Is accurate and helpful
-
-Your response:"""
+        prompt = build_prompt(question, "\n".join(top_docs))
 
         # Step 6: Generate response with Groq (streaming or non-streaming)
         if use_streaming:
@@ -442,10 +343,12 @@ def main():
         return
     
     # Step 4: Load data and setup ChromaDB
-    food_data, collection = load_and_setup_data()
-    if not food_data or not collection:
+    try:
+        session = get_session()
+    except RuntimeError:
         print("\n❌ Failed to setup data. Please check Ollama is running.")
         return
+    collection = session.collection
     
     # Step 5: Get user preference for streaming
     print("\n🎛️ Response Mode:")
@@ -496,14 +399,94 @@ def main():
             print(f"\n❌ Unexpected error: {e}")
             print("Please try again or type 'exit' to quit.")
 
+class RagSession:
+    """
+    Long-lived RAG session: load the catalog and Chroma collection once,
+    then answer many queries with only embedding, search and generation
+    per question.
+    """
+
+    def __init__(self, use_streaming=True):
+        self.use_streaming = use_streaming
+        self.food_data = None
+        self.collection = None
+
+    @property
+    def is_open(self):
+        return self.collection is not None
+
+    def open(self):
+        """Load and normalise foods.json and attach to the Chroma collection"""
+        food_data, collection = load_and_setup_data()
+        if not food_data or not collection:
+            raise RuntimeError("Failed to initialize system components")
+        self.food_data = food_data
+        self.collection = collection
+        return self
+
+    def refresh(self):
+        """Re-read foods.json and add any new items (e.g. after an edit)"""
+        return self.open()
+
+    def close(self):
+        self.food_data = None
+        self.collection = None
+
+    def query(self, question, use_streaming=None):
+        if not self.is_open:
+            self.open()
+        if use_streaming is None:
+            use_streaming = self.use_streaming
+        with lease_groq() as groq_client:
+            return rag_query(question, groq_client, self.collection, use_streaming=use_streaming)
+
+    def query_stream(self, question):
+        """Yield (event, data) pairs for a question (see rag_query_stream)"""
+        if not self.is_open:
+            self.open()
+        with lease_groq() as groq_client:
+            yield from rag_query_stream(question, groq_client, self.collection)
+
+    def __enter__(self):
+        if not self.is_open:
+            self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+# One session per process, shared by query_rag() callers
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Return the process-wide session, opening it on first use"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = RagSession().open()
+        return _session
+
 # Standardized wrapper function
 def query_rag(question):
     """Standardized entry point for RAG queries with streaming"""
-    groq_client = initialize_groq_client()
-    food_data, collection = load_and_setup_data()
-    if groq_client and collection:
-        return rag_query(question, groq_client, collection, use_streaming=True)
-    return "❌ Failed to initialize system components"
+    try:
+        session = get_session()
+    except RuntimeError as e:
+        return f"❌ {e}"
+    return session.query(question)
+
+def query_rag_stream(question):
+    """Standardized streaming entry point: yields (event, data) pairs"""
+    try:
+        session = get_session()
+    except RuntimeError as e:
+        yield "error", {"error": str(e)}
+        return
+    try:
+        yield from session.query_stream(question)
+    except Exception as e:
+        yield "error", {"error": str(e)}
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,467 @@
+"""
+In-process NumPy vector index backend
+Retrieval runs against an in-memory float32 matrix with pre-normalised
+rows: cosine top-k is one matrix-vector product plus argpartition, with
+no network hop. Embeddings come from the existing Chroma store or from
+an ingest step through Ollama. Questions naming a region, type, dietary
+tag or ingredient ("vegan desserts from Japan") are narrowed first by a
+bitmap metadata index, and only the surviving rows are scanned.
+LOCAL_INDEX_PATH may also point at a memory-mapped embedding store
+directory (see embedding_store.py), which worker processes then share
+through the page cache.
+
+Usage:
+    python3 src/rag_run_local.py --export-chroma   # Build index from chroma_db
+    python3 src/rag_run_local.py --export-chroma --chroma-dir local-version/chroma_db_backup
+    python3 src/rag_run_local.py --build           # Embed foods.json via Ollama
+    python3 src/rag_run_local.py                   # Interactive queries
+    LOCAL_INDEX_PATH=data/foods.store python3 src/rag_run_local.py
+    python3 ragfood.py -i local -q "spicy curry"
+"""
+
+import os
+import json
+import time
+import threading
+
+import numpy as np
+from dotenv import load_dotenv
+
+from client_pool import lease_groq
+from embedding_cache import cached_embeddings
+from embedding_store import RecordColumn, open_store
+from food_catalog import load_food_catalog
+from metadata_index import MetadataIndex, parse_filters
+from rag_stream import groq_deltas, rag_events
+from rate_limiter import get_limiter, estimate_tokens
+from resilience import get_policy
+
+# Load environment variables
+load_dotenv()
+
+# Constants
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+JSON_FILE = os.path.join(BASE_DIR, "..", "data", "foods.json")
+CHROMA_DIR = "../chroma_db" if os.path.exists("../chroma_db") else "chroma_db"
+COLLECTION_NAME = "foods"
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", os.path.join(BASE_DIR, "..", "data", "local_index.npz"))
+EMBED_MODEL = "mxbai-embed-large"
+LLM_MODEL = "llama-3.1-8b-instant"
+GROQ_MAX_TOKENS = 1024
+GROQ_TEMPERATURE = 0.7
+TOP_K = 3
+MAX_RETRIES = 3
+EXPORT_PAGE_SIZE = 500
+SCORE_BLOCK_ROWS = 65536
+
+
+def normalize_rows(matrix):
+    """L2-normalise each row so a dot product is cosine similarity"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def as_column(values, default):
+    """Keep lazily decoded store columns as they are; copy anything else into a list"""
+    if values is None:
+        return default
+    return values if isinstance(values, RecordColumn) else list(values)
+
+
+class LocalVectorIndex:
+    """In-memory cosine-similarity index over pre-normalised float32 rows"""
+
+    def __init__(self, ids, vectors, documents=None, metadatas=None, normalized=False):
+        self.ids = as_column(ids, [])
+        # Pre-normalised matrices (e.g. a memory-mapped store) are used as-is
+        # so every process keeps sharing the same pages
+        self.vectors = vectors if normalized else normalize_rows(vectors)
+        self.documents = as_column(documents, [""] * len(self.ids))
+        self.metadatas = as_column(metadatas, [{} for _ in range(len(self.ids))])
+        if self.vectors.ndim != 2 or len(self.vectors) != len(self.ids):
+            raise ValueError("vectors must be a 2-D matrix with one row per id")
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dimension(self):
+        return self.vectors.shape[1]
+
+    def search(self, query_vector, k=TOP_K, rows=None):
+        """
+        Cosine top-k search
+
+        Args:
+            query_vector: Embedding of the query
+            k: Number of results
+            rows: Optional array of row numbers to restrict the scan to
+
+        Returns:
+            List of (row, score) pairs, best first
+        """
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        if rows is None:
+            scores = self._scores(self.vectors, query)
+            candidates = None
+        else:
+            candidates = np.asarray(rows, dtype=np.int64)
+            if candidates.size == 0:
+                return []
+            scores = self._scores(self.vectors[candidates], query)
+
+        k = min(k, scores.shape[0])
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        if candidates is not None:
+            return [(int(candidates[i]), float(scores[i])) for i in top]
+        return [(int(i), float(scores[i])) for i in top]
+
+    @staticmethod
+    def _scores(matrix, query):
+        """Dot products in float32, upcasting float16 rows one block at a time"""
+        if matrix.dtype == np.float32:
+            return matrix @ query
+        scores = np.empty(matrix.shape[0], dtype=np.float32)
+        for start in range(0, matrix.shape[0], SCORE_BLOCK_ROWS):
+            block = matrix[start:start + SCORE_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query
+        return scores
+
+    def query(self, query_vector, k=TOP_K, rows=None):
+        """Search and return dicts with id, score, document and metadata"""
+        return [
+            {
+                "id": self.ids[row],
+                "score": score,
+                "document": self.documents[row],
+                "metadata": self.metadatas[row],
+            }
+            for row, score in self.search(query_vector, k, rows)
+        ]
+
+    def save(self, path=LOCAL_INDEX_PATH):
+        """Save to a compressed .npz (vectors plus JSON-encoded side data)"""
+        np.savez_compressed(
+            path,
+            vectors=self.vectors,
+            ids=np.array(json.dumps(list(self.ids))),
+            documents=np.array(json.dumps(list(self.documents))),
+            metadatas=np.array(json.dumps(list(self.metadatas))),
+        )
+
+    @classmethod
+    def from_store(cls, path):
+        """
+        Open a memory-mapped embedding store without copying anything:
+        IDs, documents and metadata are decoded only for the rows returned
+        """
+        store = open_store(path)
+        return cls(
+            store.id_column,
+            store.vectors,
+            store.documents,
+            store.metadatas,
+            normalized=store.normalized,
+        )
+
+    @classmethod
+    def load(cls, path=LOCAL_INDEX_PATH):
+        if os.path.isdir(path):
+            return cls.from_store(path)
+        with np.load(path) as data:
+            return cls(
+                json.loads(str(data["ids"])),
+                data["vectors"],
+                json.loads(str(data["documents"])),
+                json.loads(str(data["metadatas"])),
+            )
+
+
+def export_chroma(path=LOCAL_INDEX_PATH, chroma_dir=CHROMA_DIR, collection_name=COLLECTION_NAME):
+    """Copy every embedding, document and ID out of the Chroma store"""
+    import chromadb
+
+    collection = chromadb.PersistentClient(path=chroma_dir).get_collection(name=collection_name)
+    ids, vectors, documents, metadatas = [], [], [], []
+    offset = 0
+    while True:
+        page = collection.get(
+            limit=EXPORT_PAGE_SIZE,
+            offset=offset,
+            include=["embeddings", "documents", "metadatas"]
+        )
+        if not page["ids"]:
+            break
+        ids.extend(page["ids"])
+        vectors.extend(page["embeddings"])
+        documents.extend(page["documents"] or [""] * len(page["ids"]))
+        metadatas.extend(m or {} for m in (page["metadatas"] or [None] * len(page["ids"])))
+        offset += len(page["ids"])
+
+    if not ids:
+        raise RuntimeError(f"Chroma collection '{collection_name}' in {chroma_dir} is empty")
+
+    index = LocalVectorIndex(ids, vectors, documents, metadatas)
+    index.save(path)
+    print(f"✅ Exported {len(index)} vectors ({index.dimension}-d) from Chroma to {path}")
+    return index
+
+
+def build_from_catalog(path=LOCAL_INDEX_PATH, json_file=JSON_FILE):
+    """Embed foods.json through Ollama and save a local index"""
+    from chroma_ingest import enrich_text, get_embeddings, EMBED_BATCH_SIZE
+
+    food_data = load_food_catalog(json_file)
+    vectors = []
+    for start in range(0, len(food_data), EMBED_BATCH_SIZE):
+        batch = food_data[start:start + EMBED_BATCH_SIZE]
+        texts = [enrich_text(item) for item in batch]
+        vectors.extend(cached_embeddings(texts, EMBED_MODEL, get_embeddings))
+
+    index = LocalVectorIndex(
+        [item["id"] for item in food_data],
+        vectors,
+        [item["text"] for item in food_data],
+        [{"region": item["region"], "type": item["type"]} for item in food_data],
+    )
+    index.save(path)
+    print(f"✅ Embedded {len(index)} food items into {path}")
+    return index
+
+
+def get_embedding(text):
+    """Get a query embedding from the local Ollama server (cached on disk)"""
+    from chroma_ingest import get_query_embedding
+    return get_query_embedding(text, EMBED_MODEL)
+
+
+def build_prompt(question, context):
+    return f"""You are a knowledgeable food expert. Use the provided context to give a comprehensive, engaging, and accurate answer about food.
+
+Context about relevant foods:
+{context}
+
+User Question: {question}
+
+Please provide a detailed, informative response that:
+1. Directly addresses the user's question
+2. Uses information from the provided context
+3. Is engaging and conversational
+4. Includes interesting details about the foods mentioned
+5. Is accurate and helpful
+
+Your response:"""
+
+
+def filter_rows(question, index, filters=None, verbose=True):
+    """
+    Row numbers allowed by the question's structured filters
+
+    Args:
+        filters: Explicit {field: values}; parsed from the question if None
+        verbose: Print which filters were applied
+
+    Returns:
+        Array of rows, or None when no filter applies (or nothing matched,
+        in which case the whole catalog is searched instead)
+    """
+    meta = get_metadata_index(index)
+    if filters is None:
+        filters = parse_filters(question, meta)
+    if not filters:
+        return None
+    rows = meta.rows(meta.match(filters))
+    description = ", ".join(f"{field}={'/'.join(values)}" for field, values in filters.items())
+    if rows.size == 0:
+        if verbose:
+            print(f"🏷️  No items match {description}; searching the whole catalog")
+        return None
+    if verbose:
+        print(f"🏷️  Filtering on {description}: {rows.size} of {len(index)} items")
+    return rows
+
+
+def rag_query(question, index, embed_fn=get_embedding, filters=None):
+    """RAG query against the in-process index + Groq"""
+    try:
+        print(f"\n🔍 Processing query: '{question}'")
+        q_emb = embed_fn(question)
+
+        started = time.perf_counter()
+        rows = filter_rows(question, index, filters)
+        results = index.query(q_emb, TOP_K, rows=rows)
+        search_ms = (time.perf_counter() - started) * 1000
+
+        if not results:
+            return "❌ No relevant food information found in the database."
+
+        print(f"\n📚 Found {len(results)} relevant food items in {search_ms:.2f}ms:")
+        for i, result in enumerate(results):
+            print(f"🔹 Source {i + 1} (ID: {result['id']}, Relevance: {result['score']:.3f}):")
+            print(f"    \"{result['document']}\"\n")
+
+        context = "\n".join(result["document"] for result in results)
+        messages = [{"role": "user", "content": build_prompt(question, context)}]
+        limiter = get_limiter("groq")
+        estimate = estimate_tokens(messages, GROQ_MAX_TOKENS)
+
+        def generate():
+            with lease_groq() as groq_client:
+                limiter.acquire(estimate, verbose=True)
+                try:
+                    completion = groq_client.chat.completions.create(
+                        model=LLM_MODEL,
+                        messages=messages,
+                        temperature=GROQ_TEMPERATURE,
+                        max_tokens=GROQ_MAX_TOKENS
+                    )
+                except Exception:
+                    limiter.settle(estimate, 0)  # Refund a failed attempt
+                    raise
+            limiter.settle(estimate, getattr(completion.usage, "total_tokens", None))
+            return completion.choices[0].message.content.strip()
+
+        return get_policy("groq").call(generate, attempts=MAX_RETRIES, verbose=True)
+
+    except Exception as e:
+        return f"❌ Error in RAG query: {str(e)}"
+
+
+def rag_query_stream(question, index, embed_fn=get_embedding, filters=None):
+    """
+    RAG query as a stream of (event, data) pairs: sources, deltas, done
+
+    Nothing is printed; see rag_stream.print_events for the terminal view.
+    """
+    def retrieve():
+        q_emb = embed_fn(question)
+        rows = filter_rows(question, index, filters, verbose=False)
+        results = index.query(q_emb, TOP_K, rows=rows)
+        if not results:
+            return None
+        sources = [
+            {"id": result["id"], "text": result["document"], "relevance": f"{result['score']:.3f}"}
+            for result in results
+        ]
+        return sources, build_prompt(question, "\n".join(source["text"] for source in sources))
+
+    def generate(prompt):
+        messages = [{"role": "user", "content": prompt}]
+        limiter = get_limiter("groq")
+        estimate = estimate_tokens(messages, GROQ_MAX_TOKENS)
+
+        def attempt():
+            with lease_groq() as groq_client:
+                limiter.acquire(estimate)
+                return (yield from limiter.metered(groq_deltas(
+                    groq_client,
+                    messages,
+                    model=LLM_MODEL,
+                    temperature=GROQ_TEMPERATURE,
+                    max_tokens=GROQ_MAX_TOKENS
+                ), estimate))
+        # Retried (before the first token) by the shared Groq policy
+        return get_policy("groq").call_stream(attempt, attempts=MAX_RETRIES)
+
+    return rag_events(question, retrieve, generate)
+
+
+# Index shared by query_rag() callers, loaded on first use
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Return the process-wide local index, loading it on first use"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            if not os.path.exists(LOCAL_INDEX_PATH):
+                raise RuntimeError(
+                    f"No local index at {LOCAL_INDEX_PATH}. "
+                    "Run: python3 src/rag_run_local.py --export-chroma (or --build)"
+                )
+            _index = LocalVectorIndex.load(LOCAL_INDEX_PATH)
+        return _index
+
+
+# Metadata indexes keyed by the vector index they are aligned with
+_metadata_indexes = {}
+
+
+def get_metadata_index(index):
+    """Bitmap metadata index over foods.json, aligned with the index's rows"""
+    with _index_lock:
+        meta = _metadata_indexes.get(id(index))
+        if meta is None:
+            meta = MetadataIndex.from_catalog(index.ids, load_food_catalog(JSON_FILE))
+            _metadata_indexes[id(index)] = meta
+        return meta
+
+
+# Standardized wrapper function
+def query_rag(question):
+    try:
+        index = get_index()
+    except RuntimeError as e:
+        return f"❌ {e}"
+    return rag_query(question, index)
+
+
+def query_rag_stream(question):
+    """Standardized streaming entry point: yields (event, data) pairs"""
+    try:
+        index = get_index()
+    except RuntimeError as e:
+        return iter([("error", {"error": str(e)})])
+    return rag_query_stream(question, index)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='In-process NumPy vector index backend')
+    parser.add_argument('--export-chroma', action='store_true', help='Build the index from the Chroma store')
+    parser.add_argument('--build', action='store_true', help='Embed foods.json with Ollama and build the index')
+    parser.add_argument('--chroma-dir', default=CHROMA_DIR, help='Chroma store to export from')
+    args = parser.parse_args()
+
+    if args.export_chroma:
+        export_chroma(chroma_dir=args.chroma_dir)
+        return
+    if args.build:
+        build_from_catalog()
+        return
+
+    try:
+        index = get_index()
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return
+
+    print(f"🧠 Local index ready: {len(index)} vectors ({index.dimension}-d). Type 'exit' to quit")
+    while True:
+        try:
+            question = input("\n💭 You: ").strip()
+            if question.lower() in ["exit", "quit", "q"]:
+                print("👋 Goodbye!")
+                break
+            if not question:
+                continue
+            print(f"\n🤖 Groq AI: {rag_query(question, index)}")
+        except KeyboardInterrupt:
+            print("\n👋 Goodbye!")
+            break
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,11 @@ import json
 from upstash_vector import Index
 from dotenv import load_dotenv
 import requests
+from client_pool import lease_index
+from food_catalog import read_foods, prepare_food_vectors
+from upstash_sync import sync_vectors
+from rag_stream import ollama_deltas, rag_events
+from resilience import get_policy
 
 # Load environment variables
 load_dotenv()
@@ -37,7 +42,7 @@ def validate_upstash_setup():
 def initialize_upstash_index():
     """Initialize Upstash Vector index with error handling"""
     try:
-        index = Index.from_env()
+        index = Index.from_env(retries=0)  # Retries go through get_policy("upstash")
         print("✅ Upstash Vector client initialized successfully")
         return index
     except Exception as e:
@@ -47,8 +52,7 @@ def initialize_upstash_index():
 def load_food_data():
     """Load and validate food data"""
     try:
-        with open(JSON_FILE, "r", encoding="utf-8") as f:
-            food_data = json.load(f)
+        food_data = read_foods(JSON_FILE)
         print(f"✅ Loaded {len(food_data)} food items from {JSON_FILE}")
         return food_data
     except Exception as e:
@@ -57,47 +61,53 @@ def load_food_data():
 
 def prepare_vectors_for_upsert(food_data):
     """Prepare all vectors for batch upload to Upstash"""
-    vectors_to_upsert = []
-    
-    for item in food_data:
-        # Enhance text with region/type context
-        enriched_text = item["text"]
-        if "region" in item:
-            enriched_text += f" This food is popular in {item['region']}."
-        if "type" in item:
-            enriched_text += f" It is a type of {item['type']}."
-        
-        # Prepare vector tuple: (id, text, metadata)
-        vectors_to_upsert.append(
-            (
-                item["id"],
-                enriched_text,  # This gets auto-embedded by Upstash
-                {
-                    "original_text": item["text"],
-                    "region": item.get("region", "Unknown"),
-                    "type": item.get("type", "Unknown"),
-                    "enriched_text": enriched_text
-                }
-            )
-        )
-    
-    return vectors_to_upsert
+    return prepare_food_vectors(food_data)
 
 def upsert_food_data(index, vectors):
-    """Upload all food data to Upstash Vector in a single batch"""
+    """Upload new or changed food data to Upstash Vector"""
     try:
-        print(f"🚀 Uploading {len(vectors)} documents to Upstash Vector...")
+        print(f"🚀 Syncing {len(vectors)} documents to Upstash Vector...")
         
-        # Single batch upsert - no delays needed!
-        index.upsert(vectors=vectors)
+        # Only items whose content changed since the last sync are sent
+        result = sync_vectors(index, "foods", vectors)
         
-        print("✅ All documents uploaded successfully!")
+        print(f"✅ Sync complete ({result['upserted']} uploaded, {result['unchanged']} unchanged)")
         return True
         
     except Exception as e:
         print(f"❌ Failed to upload data: {e}")
         return False
 
+def build_prompt(question, context):
+    """Prompt asking the LLM to answer from the retrieved food context"""
+    return f"""Use the following food information to answer the question comprehensively.
+
+Food Context:
+{context}
+
+Question: {question}
+Answer:"""
+
+def rag_query_stream(index, question):
+    """
+    RAG query as a stream of (event, data) pairs: sources, deltas, done
+    
+    Nothing is printed; see rag_stream.print_events for the terminal view.
+    """
+    def retrieve():
+        results = get_policy("upstash").call(
+            lambda: index.query(data=question, top_k=3, include_metadata=True)
+        )
+        if not results:
+            return None
+        sources = [
+            {"id": r.id, "text": r.metadata['original_text'], "relevance": f"{r.score:.3f}"}
+            for r in results
+        ]
+        return sources, build_prompt(question, "\n".join(source["text"] for source in sources))
+    
+    return rag_events(question, retrieve, lambda prompt: ollama_deltas(prompt, LLM_MODEL))
+
 def rag_query(index, question):
     """
     Perform RAG query using Upstash Vector
@@ -107,11 +117,11 @@ def rag_query(index, question):
         
         # Step 1: Query Upstash Vector (automatic embedding + search)
         print("🧠 Searching Upstash Vector database...")
-        results = index.query(
+        results = get_policy("upstash").call(lambda: index.query(
             data=question,
             top_k=3,
             include_metadata=True
-        )
+        ), verbose=True)
         
         if not results:
             return "❌ No relevant food information found for your question."
@@ -126,14 +136,7 @@ def rag_query(index, question):
             top_docs.append(result.metadata['original_text'])
         
         # Step 3: Build context for LLM
-        context = "\n".join(top_docs)
-        prompt = f"""Use the following food information to answer the question comprehensively.
-
-Food Context:
-{context}
-
-Question: {question}
-Answer:"""
+        prompt = build_prompt(question, "\n".join(top_docs))
         
         # Step 4: Generate answer with Ollama
         print("🤖 Generating response with Ollama...")
@@ -153,10 +156,20 @@ Answer:"""
 
 # Standardized wrapper function
 def query_rag(question):
-    index = initialize_upstash_index()
-    if index:
-        return rag_query(index, question)
-    return "❌ Failed to initialize Upstash Vector"
+    try:
+        with lease_index() as index:
+            return rag_query(index, question)
+    except Exception as e:
+        print(f"❌ Failed to initialize Upstash Vector: {e}")
+        return "❌ Failed to initialize Upstash Vector"
+
+def query_rag_stream(question):
+    """Standardized streaming entry point: yields (event, data) pairs"""
+    try:
+        with lease_index() as index:
+            yield from rag_query_stream(index, question)
+    except Exception as e:
+        yield "error", {"error": f"Failed to initialize Upstash Vector: {e}"}
 
 def main():
     """Main execution function"""
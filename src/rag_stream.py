@@ -0,0 +1,168 @@
+"""
+Streaming RAG events shared by every backend
+
+Each backend's query_rag_stream(question) yields (event, data) pairs in the
+same shape rag_server.py sends as server-sent events:
+
+    ("sources", {"question": ..., "sources": [{"id", "text", "relevance"}, ...]})
+    ("delta",   {"text": "..."})        one per generated chunk
+    ("done",    {"answer", "usage", "retrieval_ms", "first_token_ms", "total_ms"})
+    ("error",   {"error": "..."})       instead of done
+
+Nothing in the event path prints, so API and web callers can forward
+tokens as they arrive; print_events() is the terminal renderer used by the
+CLIs.
+
+Usage:
+    from rag_run_local import query_rag_stream
+    from rag_stream import print_events
+
+    answer = print_events(query_rag_stream("spicy curry"))
+"""
+
+import os
+import json
+import time
+
+import requests
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+
+
+def usage_dict(usage):
+    """Token usage object (pydantic, dict or plain) as a dict without None values"""
+    if usage is None:
+        return None
+    if hasattr(usage, "model_dump"):
+        usage = usage.model_dump()
+    elif not isinstance(usage, dict):
+        usage = vars(usage)
+    return {key: value for key, value in usage.items() if value is not None}
+
+
+def groq_deltas(client, messages, **settings):
+    """
+    Stream a Groq chat completion
+
+    Yields:
+        Text chunks as they arrive
+
+    Returns:
+        Token usage reported with the last chunk (or None)
+    """
+    completion = client.chat.completions.create(messages=messages, stream=True, **settings)
+    usage = None
+    for chunk in completion:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+        # Groq reports usage on the final chunk under x_groq
+        chunk_usage = getattr(getattr(chunk, "x_groq", None), "usage", None) or getattr(chunk, "usage", None)
+        if chunk_usage is not None:
+            usage = usage_dict(chunk_usage)
+    return usage
+
+
+def ollama_deltas(prompt, model, url=OLLAMA_URL):
+    """Stream an Ollama /api/generate completion (yields text, returns usage)"""
+    response = requests.post(f"{url}/api/generate", json={
+        "model": model,
+        "prompt": prompt,
+        "stream": True
+    }, stream=True)
+    if response.status_code != 200:
+        raise Exception(f"Error connecting to Ollama LLM (status: {response.status_code})")
+
+    usage = None
+    for line in response.iter_lines():
+        if not line:
+            continue
+        chunk = json.loads(line)
+        if chunk.get("response"):
+            yield chunk["response"]
+        if chunk.get("done"):
+            usage = {
+                "prompt_tokens": chunk.get("prompt_eval_count"),
+                "completion_tokens": chunk.get("eval_count"),
+            }
+    return usage
+
+
+def rag_events(question, retrieve, generate):
+    """
+    Run retrieve-then-generate as a stream of events
+
+    Args:
+        question: The user's question
+        retrieve: callable() -> (sources, payload), or None when nothing
+            relevant was found; sources are dicts with id/text/relevance
+        generate: callable(payload) -> generator of text chunks whose
+            return value is the token usage (see groq_deltas)
+    """
+    started = time.perf_counter()
+    try:
+        retrieved = retrieve()
+        if not retrieved:
+            yield "error", {"error": "No relevant food information found."}
+            return
+        sources, payload = retrieved
+        retrieved_at = time.perf_counter()
+        yield "sources", {"question": question, "sources": sources}
+
+        chunks = generate(payload)
+        parts = []
+        first_token_at = None
+        while True:
+            try:
+                text = next(chunks)
+            except StopIteration as stop:
+                usage = stop.value
+                break
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            parts.append(text)
+            yield "delta", {"text": text}
+
+        finished = time.perf_counter()
+        yield "done", {
+            "answer": "".join(parts).strip(),
+            "usage": usage or {},
+            "retrieval_ms": round((retrieved_at - started) * 1000, 1),
+            "first_token_ms": round(((first_token_at or finished) - started) * 1000, 1),
+            "total_ms": round((finished - started) * 1000, 1),
+        }
+
+    except Exception as e:
+        yield "error", {"error": str(e)}
+
+
+def collect_answer(events):
+    """Drain an event stream into the answer string (or a ❌ error message)"""
+    for event, data in events:
+        if event == "done":
+            return data["answer"]
+        if event == "error":
+            return f"❌ {data['error']}"
+    return "❌ Stream ended without an answer"
+
+
+def print_events(events, show_sources=True):
+    """Render an event stream in the terminal; returns the answer"""
+    for event, data in events:
+        if event == "sources" and show_sources:
+            print(f"\n📚 Found {len(data['sources'])} relevant food items:")
+            for i, source in enumerate(data["sources"]):
+                relevance = f", Relevance: {source['relevance']}" if source.get("relevance") else ""
+                print(f"🔹 Source {i + 1} (ID: {source['id']}{relevance}):")
+                print(f"    \"{source['text']}\"\n")
+            print("🤖 ", end="", flush=True)
+        elif event == "delta":
+            print(data["text"], end="", flush=True)
+        elif event == "done":
+            tokens = data["usage"].get("completion_tokens")
+            print(f"\n\n⏱️  First token {data['first_token_ms']:.0f}ms, total {data['total_ms']:.0f}ms"
+                  + (f", {tokens} tokens" if tokens else ""))
+            return data["answer"]
+        elif event == "error":
+            print(f"\n❌ {data['error']}")
+            return f"❌ {data['error']}"
+    return None
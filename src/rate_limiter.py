@@ -0,0 +1,325 @@
+"""
+Token-bucket rate limiter for requests and tokens per minute
+
+Groq limits both requests per minute (RPM) and tokens per minute (TPM).
+Each limiter keeps one bucket for each: a bucket holds up to a minute's
+budget and refills continuously, so short bursts go straight through and
+sustained load is paced to exactly the provider's limit instead of
+sleeping out a whole window.
+
+A call reserves its estimated tokens (prompt plus max_tokens) before it is
+sent and settles the difference once the real usage is known.
+
+Priority classes keep part of each bucket for more important work: an
+"interactive" call may drain the bucket, while "batch" and "background"
+calls wait while less than 25% / 50% of it is left, so a bulk job never
+starves a user waiting on an answer.
+
+By default the buckets live in the process. With RATE_LIMIT_STATE set to a
+file path they are kept in a SQLite database (WAL mode) and every process
+using the same path shares one budget, so parallel CLIs and workers no
+longer each assume they have the full quota.
+
+Usage:
+    from rate_limiter import get_limiter, estimate_tokens
+
+    limiter = get_limiter("groq")
+    estimate = estimate_tokens(messages, max_tokens)
+    limiter.acquire(estimate)                  # or: await limiter.acquire_async(...)
+    completion = client.chat.completions.create(...)
+    limiter.settle(estimate, completion.usage.total_tokens)   # or: await limiter.settle_async(...)
+
+    # Streams settle themselves from the usage on their last chunk
+    usage = yield from limiter.metered(groq_deltas(client, messages), estimate)
+
+Configuration (environment variables, per limiter name):
+    GROQ_REQUESTS_PER_MINUTE   Request budget (default 30)
+    GROQ_TOKENS_PER_MINUTE     Token budget (default 6000, 0 for none)
+    RATE_LIMIT_STATE           SQLite path shared across processes (default: per process)
+"""
+
+import os
+import time
+import sqlite3
+import asyncio
+import threading
+
+DEFAULT_LIMITS = {
+    "groq": (30, 6000),
+}
+RATE_LIMIT_STATE = os.getenv("RATE_LIMIT_STATE")
+# Fraction of each bucket that a class leaves for higher classes
+PRIORITIES = {
+    "interactive": 0.0,
+    "batch": 0.25,
+    "background": 0.5,
+}
+BUSY_TIMEOUT_MS = 1000
+LOCK_RETRIES = 5  # Extra attempts when the database stays locked past the busy timeout
+LOCK_RETRY_DELAY = 0.05  # seconds, multiplied by the attempt number
+CHARS_PER_TOKEN = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    requests REAL NOT NULL,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+
+def estimate_tokens(messages, max_tokens=0):
+    """Rough token cost of a chat call: prompt characters / 4 plus max_tokens"""
+    chars = sum(len(message.get("content") or "") for message in messages)
+    return chars // CHARS_PER_TOKEN + (max_tokens or 0)
+
+
+def _shortfall(level, cost, capacity, reserve):
+    """Seconds until a bucket can pay cost while keeping its reserve"""
+    if not capacity:
+        return 0.0
+    # A cost larger than the bucket is allowed once it is full; the
+    # bucket goes into debt and later calls wait for it to refill
+    need = min(cost + reserve * capacity, capacity)
+    return max(0.0, need - level) / (capacity / 60.0)
+
+
+class RateLimiter:
+    """Request and token buckets, optionally shared between processes"""
+
+    def __init__(self, name, requests_per_minute, tokens_per_minute=None, state_path=None):
+        self.name = name
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute or 0
+        self.state_path = state_path
+        self.waits = 0
+        self.waited_seconds = 0.0
+
+        self._lock = threading.Lock()
+        self._levels = (float(requests_per_minute), float(self.tokens_per_minute), time.time())
+        self._local = threading.local()
+        if state_path:
+            directory = os.path.dirname(os.path.abspath(state_path))
+            os.makedirs(directory, exist_ok=True)
+            self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        """One connection per thread (sqlite3 connections are not shareable)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.state_path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _refill(self, levels, now):
+        requests, tokens, updated = levels
+        elapsed = max(0.0, now - updated)
+        requests = min(self.requests_per_minute, requests + elapsed * self.requests_per_minute / 60.0)
+        tokens = min(self.tokens_per_minute, tokens + elapsed * self.tokens_per_minute / 60.0)
+        return requests, tokens, now
+
+    def _update(self, change):
+        """
+        Apply change(requests, tokens) -> (requests, tokens, result) to the
+        refilled buckets atomically and return result
+        """
+        with self._lock:
+            now = time.time()
+            if not self.state_path:
+                requests, tokens, _ = self._refill(self._levels, now)
+                requests, tokens, result = change(requests, tokens)
+                self._levels = (requests, tokens, now)
+                return result
+
+            conn = self._connect()
+            for attempt in range(LOCK_RETRIES + 1):
+                try:
+                    return self._transaction(conn, change)
+                except sqlite3.OperationalError as e:
+                    # Another process held the database past the busy timeout
+                    if "locked" not in str(e) or attempt == LOCK_RETRIES:
+                        raise
+                    time.sleep(LOCK_RETRY_DELAY * (attempt + 1))
+
+    def _transaction(self, conn, change):
+        """One read-modify-write of the shared buckets"""
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            row = conn.execute(
+                "SELECT requests, tokens, updated FROM buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+            levels = row or (self.requests_per_minute, self.tokens_per_minute, now)
+            requests, tokens, _ = self._refill(levels, now)
+            requests, tokens, result = change(requests, tokens)
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, requests, tokens, updated) VALUES (?, ?, ?, ?)",
+                (self.name, requests, tokens, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def try_acquire(self, tokens=0, priority="interactive"):
+        """
+        Take one request and tokens from the buckets if they allow it
+
+        Returns:
+            0.0 when acquired, otherwise the seconds to wait before trying again
+        """
+        reserve = PRIORITIES[priority]
+
+        def take(requests, available):
+            wait = max(
+                _shortfall(requests, 1, self.requests_per_minute, reserve),
+                _shortfall(available, tokens, self.tokens_per_minute, reserve),
+            )
+            if wait > 0:
+                return requests, available, wait
+            return requests - 1, available - (tokens if self.tokens_per_minute else 0), 0.0
+
+        return self._update(take)
+
+    def _count_wait(self, seconds):
+        with self._lock:
+            self.waits += 1
+            self.waited_seconds += seconds
+
+    def acquire(self, tokens=0, priority="interactive", verbose=False):
+        """
+        Block until a call costing tokens may be sent
+
+        Returns:
+            Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(tokens, priority)
+            if wait == 0:
+                if waited:
+                    self._count_wait(waited)
+                return waited
+            if verbose and not waited:
+                print(f"⏳ Rate limit: waiting {wait:.1f}s...")
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self, tokens=0, priority="interactive"):
+        """acquire() for coroutines: waits without blocking the event loop"""
+        waited = 0.0
+        while True:
+            if self.state_path:
+                # SQLite may wait on other processes, so it runs off the loop
+                wait = await asyncio.to_thread(self.try_acquire, tokens, priority)
+            else:
+                wait = self.try_acquire(tokens, priority)
+            if wait == 0:
+                if waited:
+                    self._count_wait(waited)
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def settle(self, reserved, used):
+        """
+        Return (or charge) the difference between reserved and used tokens
+
+        A call that failed before using anything settles with used=0, so
+        its estimate goes back to the bucket.
+        """
+        if used is None or not self.tokens_per_minute:
+            return
+        self._update(lambda requests, tokens: (
+            requests, min(self.tokens_per_minute, tokens + reserved - used), None
+        ))
+
+    async def settle_async(self, reserved, used):
+        """settle() for coroutines: shared state is written off the event loop"""
+        if used is None or not self.tokens_per_minute:
+            return
+        if self.state_path:
+            await asyncio.to_thread(self.settle, reserved, used)
+        else:
+            self.settle(reserved, used)
+
+    def metered(self, chunks, reserved):
+        """
+        Yield from a streamed call and settle its reservation
+
+        chunks is a generator returning a usage dict (see
+        rag_stream.groq_deltas); that usage is passed through. A stream that
+        fails before its first chunk is refunded in full.
+        """
+        streamed = False
+        while True:
+            try:
+                chunk = next(chunks)
+            except StopIteration as stop:
+                usage = stop.value
+                break
+            except Exception:
+                if not streamed:
+                    self.settle(reserved, 0)
+                raise
+            streamed = True
+            yield chunk
+        self.settle(reserved, (usage or {}).get("total_tokens"))
+        return usage
+
+    def stats(self):
+        requests, tokens = self._update(lambda requests, tokens: (requests, tokens, (requests, tokens)))
+        return {
+            "requests_per_minute": self.requests_per_minute,
+            "tokens_per_minute": self.tokens_per_minute,
+            "requests_available": round(requests, 2),
+            "tokens_available": round(tokens),
+            "waits": self.waits,
+            "waited_seconds": round(self.waited_seconds, 2),
+            "shared": os.path.abspath(self.state_path) if self.state_path else None,
+        }
+
+
+    async def stats_async(self):
+        """stats() for coroutines: shared state is read off the event loop"""
+        if self.state_path:
+            return await asyncio.to_thread(self.stats)
+        return self.stats()
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name="groq"):
+    """Process-wide limiter for a provider, configured from the environment"""
+    with _limiters_lock:
+        if name not in _limiters:
+            default_rpm, default_tpm = DEFAULT_LIMITS.get(name, (60, 0))
+            prefix = name.upper()
+            _limiters[name] = RateLimiter(
+                name,
+                int(os.getenv(f"{prefix}_REQUESTS_PER_MINUTE", str(default_rpm))),
+                int(os.getenv(f"{prefix}_TOKENS_PER_MINUTE", str(default_tpm))),
+                state_path=RATE_LIMIT_STATE,
+            )
+        return _limiters[name]
+
+
+def limiter_stats():
+    """Bucket levels and waits for every limiter in this process"""
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {name: limiter.stats() for name, limiter in limiters.items()}
+
+
+async def limiter_stats_async():
+    """limiter_stats() for coroutines"""
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {name: await limiter.stats_async() for name, limiter in limiters.items()}
@@ -0,0 +1,441 @@
+"""
+Retries, retry budget and circuit breaking for Groq and Upstash calls
+
+Every retrying call site goes through a per-provider ResiliencePolicy:
+
+- errors are classified by exception type and HTTP status code (message
+  text only as a last resort): rate limits, timeouts, connection and 5xx
+  errors are retried; authentication, quota and bad-request errors are not,
+  and neither is anything unclassified (a TypeError is a bug, not an outage)
+- retries wait with exponential backoff and full jitter (a random delay
+  between 0 and base * 2^attempt, capped), or the server's Retry-After
+- a per-process retry budget allows retries of at most 20% of recent calls
+  (plus a small floor), so an outage cannot be amplified by retry storms
+- a circuit breaker per provider opens after consecutive failures and
+  fails fast until a trial call succeeds after a cool-down
+
+Clients are built with their SDK's own retries turned off (see
+client_pool.py), so every HTTP attempt is counted here.
+
+Usage:
+    from resilience import get_policy, describe
+
+    try:
+        answer = get_policy("groq").call(lambda: ask_groq(prompt), attempts=3, verbose=True)
+    except Exception as e:
+        print(f"❌ {describe(e, credential='GROQ_API_KEY')}")
+
+    completion = await get_policy("groq").acall(lambda: client.chat.completions.create(...))
+
+Configuration (environment variables):
+    RETRY_BUDGET_RATIO       Retries allowed per call in the window (default 0.2)
+    RETRY_BUDGET_MIN         Retries always allowed per window (default 10)
+    CIRCUIT_FAILURES         Consecutive failures that open a circuit (default 5)
+    CIRCUIT_RESET_SECONDS    Seconds before an open circuit allows a trial (default 30)
+"""
+
+import os
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+RETRY_BUDGET_MIN = int(os.getenv("RETRY_BUDGET_MIN", "10"))
+RETRY_BUDGET_WINDOW = 10.0  # seconds
+CIRCUIT_FAILURES = int(os.getenv("CIRCUIT_FAILURES", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+# name -> (base delay, max delay) in seconds
+DEFAULT_BACKOFF = {
+    "groq": (1.0, 20.0),
+    "upstash": (0.5, 30.0),
+}
+
+RETRYABLE = {"rate_limit", "timeout", "connection", "server", "empty"}
+# Failures that say the provider itself is unhealthy
+OUTAGE = {"timeout", "connection", "server"}
+
+# Exception class names used by the groq, httpx, requests and upstash clients
+TYPE_KINDS = {
+    "RateLimitError": "rate_limit",
+    "APITimeoutError": "timeout",
+    "TimeoutException": "timeout",
+    "Timeout": "timeout",
+    "ReadTimeout": "timeout",
+    "ConnectTimeout": "timeout",
+    "TimeoutError": "timeout",
+    "APIConnectionError": "connection",
+    "ConnectError": "connection",
+    "ConnectionError": "connection",
+    "AuthenticationError": "auth",
+    "PermissionDeniedError": "auth",
+    "BadRequestError": "bad_request",
+    "NotFoundError": "bad_request",
+    "UnprocessableEntityError": "bad_request",
+    "InternalServerError": "server",
+    "CircuitOpenError": "circuit_open",
+}
+
+MESSAGES = {
+    "rate_limit": "Rate limit exceeded. Please try again later.",
+    "quota": "API quota exceeded. Please check your account credits.",
+    "timeout": "Request timed out after multiple attempts.",
+    "connection": "Could not connect to the API. Please check your internet connection.",
+    "server": "The API is having problems. Please try again later.",
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit is open"""
+
+
+def _status(error):
+    for owner in (error, getattr(error, "response", None)):
+        status = getattr(owner, "status_code", None) or getattr(owner, "status", None)
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def classify(error):
+    """
+    Kind of failure: rate_limit, quota, timeout, connection, server, auth,
+    bad_request, empty, circuit_open or unknown
+
+    Accepts exceptions or error strings (e.g. an "error" response field).
+    """
+    message = str(error).lower()
+    if not isinstance(error, str):
+        for cls in type(error).__mro__:
+            kind = TYPE_KINDS.get(cls.__name__)
+            if kind:
+                if kind == "rate_limit" and ("quota" in message or "credits" in message):
+                    return "quota"
+                return kind
+
+        status = _status(error)
+        if status == 429:
+            return "quota" if "quota" in message or "credits" in message else "rate_limit"
+        if status in (401, 403):
+            return "auth"
+        if status in (408, 504):
+            return "timeout"
+        if status is not None and status >= 500:
+            return "server"
+        if status is not None and status >= 400:
+            return "bad_request"
+
+    # Clients that only report the status in the message
+    if "quota" in message or "credits" in message:
+        return "quota"
+    if "429" in message or "rate limit" in message or "rate_limit" in message or "too many requests" in message:
+        return "rate_limit"
+    if "timeout" in message or "timed out" in message:
+        return "timeout"
+    if "authentication" in message or "401" in message or "api key" in message:
+        return "auth"
+    if "empty response" in message:
+        return "empty"
+    return "unknown"
+
+
+def retry_after(error):
+    """Seconds the server asked us to wait (Retry-After header), or None"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    try:
+        return float(headers.get("retry-after")) if headers else None
+    except (TypeError, ValueError):
+        return None
+
+
+def describe(error, credential=None):
+    """User-facing message for a failure that was not recovered"""
+    kind = classify(error)
+    if kind == "auth":
+        return f"Authentication failed. Please check your {credential or 'API key'}."
+    if kind == "circuit_open":
+        return str(error)
+    return MESSAGES.get(kind, str(error))
+
+
+class RetryBudget:
+    """Caps retries at a fraction of the calls made in a sliding window"""
+
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, minimum=RETRY_BUDGET_MIN, window=RETRY_BUDGET_WINDOW):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.window = window
+        self.denied = 0
+        self._calls = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        for events in (self._calls, self._retries):
+            while events and now - events[0] > self.window:
+                events.popleft()
+
+    def record_call(self):
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            self._calls.append(now)
+
+    def try_spend(self):
+        """Take one retry from the budget; False when it is exhausted"""
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            if len(self._retries) >= self.minimum + self.ratio * len(self._calls):
+                self.denied += 1
+                return False
+            self._retries.append(now)
+            return True
+
+    def stats(self):
+        with self._lock:
+            self._prune(time.monotonic())
+            return {
+                "calls": len(self._calls),
+                "retries": len(self._retries),
+                "denied": self.denied,
+                "window_seconds": self.window,
+            }
+
+
+class CircuitBreaker:
+    """Closed → open after repeated failures → half-open trial → closed"""
+
+    def __init__(self, name, failure_threshold=CIRCUIT_FAILURES, reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """
+        Raise CircuitOpenError unless a call may go ahead
+
+        Returns:
+            True when the call is the half-open trial; the caller must then
+            release_trial() once it is over, however it ends
+        """
+        with self._lock:
+            if self.state == "closed":
+                return False
+            remaining = self.opened_at + self.reset_seconds - time.monotonic()
+            if self.state == "open" and remaining <= 0:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial_running:
+                self._trial_running = True  # One trial call at a time
+                return True
+            raise CircuitOpenError(
+                f"{self.name} is unavailable (circuit open, retrying in {max(remaining, 0):.0f}s)"
+            )
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_error(self):
+        """
+        A failure that is not an outage (rate limit, bad request): the
+        provider answered, which ends a failure streak, but it is not the
+        successful trial that closes a half-open circuit
+        """
+        with self._lock:
+            if self.state == "closed":
+                self.failures = 0
+
+    def release_trial(self):
+        """Let the next call be the trial (after a trial ended in any way)"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.trips += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "trips": self.trips}
+
+
+class ResiliencePolicy:
+    """Retry policy and circuit breaker for one provider"""
+
+    def __init__(self, name, base_delay=1.0, max_delay=20.0, budget=None):
+        self.name = name
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget or _budget
+        self.breaker = CircuitBreaker(name)
+
+    def backoff(self, attempt, error=None):
+        """Full jitter: uniform between 0 and the capped exponential delay"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        hinted = retry_after(error) if error is not None else None
+        return max(delay, min(hinted, self.max_delay)) if hinted else delay
+
+    def _record_outcome(self, kind):
+        # Only failures of the provider itself count towards opening the circuit
+        if kind in OUTAGE:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_error()
+
+    def _retry_delay(self, error, attempt, attempts):
+        """Delay before the next attempt, or None to give up"""
+        kind = classify(error)
+        self._record_outcome(kind)
+        if kind not in RETRYABLE or attempt >= attempts - 1:
+            return None
+        if self.breaker.state == "open" or not self.budget.try_spend():
+            return None
+        return self.backoff(attempt, error)
+
+    def _announce(self, error, attempt, attempts, delay):
+        label = classify(error).replace("_", " ")
+        print(f"⏳ {self.name} {label} error (attempt {attempt + 1}/{attempts}). "
+              f"Retrying in {delay:.1f}s...")
+
+    def call(self, fn, attempts=3, verbose=False, on_retry=None):
+        """
+        Call fn() with retries
+
+        Args:
+            fn: Zero-argument callable making one attempt
+            attempts: Maximum attempts (including the first)
+            verbose: Print a line before each retry
+            on_retry: Optional callable(attempt, error, delay)
+
+        Raises:
+            The last error, or CircuitOpenError while the circuit is open
+        """
+        self.budget.record_call()
+        attempt = 0
+        while True:
+            trial = self.breaker.before_call()
+            try:
+                result = fn()
+            except Exception as e:
+                error = e
+                delay = self._retry_delay(e, attempt, attempts)
+                if delay is None:
+                    raise
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                if trial:
+                    self.breaker.release_trial()
+            if verbose:
+                self._announce(error, attempt, attempts, delay)
+            if on_retry:
+                on_retry(attempt, error, delay)
+            time.sleep(delay)
+            attempt += 1
+
+    async def acall(self, fn, attempts=3, verbose=False, on_retry=None):
+        """call() for coroutines: fn() returns an awaitable; waits do not block the loop"""
+        self.budget.record_call()
+        attempt = 0
+        while True:
+            trial = self.breaker.before_call()
+            try:
+                result = await fn()
+            except Exception as e:
+                error = e
+                delay = self._retry_delay(e, attempt, attempts)
+                if delay is None:
+                    raise
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                if trial:
+                    self.breaker.release_trial()
+            if verbose:
+                self._announce(error, attempt, attempts, delay)
+            if on_retry:
+                on_retry(attempt, error, delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def call_stream(self, gen_fn, attempts=3):
+        """
+        Yield from gen_fn() with retries before the first item
+
+        Once an item has been yielded a failure is raised, since it cannot
+        be taken back. The generator's return value is passed through.
+        """
+        self.budget.record_call()
+        attempt = 0
+        while True:
+            trial = self.breaker.before_call()
+            streamed = False
+            try:
+                items = gen_fn()
+                while True:
+                    try:
+                        item = next(items)
+                    except StopIteration as stop:
+                        result = stop.value
+                        break
+                    streamed = True
+                    yield item
+            except Exception as e:
+                delay = None if streamed else self._retry_delay(e, attempt, attempts)
+                if delay is None:
+                    if streamed:
+                        self._record_outcome(classify(e))
+                    raise
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                # Also runs when the consumer abandons the stream (GeneratorExit)
+                if trial:
+                    self.breaker.release_trial()
+            time.sleep(delay)
+            attempt += 1
+
+    def stats(self):
+        return {"base_delay": self.base_delay, "max_delay": self.max_delay, **self.breaker.stats()}
+
+
+_budget = RetryBudget()
+_policies = {}
+_policies_lock = threading.Lock()
+
+
+def get_policy(name):
+    """Process-wide policy for a provider (all share one retry budget)"""
+    with _policies_lock:
+        if name not in _policies:
+            base_delay, max_delay = DEFAULT_BACKOFF.get(name, (1.0, 20.0))
+            _policies[name] = ResiliencePolicy(name, base_delay, max_delay)
+        return _policies[name]
+
+
+def resilience_stats():
+    """Circuit states per provider and the shared retry budget"""
+    with _policies_lock:
+        policies = dict(_policies)
+    return {
+        "budget": _budget.stats(),
+        "circuits": {name: policy.stats() for name, policy in policies.items()},
+    }
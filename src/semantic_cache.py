@@ -0,0 +1,339 @@
+"""
+Semantic answer cache keyed by question-embedding similarity
+
+Paraphrases such as "What is Biryani?", "tell me about biryani" and
+"biryani?" should share one answer instead of each paying for a vector
+query and a Groq completion. Every cached entry keeps the question's
+embedding, its key terms, the retrieved IDs and the final answer; a lookup
+returns the most similar entry above a threshold whose key terms do not
+conflict with the question's.
+
+- Keys are found through random-hyperplane LSH tables, so a lookup only
+  scores the entries in the question's buckets and the buckets one bit
+  away from them (multi-probe).
+- Entries are evicted least-recently-used once the cache exceeds its byte
+  budget, and expire after a TTL.
+- The whole cache is dropped when the catalog version (the data files'
+  size and mtime) changes.
+
+Questions are embedded locally with a hashed word/character n-gram vector
+(stopwords removed, plurals folded), since the Upstash pipeline has no
+client-side embedder; callers with a real embedder can pass embed_fn.
+Hashed vectors of two long questions that differ in one dish name can score
+as high as a genuine paraphrase, so similarity alone never serves a hit.
+The key terms (content words other than request phrasing such as "please
+explain") must also agree: a paraphrase may add or drop words ("Which
+fruits have a purple colour?" for "Which fruits are purple?"), but not
+negate ("not spicy"), swap one subject for another ("black tea" for "green
+tea"; spelling variants count as the same word) or share
+less than half of its terms.
+
+Configuration (environment variables):
+    SEMANTIC_CACHE              Set to 0 to disable (default 1)
+    SEMANTIC_CACHE_THRESHOLD    Minimum cosine similarity for a hit (default 0.75)
+    SEMANTIC_CACHE_TTL          Seconds an entry stays valid (default 3600)
+    SEMANTIC_CACHE_MAX_BYTES    Memory budget per cache (default 32 MB)
+"""
+
+import os
+import sys
+import time
+import zlib
+import threading
+from collections import OrderedDict
+from difflib import SequenceMatcher
+
+import numpy as np
+
+from lexical_index import tokenize
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_FILES = (
+    os.path.join(BASE_DIR, "..", "data", "foods.json"),
+    os.path.join(BASE_DIR, "..", "data", "vivian_professional_profile.json"),
+)
+
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "1") != "0"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.75"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+SEMANTIC_CACHE_MAX_BYTES = int(os.getenv("SEMANTIC_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+HASH_DIM = 512
+LSH_TABLES = 12
+LSH_BITS = 5
+ENTRY_OVERHEAD_BYTES = 256
+# Request phrasing that does not change what is being asked
+FILLER_TERMS = {
+    "please", "explain", "describe", "know", "give", "want", "like", "would",
+    "could", "will", "should", "let", "us", "we", "information", "info",
+    "detail", "something", "thing", "kind", "sort", "quick", "briefly",
+}
+# Terms that turn a question into its opposite ("isn't" tokenizes to "isn")
+NEGATION_TERMS = {"not", "no", "without", "non", "never", "nor", "except", "isn", "aren", "don", "doesn"}
+KEY_TERM_OVERLAP = 0.5  # Minimum share of the two questions' terms in common
+SPELLING_VARIANT = 0.8  # Character similarity at which two terms are one word
+
+
+def hashed_embedding(text, dim=HASH_DIM):
+    """
+    Deterministic bag-of-n-grams embedding
+
+    Word unigrams carry most of the weight; character trigrams of each word
+    make it tolerant to small spelling differences ("biriyani").
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in tokenize(text):
+        vector[zlib.crc32(token.encode("utf-8")) % dim] += 1.0
+        padded = f"#{token}#"
+        for i in range(len(padded) - 2):
+            vector[zlib.crc32(b"3" + padded[i:i + 3].encode("utf-8")) % dim] += 0.25
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def key_terms(text):
+    """Content terms compared between a question and a cached one"""
+    return frozenset(term for term in tokenize(text) if len(term) > 1) - FILLER_TERMS
+
+
+def _has_variant(term, others):
+    return any(SequenceMatcher(None, term, other).ratio() >= SPELLING_VARIANT for other in others)
+
+
+def terms_compatible(asked, cached):
+    """
+    Whether a cached question's key terms allow serving its answer
+
+    Words only one side has must all be on the same side (an addition, not
+    a substitution), negations must agree and at least KEY_TERM_OVERLAP of
+    the terms must be shared.
+    """
+    if (asked & NEGATION_TERMS) != (cached & NEGATION_TERMS):
+        return False
+    only_asked = {term for term in asked - cached if not _has_variant(term, cached - asked)}
+    only_cached = {term for term in cached - asked if not _has_variant(term, asked - cached)}
+    if only_asked and only_cached:
+        return False
+    union = len(asked | cached)
+    return not union or (union - len(only_asked) - len(only_cached)) / union >= KEY_TERM_OVERLAP
+
+
+def catalog_version(paths=DATA_FILES):
+    """Cheap version stamp of the source data: size and mtime of each file"""
+    parts = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            parts.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+        except OSError:
+            parts.append("-")
+    return "|".join(parts)
+
+
+def _approx_bytes(value):
+    """Rough retained size of a cached answer (strings, lists, dicts)"""
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, dict):
+        return sum(_approx_bytes(k) + _approx_bytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(_approx_bytes(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class _Entry:
+    __slots__ = ("question", "terms", "embedding", "ids", "answer", "created", "size", "buckets")
+
+    def __init__(self, question, embedding, ids, answer, buckets):
+        self.question = question
+        self.terms = key_terms(question)
+        self.embedding = embedding
+        self.ids = list(ids or [])
+        self.answer = answer
+        self.created = time.time()
+        self.buckets = buckets
+        self.size = (ENTRY_OVERHEAD_BYTES + embedding.nbytes + _approx_bytes(question)
+                     + _approx_bytes(list(self.terms)) + _approx_bytes(self.ids) + _approx_bytes(answer))
+
+
+class SemanticCache:
+    """Thread-safe similarity cache with LSH lookup, LRU/TTL eviction and counters"""
+
+    def __init__(self, threshold=None, ttl=None, max_bytes=None, embed_fn=None,
+                 version_fn=catalog_version, dim=HASH_DIM, seed=0):
+        self.threshold = SEMANTIC_CACHE_THRESHOLD if threshold is None else threshold
+        self.ttl = SEMANTIC_CACHE_TTL if ttl is None else ttl
+        self.max_bytes = SEMANTIC_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.embed_fn = embed_fn or hashed_embedding
+        self.version_fn = version_fn
+        self.dim = dim
+        self._planes = None
+        self._seed = seed
+
+        self._entries = OrderedDict()  # key -> _Entry, least recently used first
+        self._tables = [{} for _ in range(LSH_TABLES)]  # bucket -> set(keys)
+        self._next_key = 0
+        self._bytes = 0
+        self._version = version_fn() if version_fn else None
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0, "misses": 0, "stores": 0, "evictions": 0,
+            "expirations": 0, "invalidations": 0,
+            "hit_ms": 0.0, "miss_ms": 0.0,
+        }
+
+    # --- internals (call with the lock held) -------------------------------
+
+    def _buckets(self, embedding):
+        if self._planes is None or self._planes.shape[2] != embedding.shape[0]:
+            rng = np.random.default_rng(self._seed)
+            self._planes = rng.standard_normal((LSH_TABLES, LSH_BITS, embedding.shape[0])).astype(np.float32)
+        bits = (self._planes @ embedding) > 0
+        weights = 1 << np.arange(LSH_BITS)
+        return tuple(int(code) for code in bits @ weights)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        for table, bucket in zip(self._tables, entry.buckets):
+            members = table.get(bucket)
+            if members is not None:
+                members.discard(key)
+                if not members:
+                    del table[bucket]
+        self._bytes -= entry.size
+
+    def _check_version(self):
+        if not self.version_fn:
+            return
+        version = self.version_fn()
+        if version != self._version:
+            if self._entries:
+                self._counters["invalidations"] += 1
+            self._entries.clear()
+            self._tables = [{} for _ in range(LSH_TABLES)]
+            self._bytes = 0
+            self._version = version
+
+    # --- public API ---------------------------------------------------------
+
+    def embed(self, question):
+        return np.asarray(self.embed_fn(question), dtype=np.float32)
+
+    def lookup(self, question, embedding=None):
+        """
+        Find a cached answer for a question or a close paraphrase
+
+        Returns:
+            Dictionary with answer, ids, question (the cached one) and
+            similarity, or None on a miss
+        """
+        started = time.perf_counter()
+        embedding = self.embed(question) if embedding is None else embedding
+        terms = key_terms(question)
+        with self._lock:
+            self._check_version()
+            buckets = self._buckets(embedding)
+            candidates = set()
+            for table, bucket in zip(self._tables, buckets):
+                # Neighbouring buckets too, so pairs near the threshold that
+                # differ in one hyperplane bit are still scored
+                for probe in (bucket, *(bucket ^ (1 << bit) for bit in range(LSH_BITS))):
+                    candidates.update(table.get(probe, ()))
+
+            best_key, best_score = None, self.threshold
+            now = time.time()
+            for key in candidates:
+                entry = self._entries[key]
+                if now - entry.created > self.ttl:
+                    self._remove(key)
+                    self._counters["expirations"] += 1
+                    continue
+                if not terms_compatible(terms, entry.terms):
+                    continue
+                score = float(entry.embedding @ embedding)
+                if score >= best_score:
+                    best_key, best_score = key, score
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if best_key is None:
+                self._counters["misses"] += 1
+                self._counters["miss_ms"] += elapsed_ms
+                return None
+
+            self._entries.move_to_end(best_key)
+            entry = self._entries[best_key]
+            self._counters["hits"] += 1
+            self._counters["hit_ms"] += elapsed_ms
+            return {
+                "answer": entry.answer,
+                "ids": list(entry.ids),
+                "question": entry.question,
+                "similarity": round(best_score, 4),
+            }
+
+    def store(self, question, answer, ids=None, embedding=None):
+        """Cache an answer (and the IDs it was built from) for a question"""
+        embedding = self.embed(question) if embedding is None else embedding
+        with self._lock:
+            self._check_version()
+            entry = _Entry(question, embedding, ids, answer, self._buckets(embedding))
+            if entry.size > self.max_bytes:
+                return
+            key = self._next_key
+            self._next_key += 1
+            self._entries[key] = entry
+            for table, bucket in zip(self._tables, entry.buckets):
+                table.setdefault(bucket, set()).add(key)
+            self._bytes += entry.size
+            self._counters["stores"] += 1
+
+            while self._bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+                self._counters["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tables = [{} for _ in range(LSH_TABLES)]
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            lookups = counters["hits"] + counters["misses"]
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "threshold": self.threshold,
+                "hits": counters["hits"],
+                "misses": counters["misses"],
+                "hit_rate": round(counters["hits"] / lookups, 3) if lookups else 0.0,
+                "stores": counters["stores"],
+                "evictions": counters["evictions"],
+                "expirations": counters["expirations"],
+                "invalidations": counters["invalidations"],
+                "avg_hit_ms": round(counters["hit_ms"] / counters["hits"], 3) if counters["hits"] else 0.0,
+                "avg_miss_ms": round(counters["miss_ms"] / counters["misses"], 3) if counters["misses"] else 0.0,
+            }
+
+
+# Process-wide caches, one per dataset/pipeline scope
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(scope):
+    """Return the shared cache for a scope (e.g. "food", "profile"), or None if disabled"""
+    if not SEMANTIC_CACHE:
+        return None
+    with _caches_lock:
+        if scope not in _caches:
+            _caches[scope] = SemanticCache()
+        return _caches[scope]
+
+
+def cache_stats():
+    """Stats for every cache created in this process"""
+    with _caches_lock:
+        caches = dict(_caches)
+    return {scope: cache.stats() for scope, cache in caches.items()}
@@ -0,0 +1,234 @@
+"""
+Single-flight request coalescing
+
+When the same question arrives several times at once, only the first
+request (the leader) runs the Upstash query and Groq completion; the
+others wait for it and receive the same result. Questions are keyed by
+their normalised form (case-folded, whitespace collapsed, see
+answer_cache.normalize_question) plus the model/prompt parameters, so
+"What is Biryani?" and "what is  biryani" share one upstream call.
+
+- SingleFlight coalesces blocking calls across threads (the NDJSON
+  daemons serve each connection on its own thread).
+- AsyncSingleFlight coalesces coroutines on one event loop and streams:
+  a late joiner replays the events produced so far, then follows live.
+
+Each group counts its calls and how many upstream calls were saved.
+
+Usage:
+    from single_flight import flight_key, get_flight
+
+    key = flight_key("food", question, CACHE_PARAMS)
+    answer, shared = get_flight("food").do(key, lambda: compute(question))
+"""
+
+import json
+import asyncio
+import threading
+
+from answer_cache import normalize_question
+
+
+def flight_key(scope, question, params=None):
+    """Key shared by identical questions under the same scope and parameters"""
+    return json.dumps([scope, normalize_question(question), params or {}],
+                      sort_keys=True, ensure_ascii=False, default=str)
+
+
+class _Counters:
+    def __init__(self):
+        self.calls = 0
+        self.executions = 0
+        self.in_flight = 0
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "saved": self.calls - self.executions,
+            "in_flight": self.in_flight,
+        }
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(_Counters):
+    """Coalesce concurrent blocking calls with the same key"""
+
+    def __init__(self):
+        super().__init__()
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """
+        Run fn() once for every caller that arrives while it is in flight
+
+        Returns:
+            Tuple of (result, shared) where shared is True for callers that
+            waited on another caller's computation. The result object is
+            the same for all of them; copy it before mutating.
+
+        Raises:
+            Whatever fn() raised, in every caller
+        """
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            shared = call is not None
+            if not shared:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+                self.in_flight += 1
+        if shared:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            # Followers must see KeyboardInterrupt/SystemExit too, not None
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                self.in_flight -= 1
+            call.done.set()
+        return call.result, False
+
+
+class _Broadcast:
+    """Events from one async generator, replayable by any number of readers"""
+
+    def __init__(self, agen):
+        self.events = []
+        self.finished = False
+        self.error = None
+        self._changed = asyncio.Condition()
+        self.task = asyncio.ensure_future(self._pump(agen))
+
+    async def _pump(self, agen):
+        try:
+            async for event in agen:
+                async with self._changed:
+                    self.events.append(event)
+                    self._changed.notify_all()
+        except BaseException as e:
+            # Includes cancellation, so subscribers are never left waiting
+            self.error = e
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            async with self._changed:
+                self.finished = True
+                self._changed.notify_all()
+
+    async def subscribe(self):
+        position = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: position < len(self.events) or self.finished)
+                pending = self.events[position:]
+                finished = self.finished
+            for event in pending:
+                yield event
+            position += len(pending)
+            if finished and position == len(self.events):
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class AsyncSingleFlight(_Counters):
+    """Coalesce concurrent coroutines and streams with the same key"""
+
+    def __init__(self):
+        super().__init__()
+        self._tasks = {}
+        self._streams = {}
+
+    async def do(self, key, coro_fn):
+        """
+        Await coro_fn() once for every caller that arrives while it runs
+
+        The computation runs as its own task, so a caller that disconnects
+        (and is cancelled) does not cancel it for the others.
+
+        Returns:
+            Tuple of (result, shared), as SingleFlight.do
+        """
+        self.calls += 1
+        task = self._tasks.get(key)
+        shared = task is not None
+        if not shared:
+            task = self._tasks[key] = asyncio.ensure_future(coro_fn())
+            self.executions += 1
+            self.in_flight += 1
+
+            def forget(_task):
+                self._tasks.pop(key, None)
+                self.in_flight -= 1
+
+            task.add_done_callback(forget)
+        return await asyncio.shield(task), shared
+
+    async def stream(self, key, agen_fn):
+        """
+        Yield (shared, event) pairs from agen_fn(), run once per key
+
+        A caller joining a stream that is already running first receives
+        every event produced so far, then follows the live stream.
+        """
+        self.calls += 1
+        broadcast = self._streams.get(key)
+        shared = broadcast is not None
+        if not shared:
+            broadcast = self._streams[key] = _Broadcast(agen_fn())
+            self.executions += 1
+            self.in_flight += 1
+
+            def forget(_task):
+                self._streams.pop(key, None)
+                self.in_flight -= 1
+
+            broadcast.task.add_done_callback(forget)
+        async for event in broadcast.subscribe():
+            yield shared, event
+
+
+# Process-wide groups, one per dataset/pipeline scope
+_groups = {}
+_groups_lock = threading.Lock()
+
+
+def get_flight(scope):
+    """Shared SingleFlight for blocking callers in a scope"""
+    with _groups_lock:
+        if scope not in _groups:
+            _groups[scope] = SingleFlight()
+        return _groups[scope]
+
+
+def get_async_flight(scope):
+    """Shared AsyncSingleFlight for coroutines in a scope (one event loop)"""
+    with _groups_lock:
+        if scope not in _groups:
+            _groups[scope] = AsyncSingleFlight()
+        return _groups[scope]
+
+
+def flight_stats():
+    """Calls, executions and saved upstream calls for every group"""
+    with _groups_lock:
+        groups = dict(_groups)
+    return {scope: group.stats() for scope, group in groups.items()}
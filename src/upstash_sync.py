@@ -0,0 +1,238 @@
+"""
+Incremental Upstash sync driven by a local content-hash manifest
+
+The manifest records a hash of each vector's text and metadata per
+dataset, so an upload only sends new or changed IDs instead of
+re-embedding the whole catalog on Upstash's side. IDs that disappeared
+from the source can optionally be deleted.
+
+Each dataset lives in its own Upstash namespace (foods in the default
+namespace, the profile in "profile") so queries can be scoped to one
+dataset. Moving a dataset to a new namespace re-uploads it there; --prune
+also removes the copy left in the old namespace. The profile used to share
+the default namespace with the foods; its first namespaced sync deletes
+those old copies (by ID) even without a manifest entry recording them, so
+food queries stop retrieving profile chunks.
+
+Manifest layout (JSON):
+    {
+      "version": 1,
+      "datasets": {
+        "foods": {"index": "<hash of index URL>", "namespace": "", "hashes": {"1": "<sha256>", ...}},
+        "profile": {"index": "...", "namespace": "profile", "hashes": {...}}
+      }
+    }
+"""
+
+import os
+import json
+import hashlib
+
+from bulk_upsert import bulk_upsert
+from resilience import get_policy
+
+MANIFEST_VERSION = 1
+DATASET_NAMESPACES = {
+    "foods": os.getenv("UPSTASH_FOODS_NAMESPACE", ""),
+    "profile": os.getenv("UPSTASH_PROFILE_NAMESPACE", "profile"),
+}
+# Where datasets lived before they had their own namespaces
+LEGACY_NAMESPACES = {
+    "profile": "",
+}
+MANIFEST_FILE = os.getenv(
+    "UPSTASH_MANIFEST",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".upstash_manifest.json")
+)
+
+
+def dataset_namespace(dataset):
+    """Upstash namespace holding a dataset ("" is the default namespace)"""
+    return DATASET_NAMESPACES.get(dataset, "")
+
+
+def vector_hash(text, metadata):
+    """Stable content hash of one vector's text and metadata"""
+    payload = json.dumps([text, metadata], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def index_fingerprint():
+    """Identify the target index so a manifest is never reused across indexes"""
+    url = os.getenv("UPSTASH_VECTOR_REST_URL", "")
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()[:16]
+
+
+def load_manifest(path=None):
+    path = path or MANIFEST_FILE
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest
+    except (FileNotFoundError, ValueError):
+        pass
+    return {"version": MANIFEST_VERSION, "datasets": {}}
+
+
+def save_manifest(manifest, path=None):
+    """Write the manifest atomically"""
+    path = path or MANIFEST_FILE
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def dataset_hashes(manifest, dataset, namespace=None):
+    """Hashes recorded for a dataset on the current index (and namespace, if given)"""
+    entry = manifest["datasets"].get(dataset)
+    if not entry or entry.get("index") != index_fingerprint():
+        return {}
+    if namespace is not None and entry.get("namespace", "") != namespace:
+        return {}
+    return entry.get("hashes", {})
+
+
+def plan_sync(vectors, known_hashes):
+    """
+    Diff prepared vectors against the manifest
+
+    Args:
+        vectors: List of (id, text, metadata) tuples
+        known_hashes: {id: hash} from the manifest
+
+    Returns:
+        Dictionary with 'upsert' (vectors), 'delete' (ids), 'unchanged' (ids)
+        and 'hashes' ({id: hash} for the current vectors)
+    """
+    hashes = {}
+    upsert = []
+    unchanged = []
+    for vector in vectors:
+        vector_id, text, metadata = vector[0], vector[1], vector[2]
+        digest = vector_hash(text, metadata)
+        hashes[vector_id] = digest
+        if known_hashes.get(vector_id) == digest:
+            unchanged.append(vector_id)
+        else:
+            upsert.append(vector)
+
+    delete = sorted(set(known_hashes) - set(hashes))
+    return {"upsert": upsert, "delete": delete, "unchanged": unchanged, "hashes": hashes}
+
+
+def print_plan(plan, known_hashes, prune):
+    """Print a dry-run style diff of the sync plan"""
+    new_ids = [v[0] for v in plan["upsert"] if v[0] not in known_hashes]
+    changed_ids = [v[0] for v in plan["upsert"] if v[0] in known_hashes]
+
+    print(f"📋 Sync plan: {len(new_ids)} new, {len(changed_ids)} changed, "
+          f"{len(plan['unchanged'])} unchanged, {len(plan['delete'])} removed")
+    for vector_id in new_ids:
+        print(f"   + {vector_id}")
+    for vector_id in changed_ids:
+        print(f"   ~ {vector_id}")
+    for vector_id in plan["delete"]:
+        print(f"   - {vector_id}" + ("" if prune else "  (kept; use --prune to delete)"))
+
+
+def sync_vectors(index, dataset, vectors, prune=False, dry_run=False, full=False,
+                 manifest_path=None, upsert_fn=None, namespace=None):
+    """
+    Upload only the vectors whose content changed since the last sync
+
+    Args:
+        index: Upstash Vector index
+        dataset: Manifest section, e.g. "foods" or "profile"
+        vectors: List of (id, text, metadata) tuples
+        prune: Delete IDs that are in the manifest but no longer in `vectors`
+        dry_run: Only print the diff
+        full: Ignore the manifest and re-upload everything
+        upsert_fn: Optional callable(index, vectors) used instead of the
+            chunked, resumable bulk_upsert()
+        namespace: Upstash namespace (defaults to the dataset's namespace)
+
+    Returns:
+        Dictionary with upserted/deleted/unchanged counts
+    """
+    namespace = dataset_namespace(dataset) if namespace is None else namespace
+    manifest = load_manifest(manifest_path)
+
+    # A dataset that moved namespace starts over in the new one; the copy
+    # left behind is remembered until a --prune run deletes it
+    entry = manifest["datasets"].get(dataset) or {}
+    stale_namespace, stale = None, []
+    if dataset_hashes(manifest, dataset) and entry.get("namespace", "") != namespace:
+        stale_namespace, stale = entry.get("namespace", ""), sorted(entry["hashes"])
+    elif dataset_hashes(manifest, dataset) and entry.get("moved_from"):
+        stale_namespace, stale = entry["moved_from"]["namespace"], entry["moved_from"]["ids"]
+
+    known_hashes = {} if full else dataset_hashes(manifest, dataset, namespace)
+    if full:
+        # Still delete what the previous manifest knew about
+        previous = dataset_hashes(manifest, dataset, namespace)
+        plan = plan_sync(vectors, {})
+        plan["delete"] = sorted(set(previous) - set(plan["hashes"]))
+    else:
+        plan = plan_sync(vectors, known_hashes)
+
+    # First sync on this index: copies uploaded before namespaces existed
+    # are not in the manifest, so delete them by ID
+    legacy_namespace = LEGACY_NAMESPACES.get(dataset)
+    legacy = []
+    if not dataset_hashes(manifest, dataset) and legacy_namespace is not None and legacy_namespace != namespace:
+        legacy = sorted(plan["hashes"])
+
+    print_plan(plan, known_hashes, prune)
+    if legacy:
+        print(f"🧹 First sync of {dataset} into namespace '{namespace or 'default'}': "
+              f"deleting {len(legacy)} old copies from namespace '{legacy_namespace or 'default'}'")
+    if stale:
+        print(f"🔀 {dataset} moved from namespace '{stale_namespace or 'default'}' to "
+              f"'{namespace or 'default'}': {len(stale)} old vectors "
+              + ("will be deleted" if prune else "kept (use --prune to delete)"))
+    result = {
+        "upserted": len(plan["upsert"]),
+        "deleted": (len(plan["delete"]) + len(stale) if prune else 0) + len(legacy),
+        "unchanged": len(plan["unchanged"]),
+        "dry_run": dry_run,
+    }
+    if dry_run:
+        print("🔎 Dry run: nothing was uploaded")
+        return result
+
+    if plan["upsert"]:
+        if upsert_fn:
+            upsert_fn(index, plan["upsert"])
+        else:
+            # The manifest is only saved after a full sync, so an interrupted
+            # upload re-plans the same batches and the checkpoint skips them
+            checkpoint_path = f"{manifest_path or MANIFEST_FILE}.{dataset}.checkpoint"
+            bulk_upsert(index, plan["upsert"], checkpoint_path=checkpoint_path, namespace=namespace)
+
+    recorded = dict(plan["hashes"])
+    if plan["delete"]:
+        if prune:
+            get_policy("upstash").call(lambda: index.delete(ids=plan["delete"], namespace=namespace))
+        else:
+            # Keep tracking IDs that still exist remotely
+            previous = dataset_hashes(manifest, dataset, namespace)
+            for vector_id in plan["delete"]:
+                if vector_id in previous:
+                    recorded[vector_id] = previous[vector_id]
+
+    if stale and prune:
+        get_policy("upstash").call(lambda: index.delete(ids=stale, namespace=stale_namespace))
+    if legacy:
+        get_policy("upstash").call(lambda: index.delete(ids=legacy, namespace=legacy_namespace))
+
+    manifest["datasets"][dataset] = {
+        "index": index_fingerprint(),
+        "namespace": namespace,
+        "hashes": recorded,
+    }
+    if stale and not prune:
+        manifest["datasets"][dataset]["moved_from"] = {"namespace": stale_namespace, "ids": stale}
+    save_manifest(manifest, manifest_path)
+    return result
@@ -2,14 +2,34 @@
 """
 Upload foods.json data to Upstash Vector Database
 This script will upload all food items to your Upstash Vector index.
+
+Only new or changed items are sent; a local manifest of content hashes
+tracks what the index already holds.
+
+Usage:
+    python3 upload_foods_to_upstash.py             # Upload new/changed items
+    python3 upload_foods_to_upstash.py --dry-run   # Show the diff only
+    python3 upload_foods_to_upstash.py --prune     # Also delete removed items
+    python3 upload_foods_to_upstash.py --full      # Re-upload everything
 """
 
 import os
+import sys
 import json
+import argparse
 from upstash_vector import Index
 from dotenv import load_dotenv
 from typing import List, Dict
 
+# Add src directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from food_catalog import prepare_food_vectors
+from upstash_sync import sync_vectors
+from resilience import get_policy
+
+FOODS_DATASET = "foods"
+
 def load_food_data(file_path: str = "data/foods.json") -> List[Dict]:
     """Load food data from JSON file"""
     print(f"📂 Loading food data from {file_path}...")
@@ -21,90 +41,25 @@ def load_food_data(file_path: str = "data/foods.json") -> List[Dict]:
 def prepare_vectors(food_data: List[Dict]) -> List[tuple]:
     """Prepare vectors for Upstash upload with enhanced text"""
     print(f"\n🔧 Preparing vectors for upload...")
-    vectors = []
-    
-    for item in food_data:
-        # Handle different data formats
-        # Format 1: Simple format with "text" field (items 1-90)
-        # Format 2: Detailed format with "name" and "description" fields (items 91-110)
-        
-        if "text" in item:
-            # Simple format (items 1-90)
-            base_text = item["text"]
-            enriched_text = base_text
-            
-            if "region" in item and item["region"]:
-                enriched_text += f" This food is popular in {item['region']}."
-            
-            if "type" in item and item["type"]:
-                enriched_text += f" It is a type of {item['type']}."
-            
-            metadata = {
-                "original_text": base_text,
-                "region": item.get("region", "Unknown"),
-                "type": item.get("type", "Unknown"),
-                "enhanced_text": enriched_text
-            }
-        
-        elif "name" in item and "description" in item:
-            # Detailed format (items 91-110)
-            name = item["name"]
-            description = item["description"]
-            category = item.get("category", "Unknown")
-            origin = item.get("origin", "Unknown")
-            
-            # Create comprehensive text for embedding
-            enriched_text = f"{name}: {description}"
-            
-            if origin and origin != "Unknown":
-                enriched_text += f" This dish is from {origin}."
-            
-            if category and category != "Unknown":
-                enriched_text += f" It is a {category}."
-            
-            # Add ingredients if available
-            if "ingredients" in item and item["ingredients"]:
-                ingredients_str = ", ".join(item["ingredients"][:5])  # First 5 ingredients
-                enriched_text += f" Main ingredients: {ingredients_str}."
-            
-            metadata = {
-                "original_text": description,
-                "name": name,
-                "region": origin,
-                "type": category,
-                "enhanced_text": enriched_text,
-                "ingredients": item.get("ingredients", []),
-                "cooking_method": item.get("cooking_method", ""),
-                "dietary_tags": item.get("dietary_tags", [])
-            }
-        
-        else:
-            # Skip items without required fields
-            print(f"⚠️  Warning: Item {item.get('id', 'unknown')} missing required fields, skipping...")
-            continue
-        
-        # Create vector tuple: (id, text, metadata)
-        vectors.append((
-            item["id"],
-            enriched_text,  # Upstash will auto-embed this
-            metadata
-        ))
-    
+    # Shared with every other foods uploader so they all agree with the manifest
+    vectors = prepare_food_vectors(food_data)
     print(f"✅ Prepared {len(vectors)} vectors")
     return vectors
 
-def upload_to_upstash(vectors: List[tuple]) -> dict:
-    """Upload vectors to Upstash Vector Database"""
+def upload_to_upstash(vectors: List[tuple], prune: bool = False,
+                      dry_run: bool = False, full: bool = False) -> dict:
+    """Upload new or changed vectors to Upstash Vector Database"""
     print(f"\n🚀 Connecting to Upstash Vector...")
     
-    # Initialize Upstash client from environment variables
-    index = Index.from_env()
+    # Initialize Upstash client from environment variables (retries go
+    # through the shared policy, not the SDK)
+    index = Index.from_env(retries=0)
     
     print(f"✅ Connected to Upstash Vector")
     
     # Check current vector count before upload
     try:
-        info = index.info()
+        info = get_policy("upstash").call(index.info)
         print(f"📊 Current database stats:")
         print(f"   - Vector count: {info.vector_count}")
         print(f"   - Dimensions: {info.dimension}")
@@ -112,16 +67,24 @@ def upload_to_upstash(vectors: List[tuple]) -> dict:
     except Exception as e:
         print(f"⚠️  Could not get database info: {e}")
     
-    # Upload vectors in batch
-    print(f"\n⬆️  Uploading {len(vectors)} vectors to Upstash...")
+    # Upload only what changed since the last sync
+    print(f"\n⬆️  Syncing {len(vectors)} vectors to Upstash...")
     
     try:
         # Upstash Vector accepts tuples of (id, data, metadata)
-        result = index.upsert(vectors=vectors)
-        print(f"✅ Successfully uploaded {len(vectors)} vectors!")
+        sync = sync_vectors(index, FOODS_DATASET, vectors, prune=prune, dry_run=dry_run, full=full)
+        if dry_run:
+            return {
+                "success": True,
+                "uploaded": 0,
+                "total_vectors": None,
+                "dry_run": True
+            }
+        print(f"✅ Uploaded {sync['upserted']} vectors "
+              f"({sync['unchanged']} unchanged, {sync['deleted']} deleted)")
         
         # Check stats after upload
-        info = index.info()
+        info = get_policy("upstash").call(index.info)
         print(f"\n📊 Updated database stats:")
         print(f"   - Total vectors: {info.vector_count}")
         print(f"   - Dimensions: {info.dimension}")
@@ -129,7 +92,7 @@ def upload_to_upstash(vectors: List[tuple]) -> dict:
         
         return {
             "success": True,
-            "uploaded": len(vectors),
+            "uploaded": sync["upserted"],
             "total_vectors": info.vector_count
         }
         
@@ -153,11 +116,11 @@ def test_query(index: Index):
     for query in test_queries:
         print(f"\n🔍 Query: '{query}'")
         try:
-            results = index.query(
+            results = get_policy("upstash").call(lambda: index.query(
                 data=query,
                 top_k=3,
                 include_metadata=True
-            )
+            ))
             
             print(f"   Found {len(results)} results:")
             for i, result in enumerate(results, 1):
@@ -172,6 +135,12 @@ def test_query(index: Index):
 
 def main():
     """Main execution function"""
+    parser = argparse.ArgumentParser(description='Upload foods.json to Upstash Vector')
+    parser.add_argument('--dry-run', action='store_true', help='Show what would change without uploading')
+    parser.add_argument('--prune', action='store_true', help='Delete items no longer in foods.json')
+    parser.add_argument('--full', action='store_true', help='Ignore the manifest and re-upload everything')
+    args = parser.parse_args()
+    
     print("=" * 70)
     print("🍕 UPLOAD FOODS.JSON TO UPSTASH VECTOR DATABASE 🍕")
     print("=" * 70)
@@ -206,16 +175,18 @@ def main():
     vectors = prepare_vectors(food_data)
     
     # Step 3: Upload to Upstash
-    result = upload_to_upstash(vectors)
+    result = upload_to_upstash(vectors, prune=args.prune, dry_run=args.dry_run, full=args.full)
     
-    if result["success"]:
+    if result.get("dry_run"):
+        print(f"\n🔎 Dry run complete - rerun without --dry-run to apply")
+    elif result["success"]:
         print(f"\n" + "=" * 70)
         print(f"🎉 SUCCESS! Uploaded {result['uploaded']} food items to Upstash!")
         print(f"📊 Total vectors in database: {result['total_vectors']}")
         print(f"=" * 70)
         
         # Step 4: Test with sample queries
-        index = Index.from_env()
+        index = Index.from_env(retries=0)
         test_query(index)
         
         print(f"\n" + "=" * 70)
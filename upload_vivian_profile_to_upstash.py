@@ -16,8 +16,14 @@ for use in the digital twin RAG system. The profile includes:
 
 The script uses Upstash Vector's auto-embedding feature with the mxbai-embed-large-v1 model.
 
+Only new or changed entries are sent; a local manifest of content hashes
+tracks what the index already holds.
+
 Usage:
-    python3 upload_vivian_profile_to_upstash.py
+    python3 upload_vivian_profile_to_upstash.py             # Upload new/changed entries
+    python3 upload_vivian_profile_to_upstash.py --dry-run   # Show the diff only
+    python3 upload_vivian_profile_to_upstash.py --prune     # Also delete removed entries
+    python3 upload_vivian_profile_to_upstash.py --full      # Re-upload everything
 
 Environment Variables Required:
     UPSTASH_VECTOR_REST_URL - Your Upstash Vector database URL
@@ -30,11 +36,20 @@ Date: October 29, 2025
 import json
 import os
 import sys
+import argparse
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional
 from dotenv import load_dotenv
 from upstash_vector import Index
 
+# Add src directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from upstash_sync import sync_vectors, dataset_namespace
+from resilience import get_policy
+
+PROFILE_DATASET = "profile"
+
 # Load environment variables
 load_dotenv()
 
@@ -124,15 +139,20 @@ def prepare_vectors(profile_data: List[Dict]) -> List[Tuple[str, str, Dict]]:
     return vectors
 
 
-def upload_to_upstash(vectors: List[Tuple[str, str, Dict]]) -> Dict:
+def upload_to_upstash(vectors: List[Tuple[str, str, Dict]], prune: bool = False,
+                      dry_run: bool = False, full: bool = False) -> Dict:
     """
-    Upload profile vectors to Upstash Vector database.
+    Upload new or changed profile vectors to Upstash Vector database.
     
     Uses Upstash Vector's auto-embedding feature to automatically
-    generate embeddings using the mxbai-embed-large-v1 model.
+    generate embeddings using the mxbai-embed-large-v1 model. Entries
+    whose content hash matches the local manifest are skipped.
     
     Args:
         vectors: List of tuples (id, text, metadata)
+        prune: Delete entries that are no longer in the profile JSON
+        dry_run: Only print what would change
+        full: Ignore the manifest and re-upload everything
         
     Returns:
         Dictionary with upload statistics
@@ -140,23 +160,27 @@ def upload_to_upstash(vectors: List[Tuple[str, str, Dict]]) -> Dict:
     try:
         # Initialize Upstash Vector index
         print("\n📡 Connecting to Upstash Vector database...")
-        index = Index.from_env()
+        index = Index.from_env(retries=0)  # Retries go through get_policy("upstash")
         print("✅ Connected successfully")
         
         # Upload vectors (auto-embedding enabled)
-        print(f"\n📤 Uploading {len(vectors)} professional profile vectors...")
+        print(f"\n📤 Syncing {len(vectors)} professional profile vectors "
+              f"into namespace '{dataset_namespace(PROFILE_DATASET)}'...")
         print("   (Upstash will auto-embed using mxbai-embed-large-v1 model)")
         
-        # Upsert vectors to database
+        # Upsert only new or changed vectors
         # Format: index.upsert(vectors=[(id, text, metadata), ...])
-        result = index.upsert(vectors=vectors)
+        result = sync_vectors(index, PROFILE_DATASET, vectors, prune=prune, dry_run=dry_run, full=full)
         
-        print("✅ Upload complete!")
-        print(f"   Uploaded: {len(vectors)} vectors")
+        if not dry_run:
+            print("✅ Upload complete!")
+            print(f"   Uploaded: {result['upserted']} vectors "
+                  f"({result['unchanged']} unchanged, {result['deleted']} deleted)")
         
         return {
             "success": True,
-            "uploaded_count": len(vectors),
+            "uploaded_count": result["upserted"],
+            "dry_run": dry_run,
             "result": result
         }
         
@@ -182,14 +206,15 @@ def test_query(index: Optional[Index] = None, question: str = "What are your sal
         
         # Initialize index if not provided
         if index is None:
-            index = Index.from_env()
+            index = Index.from_env(retries=0)
         
         # Query the database
-        results = index.query(
+        results = get_policy("upstash").call(lambda: index.query(
             data=question,
             top_k=3,
-            include_metadata=True
-        )
+            include_metadata=True,
+            namespace=dataset_namespace(PROFILE_DATASET)
+        ))
         
         print(f"✅ Found {len(results)} relevant profile entries:\n")
         
@@ -218,6 +243,12 @@ def main():
     3. Upload to Upstash Vector database
     4. Test with sample queries
     """
+    parser = argparse.ArgumentParser(description="Upload Vivian's profile to Upstash Vector")
+    parser.add_argument('--dry-run', action='store_true', help='Show what would change without uploading')
+    parser.add_argument('--prune', action='store_true', help='Delete entries no longer in the profile JSON')
+    parser.add_argument('--full', action='store_true', help='Ignore the manifest and re-upload everything')
+    args = parser.parse_args()
+    
     print("=" * 80)
     print("🚀 Vivian's Professional Profile Upload to Upstash Vector")
     print("=" * 80)
@@ -247,18 +278,22 @@ def main():
     
     # Step 3: Upload to Upstash
     print("📤 STEP 3: Uploading to Upstash Vector...")
-    upload_result = upload_to_upstash(vectors)
+    upload_result = upload_to_upstash(vectors, prune=args.prune, dry_run=args.dry_run, full=args.full)
     print()
     
     if not upload_result["success"]:
         print("❌ Upload failed. Exiting...")
         sys.exit(1)
     
+    if upload_result["dry_run"]:
+        print("🔎 Dry run complete - rerun without --dry-run to apply")
+        return
+    
     # Step 4: Test queries
     print("🧪 STEP 4: Testing with sample queries...")
     
     # Initialize index for testing
-    index = Index.from_env()
+    index = Index.from_env(retries=0)
     
     # Test queries relevant to ICG Data Analyst role
     test_queries = [
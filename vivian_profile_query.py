@@ -4,11 +4,19 @@ Professional Profile RAG Query System
 Query Vivian's professional profile using RAG (Retrieval-Augmented Generation)
 
 This script queries the professional profile vectors (vivian-001 to vivian-027)
-stored in Upstash Vector database and generates AI-powered responses using Groq.
+stored in their own Upstash Vector namespace and generates AI-powered
+responses using Groq.
 
 Usage:
     python3 vivian_profile_query.py "What are my salary expectations?"
     python3 vivian_profile_query.py  # Interactive mode
+    python3 vivian_profile_query.py --serve  # NDJSON daemon on stdin/stdout
+    python3 vivian_profile_query.py --serve --socket /tmp/profile.sock
+
+When PROFILE_QUERY_SOCKET (or --socket) points at a running daemon, CLI
+questions are forwarded to it instead of loading the pipeline in-process.
+Set RATE_LIMIT_STATE to a file path so parallel invocations share one Groq
+rate budget (see src/rate_limiter.py).
 
 Environment Variables Required:
     UPSTASH_VECTOR_REST_URL - Your Upstash Vector database URL
@@ -22,13 +30,123 @@ Date: October 29, 2025
 import sys
 import json
 import os
+import argparse
 from dotenv import load_dotenv
-from upstash_vector import Index
-from groq import Groq
+
+# Add src directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from client_pool import lease_index, lease_groq
+from lexical_index import hybrid_results
+from upstash_sync import dataset_namespace
+from answer_cache import get_answer_cache
+from rate_limiter import get_limiter, estimate_tokens
+from resilience import get_policy
+from single_flight import flight_key, get_flight
+from rag_daemon import request_daemon, serve_stdio, serve_unix
 
 # Load environment variables
 load_dotenv()
 
+# Retrieval and generation settings shared with rag_server.py
+# The profile has its own namespace, so every hit is a profile entry
+PROFILE_NAMESPACE = dataset_namespace("profile")
+TOP_K = 3
+CONTEXT_K = 3  # Profile entries kept after fusing with BM25 results
+LLM_MODEL = "llama-3.1-8b-instant"
+TEMPERATURE = 0.7
+MAX_TOKENS = 500
+SYSTEM_PROMPT = (
+    "You are Vivian Pham's professional digital twin assistant. "
+    "Answer questions about Vivian's professional background, skills, experience, "
+    "projects, compensation expectations, availability, and career goals. "
+    "Use the provided profile information to give accurate, detailed, and enthusiastic answers. "
+    "When discussing compensation, mention both contract rates ($500-600/day) and permanent salary ranges ($55k-70k). "
+    "When discussing Power BI, emphasize the Microsoft Power BI Certification Training from The Knowledge Academy. "
+    "When discussing projects, use STAR format (Situation, Task, Action, Result) if appropriate. "
+    "Be professional, confident, and highlight Vivian's strengths."
+)
+CACHE_SCOPE = "profile"
+# Anything that changes the answer for the same question and data
+CACHE_PARAMS = {
+    "model": LLM_MODEL,
+    "temperature": TEMPERATURE,
+    "max_tokens": MAX_TOKENS,
+    "system_prompt": SYSTEM_PROMPT,
+    "namespace": PROFILE_NAMESPACE,
+    "top_k": TOP_K,
+    "context_k": CONTEXT_K,
+}
+
+def select_profile_context(results, silent: bool = True, limit: int = None):
+    """
+    Pick the profile vectors out of the search results and build context
+    
+    Args:
+        results: Ranked search results (vector or fused)
+        silent: If False, print each profile match
+        limit: Maximum number of profile entries to keep
+    
+    Returns:
+        Tuple of (profile_results, context_docs)
+    """
+    profile_results = []
+    context_docs = []
+    
+    for result in results:
+        # The profile namespace only holds vivian-* vectors; skip anything else
+        if result.id.startswith('vivian-'):
+            if limit is not None and len(profile_results) >= limit:
+                break
+            profile_results.append(result)
+            
+            # Uploaded metadata has no text field; the embedded text comes back as data
+            text = result.metadata.get('text') or getattr(result, 'data', None) or ''
+            name = result.metadata.get('name', '')
+            section = result.metadata.get('section', '')
+            
+            # Build rich context
+            context_entry = f"[{section.upper()}] {name}\n{text}"
+            context_docs.append(context_entry)
+            
+            if not silent:
+                print(f"✓ Found: {name} (relevance: {result.score:.3f})")
+    
+    return profile_results, context_docs
+
+def build_messages(question: str, context: str) -> list:
+    """Build the Groq chat messages for a profile question"""
+    return [
+        {
+            "role": "system",
+            "content": SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": f"Profile Information:\n\n{context}\n\nQuestion: {question}\n\nAnswer:"
+        }
+    ]
+
+def build_sources(profile_results) -> list:
+    """Summarise the top profile matches for the response"""
+    sources = []
+    for result in profile_results[:3]:
+        sources.append({
+            "id": result.id,
+            "name": result.metadata.get('name', 'N/A'),
+            "section": result.metadata.get('section', 'N/A'),
+            "relevance": f"{result.score:.3f}"
+        })
+    return sources
+
+def cached_response(question: str):
+    """Answer stored by any earlier process (CLI or daemon), or None"""
+    answers = get_answer_cache()
+    stored = answers.get(CACHE_SCOPE, question, CACHE_PARAMS) if answers else None
+    if stored:
+        return {**stored, "question": question, "cached": True}
+    return None
+
 def query_profile(question: str, silent: bool = False) -> dict:
     """
     Query Vivian's professional profile and get AI-powered answer
@@ -45,17 +163,35 @@ def query_profile(question: str, silent: bool = False) -> dict:
             print(f"\n🤔 Question: {question}")
             print("🔍 Searching professional profile...\n")
         
-        # Initialize Upstash Vector
-        index = Index.from_env()
+        # Answers stored by any earlier process, then recent paraphrases
+        stored = cached_response(question)
+        if stored:
+            if not silent:
+                print("⚡ Stored answer\n")
+            return stored
+        
+        from semantic_cache import get_cache  # NumPy-backed; imported on first use
+        cache = get_cache(CACHE_SCOPE)
+        hit = cache.lookup(question) if cache else None
+        if hit:
+            if not silent:
+                print(f"⚡ Cached answer (similar to: {hit['question']!r})\n")
+            return {**hit["answer"], "question": question, "cached": True}
         
-        # Search for relevant profile entries
-        # Note: Database has 227 vectors total (200 food + 27 professional)
-        # We want to find vivian-* vectors specifically
-        results = index.query(
-            data=question,
-            top_k=5,  # Get more results to ensure we catch vivian-* vectors
-            include_metadata=True
-        )
+        # Search only the profile namespace
+        def search():
+            with lease_index() as index:
+                return index.query(
+                    data=question,
+                    top_k=TOP_K,
+                    include_metadata=True,
+                    include_data=True,
+                    namespace=PROFILE_NAMESPACE
+                )
+        results = get_policy("upstash").call(search, verbose=not silent)
+        
+        # Fuse with the profile's BM25 results
+        results = hybrid_results("profile", question, results)
         
         if not results:
             return {
@@ -65,33 +201,7 @@ def query_profile(question: str, silent: bool = False) -> dict:
             }
         
         # Filter for profile vectors (vivian-*) and build context
-        profile_results = []
-        context_docs = []
-        
-        for result in results:
-            # Prioritize vivian-* vectors
-            if result.id.startswith('vivian-'):
-                profile_results.append(result)
-                
-                # Extract text from metadata or use default
-                text = result.metadata.get('text', '')
-                name = result.metadata.get('name', '')
-                category = result.metadata.get('category', '')
-                section = result.metadata.get('section', '')
-                
-                # Build rich context
-                context_entry = f"[{section.upper()}] {name}\n{text}"
-                context_docs.append(context_entry)
-                
-                if not silent:
-                    print(f"✓ Found: {name} (relevance: {result.score:.3f})")
-        
-        # If no profile vectors found, try to extract text from any results
-        if not profile_results:
-            # Fall back to any results (might be food items, but better than nothing)
-            for result in results[:3]:
-                text = result.metadata.get('text', result.metadata.get('enhanced_text', 'N/A'))
-                context_docs.append(text)
+        profile_results, context_docs = select_profile_context(results, silent, limit=CONTEXT_K)
         
         if not context_docs:
             return {
@@ -105,53 +215,48 @@ def query_profile(question: str, silent: bool = False) -> dict:
         if not silent:
             print(f"\n💭 Generating AI response...\n")
         
-        # Generate answer with Groq
-        groq = Groq(api_key=os.getenv("GROQ_API_KEY"))
-        
-        completion = groq.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are Vivian Pham's professional digital twin assistant. "
-                        "Answer questions about Vivian's professional background, skills, experience, "
-                        "projects, compensation expectations, availability, and career goals. "
-                        "Use the provided profile information to give accurate, detailed, and enthusiastic answers. "
-                        "When discussing compensation, mention both contract rates ($500-600/day) and permanent salary ranges ($55k-70k). "
-                        "When discussing Power BI, emphasize the Microsoft Power BI Certification Training from The Knowledge Academy. "
-                        "When discussing projects, use STAR format (Situation, Task, Action, Result) if appropriate. "
-                        "Be professional, confident, and highlight Vivian's strengths."
+        # Generate answer with Groq, within the budget shared via RATE_LIMIT_STATE
+        messages = build_messages(question, context)
+        limiter = get_limiter("groq")
+        estimate = estimate_tokens(messages, MAX_TOKENS)
+        
+        def generate():
+            # Leased first, so a client that cannot be built holds no reservation
+            with lease_groq() as groq:
+                limiter.acquire(estimate, verbose=not silent)
+                try:
+                    completion = groq.chat.completions.create(
+                        messages=messages,
+                        model=LLM_MODEL,
+                        temperature=TEMPERATURE,
+                        max_tokens=MAX_TOKENS
                     )
-                },
-                {
-                    "role": "user",
-                    "content": f"Profile Information:\n\n{context}\n\nQuestion: {question}\n\nAnswer:"
-                }
-            ],
-            model="llama-3.1-8b-instant",
-            temperature=0.7,
-            max_tokens=500
-        )
+                except Exception:
+                    limiter.settle(estimate, 0)  # Refund a failed attempt
+                    raise
+            limiter.settle(estimate, getattr(completion.usage, "total_tokens", None))
+            return completion
+        
+        completion = get_policy("groq").call(generate, verbose=not silent)
         
         answer = completion.choices[0].message.content
         
         # Build sources list
-        sources = []
-        for result in profile_results[:3]:
-            sources.append({
-                "id": result.id,
-                "name": result.metadata.get('name', 'N/A'),
-                "section": result.metadata.get('section', 'N/A'),
-                "relevance": f"{result.score:.3f}"
-            })
+        sources = build_sources(profile_results)
         
-        return {
+        response = {
             "success": True,
             "question": question,
             "answer": answer,
             "sources": sources,
             "profile_vectors_found": len(profile_results)
         }
+        if cache:
+            cache.store(question, response, ids=[result.id for result in profile_results])
+        answers = get_answer_cache()
+        if answers:
+            answers.put(CACHE_SCOPE, question, CACHE_PARAMS, response)
+        return response
         
     except Exception as e:
         return {
@@ -212,8 +317,37 @@ def interactive_mode():
         except Exception as e:
             print(f"\n❌ Error: {e}\n")
 
+def handle_request(request: dict) -> dict:
+    """Answer one daemon request of the form {"question": "..."}"""
+    question = request.get("question")
+    if not question:
+        return {"success": False, "error": "No question provided"}
+    
+    # Identical questions already being answered share that answer
+    key = flight_key(CACHE_SCOPE, question, CACHE_PARAMS)
+    response, shared = get_flight(CACHE_SCOPE).do(key, lambda: query_profile(question, silent=True))
+    if shared:
+        return {**response, "question": question, "coalesced": True}
+    return dict(response)  # Waiters copy it; the daemon adds an "id"
+
 def main():
     """Main execution function"""
+    parser = argparse.ArgumentParser(description="Query Vivian's professional profile")
+    parser.add_argument('question', nargs='*', help='Question to answer (omit for interactive mode)')
+    parser.add_argument('--serve', action='store_true',
+                        help='Run as a long-lived NDJSON daemon')
+    parser.add_argument('--socket', default=os.getenv('PROFILE_QUERY_SOCKET'),
+                        help='Unix socket to serve on (with --serve) or forward to')
+    args = parser.parse_args()
+    
+    # A stored answer or a warm daemon needs no credentials or clients here
+    if args.question and not args.serve:
+        question = " ".join(args.question)
+        result = cached_response(question) or request_daemon(args.socket, {"question": question})
+        if result is not None:
+            result.pop("id", None)
+            print(json.dumps(result, indent=2))
+            return
     
     # Check environment variables
     if not os.getenv("UPSTASH_VECTOR_REST_URL") or not os.getenv("UPSTASH_VECTOR_REST_TOKEN"):
@@ -224,10 +358,14 @@ def main():
         print("❌ ERROR: Missing GROQ_API_KEY in .env file")
         sys.exit(1)
     
-    # Check if question provided as argument
-    if len(sys.argv) > 1:
+    if args.serve:
+        if args.socket:
+            serve_unix(args.socket, handle_request)
+        else:
+            serve_stdio(handle_request)
+    elif args.question:
         # CLI mode with question
-        question = " ".join(sys.argv[1:])
+        question = " ".join(args.question)
         result = query_profile(question, silent=True)
         print(json.dumps(result, indent=2))
     else: